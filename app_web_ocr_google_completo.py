@@ -1,21 +1,53 @@
+import time
+
+# Início da execução do script (usado no relatório de desempenho)
+inicio_execucao = time.perf_counter()
+
 import streamlit as st
-from google.cloud import vision
 import io
-import pandas as pd
-from PIL import Image
 import tempfile
 import os
-from pdf2image import convert_from_bytes
 import subprocess
 import sys
+from contextlib import closing
 from datetime import datetime
-import json
-from google.oauth2 import service_account
-import sqlite3
-import os.path
-from pathlib import Path
-import matplotlib.pyplot as plt
-import hashlib
+from armazenamento import estatisticas_armazenamento
+from banco_dados import (
+    calcular_hash_arquivo,
+    contar_historico,
+    consultar_agregados_matricula,
+    consultar_agregados_organizacao,
+    consultar_historico,
+    consultar_textos_brutos,
+    diagnosticar_banco_dados,
+    obter_versao_dados,
+    particoes_periodo,
+    preparar_banco_dados,
+    salvar_dados_extraidos,
+)
+from exportacao import FORMATOS_EXPORTACAO, LIMITE_LINHAS_EXPORTACAO_INTERFACE, exportar_para_arquivo_temporario
+import perfilamento
+import telemetria
+from motores_ocr import DisjuntorCircuito
+from processamento import (
+    DPI_INICIAL_ADAPTATIVO,
+    OCR_MODO,
+    ErroDocumento,
+    carregar_credenciais,
+    extrair_campos_contracheque,
+    obter_motor_ocr,
+    montar_texto_pdf,
+    paginas_com_erro,
+    processar_imagem,
+    processar_pdf_paginas,
+    processar_texto_contracheque,
+)
+
+# Módulos pesados importados sob demanda (exibidos no relatório de desempenho)
+MODULOS_PESADOS = ["pandas", "matplotlib", "pdf2image", "google.cloud.vision"]
+
+# PDFs processados guardados na sessão (as reexecuções do script não refazem o OCR)
+DOCUMENTOS_PDF_SESSAO = 5
 
 # Configuração da página Streamlit
 st.set_page_config(
@@ -24,966 +56,900 @@ st.set_page_config(
     layout="wide"
 )
 
-# Função para inicializar o banco de dados
-def inicializar_banco_dados():
-    """
-    Cria o banco de dados SQLite e as tabelas necessárias, se não existirem.
-    """
-    # Garantir que o diretório de dados existe
-    data_dir = Path("./data")
-    data_dir.mkdir(exist_ok=True)
-    
-    # Caminho para o banco de dados
-    db_path = data_dir / "contracheques.db"
-    
-    # Conectar ao banco de dados (cria se não existir)
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-    
-    # Criar tabela de contracheques se não existir
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS contracheques (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT,
-            matricula TEXT,
-            cargo TEXT,
-            mes_referencia TEXT,
-            salario_base REAL,
-            descontos REAL,
-            valor_liquido REAL,
-            data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            arquivo_fonte TEXT,
-            hash_arquivo TEXT,
-            validado BOOLEAN DEFAULT 0,
-            observacoes TEXT
-        )
-    ''')
-    
-    # Criar tabela para armazenar as imagens processadas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS arquivos_processados (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_arquivo TEXT,
-            hash_arquivo TEXT UNIQUE,
-            data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            tipo_arquivo TEXT,
-            texto_extraido TEXT
-        )
-    ''')
-    
-    # Commit e fechar conexão
-    conn.commit()
-    conn.close()
-    
-    return str(db_path)
-
-# Função para calcular hash de arquivo
-def calcular_hash_arquivo(conteudo_bytes):
-    """
-    Calcula o hash SHA-256 do conteúdo do arquivo.
-    Útil para identificar arquivos duplicados.
-    """
-    return hashlib.sha256(conteudo_bytes).hexdigest()
-
-# Função para diagnóstico do banco de dados
-def diagnosticar_banco_dados():
-    """
-    Verifica se o banco de dados está funcionando corretamente.
-    """
-    try:
-        conn = sqlite3.connect(st.session_state['db_path'])
-        cursor = conn.cursor()
-        
-        # Verificar tabelas
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tabelas = cursor.fetchall()
-        tabelas = [tab[0] for tab in tabelas]
-        
-        # Verificar contagem de registros
-        contagens = {}
-        for tabela in tabelas:
-            cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
-            contagens[tabela] = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return {
-            "status": "ok",
-            "caminho_bd": st.session_state['db_path'],
-            "tabelas": tabelas,
-            "contagens": contagens
-        }
-    except Exception as e:
-        return {
-            "status": "erro",
-            "mensagem": str(e)
-        } 
-
-# Função para consultar histórico
-def consultar_historico(data_inicio=None, data_fim=None, filtro_nome=None, filtro_matricula=None):
+# Função para gerar gráfico de valor líquido
+def gerar_grafico_valor_liquido(df, titulo='Evolução do Valor Líquido'):
     """
-    Consulta o histórico de contracheques processados com possibilidade de filtros.
+    Gera um gráfico de linha com a evolução dos valores bruto, descontos e
+    líquido por competência.
     
     Args:
-        data_inicio: Data inicial (opcional)
-        data_fim: Data final (opcional)
-        filtro_nome: Filtro por nome (opcional)
-        filtro_matricula: Filtro por matrícula (opcional)
+        df: DataFrame de agregados mensais (colunas competencia, total_bruto,
+            total_descontos e total_liquido)
+        titulo: Título do gráfico
         
     Returns:
-        DataFrame com os resultados da consulta
+        Imagem PNG do gráfico em bytes
     """
-    conn = sqlite3.connect(st.session_state['db_path'])
+    import matplotlib.pyplot as plt
+    import pandas as pd
     
-    # Construir a consulta SQL com filtros dinâmicos
-    query = "SELECT * FROM contracheques WHERE 1=1"
-    params = []
+    # Rótulos no formato MM/AAAA
+    rotulos = pd.to_datetime(df['competencia'], format='%Y-%m').dt.strftime('%m/%Y')
     
-    if data_inicio:
-        query += " AND date(data_processamento) >= ?"
-        params.append(data_inicio)
-    
-    if data_fim:
-        query += " AND date(data_processamento) <= ?"
-        params.append(data_fim)
-    
-    if filtro_nome:
-        query += " AND nome LIKE ?"
-        params.append(f"%{filtro_nome}%")
-    
-    if filtro_matricula:
-        query += " AND matricula LIKE ?"
-        params.append(f"%{filtro_matricula}%")
-    
-    # Ordenar por data mais recente primeiro
-    query += " ORDER BY data_processamento DESC"
-    
-    # Executar a consulta
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+    # Criar gráfico
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(rotulos, df['total_bruto'], marker='o', linestyle='-', label='Bruto')
+    ax.plot(rotulos, df['total_descontos'], marker='o', linestyle='-', label='Descontos')
+    ax.plot(rotulos, df['total_liquido'], marker='o', linestyle='-', label='Líquido')
     
-    return df
+    # Formatar eixos
+    ax.set_xlabel('Mês/Ano')
+    ax.set_ylabel('Valor (R$)')
+    ax.set_title(titulo)
+    ax.legend()
+    plt.setp(ax.get_xticklabels(), rotation=45)
+    fig.tight_layout()
+    
+    # Renderizar para PNG e liberar a figura
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    return buffer.getvalue()
+
+# Função para formatar agregados mensais para exibição
+def formatar_agregados_exibicao(df):
+    """
+    Formata competência (MM/AAAA) e valores monetários (R$) para exibição.
+    """
+    import pandas as pd
+    
+    df_display = df.copy()
+    df_display['competencia'] = pd.to_datetime(df_display['competencia'], format='%Y-%m').dt.strftime('%m/%Y')
+    for col in ['total_bruto', 'total_descontos', 'total_liquido']:
+        if col in df_display.columns:
+            df_display[col] = df_display[col].apply(lambda x: f"R$ {x:.2f}".replace('.', ',') if pd.notnull(x) else "")
+    return df_display
+
+# Painéis com cache: só são recalculados quando a versão dos dados muda
+@st.cache_data(max_entries=512, show_spinner=False)
+def obter_painel_matricula(db_path, matricula, versao_dados):
+    """
+    Retorna (DataFrame de agregados, gráfico PNG ou None) de uma matrícula.
+    db_path e versao_dados fazem parte da chave do cache.
+    """
+    df = consultar_agregados_matricula(matricula)
+    grafico = gerar_grafico_valor_liquido(df, f'Evolução Mensal - Matrícula {matricula}') if len(df) >= 2 else None
+    return df, grafico
 
-# Função para consultar texto bruto
-def consultar_textos_brutos(data_inicio=None, data_fim=None, filtro_nome=None):
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_painel_organizacao(db_path, competencia_inicio, competencia_fim, versao_dados):
     """
-    Consulta os textos brutos extraídos, com possibilidade de filtros.
+    Retorna (DataFrame de agregados, gráfico PNG ou None) da organização.
+    db_path e versao_dados fazem parte da chave do cache.
     """
-    conn = sqlite3.connect(st.session_state['db_path'])
-    
-    query = "SELECT * FROM arquivos_processados WHERE 1=1"
-    params = []
-    
-    if data_inicio:
-        query += " AND date(data_processamento) >= ?"
-        params.append(data_inicio)
-    
-    if data_fim:
-        query += " AND date(data_processamento) <= ?"
-        params.append(data_fim)
-    
-    if filtro_nome:
-        query += " AND nome_arquivo LIKE ?"
-        params.append(f"%{filtro_nome}%")
-    
-    # Ordenar por data mais recente primeiro
-    query += " ORDER BY data_processamento DESC"
-    
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-    
-    return df
+    df = consultar_agregados_organizacao(competencia_inicio, competencia_fim)
+    grafico = gerar_grafico_valor_liquido(df, 'Evolução Mensal - Organização') if len(df) >= 2 else None
+    return df, grafico
 
-# Função para gerar gráfico de valor líquido
-def gerar_grafico_valor_liquido(df):
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_total_exportacao(db_path, data_inicio, data_fim, filtro_nome, filtro_matricula, versao_dados):
     """
-    Gera um gráfico de linha com a evolução dos valores líquidos por mês.
-    
-    Args:
-        df: DataFrame com os dados dos contracheques
+    Quantidade de registros da exportação com os filtros informados.
+    db_path e versao_dados fazem parte da chave do cache.
     """
-    # Verificar se há dados suficientes
-    if len(df) < 2:
-        st.warning("São necessários pelo menos 2 registros para gerar gráficos comparativos.")
-        return
-    
-    # Tentar extrair mês e ano da coluna mes_referencia
-    df['mes_ref_formatado'] = pd.to_datetime(df['data_processamento']).dt.strftime('%m/%Y')
-    
-    # Preparar dados para o gráfico
-    df_grafico = df.sort_values('data_processamento')
-    
-    # Criar gráfico
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(df_grafico['mes_ref_formatado'], df_grafico['valor_liquido'], marker='o', linestyle='-')
-    
-    # Formatar eixos
-    ax.set_xlabel('Mês/Ano')
-    ax.set_ylabel('Valor Líquido (R$)')
-    ax.set_title('Evolução do Valor Líquido')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    # Exibir gráfico
-    st.pyplot(fig)
-    # Inicializar banco de dados
-db_path = inicializar_banco_dados()
+    return contar_historico(data_inicio, data_fim, filtro_nome, filtro_matricula)
+
+# Preparar o banco de dados (esquema e migrações rodam uma vez por processo)
+db_path, tempo_preparacao_banco = preparar_banco_dados()
 st.session_state['db_path'] = db_path
 
-# Configuração das credenciais do Google Cloud
-if "gcp_service_account" in st.secrets:
-    try:
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"]
-        )
-        st.success("✅ Credenciais do Google Cloud carregadas com sucesso!")
-        # Mostrar apenas o projeto (seguro de exibir)
-        if hasattr(credentials, "_project_id"):
-            st.write(f"Project ID: {credentials._project_id}")
-    except Exception as e:
-        st.error(f"❌ Erro ao carregar credenciais: {str(e)}")
-        credentials = None
+# Endpoint de métricas para coleta (Prometheus e JSON), iniciado uma vez por processo
+@st.cache_resource(show_spinner=False)
+def iniciar_endpoint_metricas():
+    return telemetria.iniciar_servidor_metricas()
+
+servidor_metricas = iniciar_endpoint_metricas()
+
+# Credenciais do Google Cloud (carregadas uma vez por processo)
+credentials, situacao_credenciais, erro_credenciais = carregar_credenciais()
+if situacao_credenciais == "local":
+    st.info("🖥️ Modo local: o OCR é feito apenas com Tesseract, sem enviar imagens para a nuvem.")
+elif situacao_credenciais == "ok":
+    st.success("✅ Credenciais do Google Cloud carregadas com sucesso!")
+    # Mostrar apenas o projeto (seguro de exibir)
+    if hasattr(credentials, "_project_id"):
+        st.write(f"Project ID: {credentials._project_id}")
+elif situacao_credenciais == "erro":
+    st.error(f"❌ Erro ao carregar credenciais: {erro_credenciais}")
 else:
     st.warning("⚠️ Credenciais do Google Cloud não encontradas. Certifique-se de configurar os secrets.")
-    credentials = None
 
-# Função para extrair texto de imagens usando o Google Vision API
-def extrair_texto_imagem(conteudo_imagem):
+# Função para gerar a exportação do histórico no momento do download
+def gerar_exportacao_historico(formato, data_inicio, data_fim, filtro_nome, filtro_matricula):
     """
-    Usa o Google Vision API para extrair texto de uma imagem.
+    Gera a exportação em um arquivo temporário (lida do banco em lotes) e
+    devolve seu conteúdo para o botão de download. O conteúdo inteiro fica
+    na memória do servidor (o Streamlit guarda os dados do download); o
+    tamanho é limitado por LIMITE_LINHAS_EXPORTACAO_INTERFACE.
     """
-    try:
-        # Inicializar o cliente Vision API com as credenciais carregadas anteriormente
-        client = vision.ImageAnnotatorClient(credentials=credentials)
-        
-        # Preparar a imagem para análise
-        imagem = vision.Image(content=conteudo_imagem)
-        
-        # Realizar o reconhecimento de texto
-        resposta = client.text_detection(image=imagem)
-        
-        # Verificar erros de resposta
-        if resposta.error.message:
-            return f"Erro na API Vision: {resposta.error.message}"
-            
-        textos = resposta.text_annotations
-        
-        # Verificar se há texto detectado
-        if textos:
-            return textos[0].description
-        else:
-            return "Nenhum texto detectado na imagem."
-    except Exception as e:
-        return f"Erro ao processar imagem: {str(e)}"
+    with exportar_para_arquivo_temporario(formato, data_inicio, data_fim, filtro_nome, filtro_matricula) as arquivo:
+        return arquivo.read()
+
+# Função para avisar sobre as páginas cujo OCR falhou
+def exibir_erros_ocr(metricas_paginas):
+    paginas = paginas_com_erro(metricas_paginas)
+    if paginas:
+        st.error(
+            f"O OCR falhou em {len(paginas)} página(s) ({', '.join(map(str, paginas))}); "
+            "o texto dessas páginas está vazio. Tente processar o arquivo novamente."
+        )
 
-# Fallback para OCR local (usando pytesseract) caso o Google Vision falhe
-def extrair_texto_imagem_fallback(conteudo_imagem):
+# Função para exibir as métricas de OCR por página
+def exibir_metricas_ocr(metricas_paginas):
     """
-    Tenta usar pytesseract como fallback caso o Google Vision API falhe.
-    Requer instalação do pytesseract e Tesseract OCR.
+    Mostra o total de bytes enviados e a latência do OCR, com o detalhamento
+    por página em um expander.
     """
-    try:
-        import pytesseract
-        imagem = Image.open(io.BytesIO(conteudo_imagem))
-        texto = pytesseract.image_to_string(imagem, lang='por')
-        return texto
-    except Exception as e:
-        return f"Erro no OCR local: {str(e)}"
-
-# Função para processar arquivos PDF
-def processar_pdf(pdf_bytes):
+    if not metricas_paginas:
+        return
+    import pandas as pd
+    
+    total_bytes = sum(m["bytes_enviados"] for m in metricas_paginas)
+    total_latencia = sum(m["latencia_ocr_ms"] for m in metricas_paginas)
+    ignoradas = sum(1 for m in metricas_paginas if m["situacao"] != "OCR")
+    st.caption(
+        f"OCR: {len(metricas_paginas)} página(s), {ignoradas} ignorada(s) (em branco ou duplicadas), "
+        f"{total_bytes / 1024:.1f} KB enviados, {total_latencia / 1000:.2f} s de latência"
+    )
+    with st.expander("📏 Métricas de OCR por página", expanded=False):
+        st.dataframe(pd.DataFrame(metricas_paginas))
+
+# Função para obter o processamento de um PDF guardado na sessão
+def obter_documento_pdf(chave):
     """
-    Converte PDF para imagens e então extrai texto.
+    Devolve o estado do processamento do PDF (páginas já reconhecidas,
+    total de páginas, concluído, cancelado), criando-o se necessário.
     """
-    try:
-        # Criar diretório temporário para armazenar as imagens
-        with tempfile.TemporaryDirectory() as path:
+    documentos = st.session_state.setdefault('documentos_pdf', {})
+    if chave not in documentos:
+        # Descartar os documentos mais antigos da sessão
+        while len(documentos) >= DOCUMENTOS_PDF_SESSAO:
+            documentos.pop(next(iter(documentos)))
+        documentos[chave] = {'paginas': {}, 'total': None, 'concluido': False, 'cancelado': False}
+    return documentos[chave]
+
+# Função para cancelar o processamento de um PDF (mantém as páginas já reconhecidas)
+def cancelar_processamento_pdf(chave):
+    documento = st.session_state.get('documentos_pdf', {}).get(chave)
+    if documento is not None and not documento['concluido']:
+        documento['cancelado'] = True
+
+# Função para descartar um PDF da sessão, para processá-lo de novo
+def descartar_documento_pdf(chave):
+    st.session_state.get('documentos_pdf', {}).pop(chave, None)
+
+# Perfilamento opcional desta execução (PERFILAMENTO=1 ou chave de administração na barra lateral)
+perfilador = None
+if perfilamento.PERFILAMENTO_ATIVO or st.session_state.get('perfilamento_admin', False):
+    perfilador = perfilamento.Perfilador("Execução do script").iniciar()
+
+execucao_completa = False
+try:
+    # Título principal do aplicativo
+    st.title("🔍 OCR para Contracheques com Google Vision")
+    st.write("Este aplicativo extrai dados de contracheques usando reconhecimento óptico de caracteres (OCR).")
+
+    # Seção de diagnóstico para verificar a instalação do Poppler e Google Vision API
+    with st.expander("Diagnóstico de Sistema", expanded=False):
+        st.subheader("Verificação de Sistema")
+
+        # Verificação direta de comandos do Poppler
+        if st.button("Verificar Instalação do Poppler"):
             try:
-                # Tentar converter PDF para imagens
-                images = convert_from_bytes(pdf_bytes, dpi=300, output_folder=path)
+                # Tentar executar o comando `pdftoppm`
+                resultado = subprocess.run(
+                    ["which", "pdftoppm"],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True
+                )
                 
-                # Extrair texto de cada página
-                texto_completo = ""
-                for i, imagem in enumerate(images):
-                    # Converter imagem PIL para bytes
-                    img_byte_arr = io.BytesIO()
-                    imagem.save(img_byte_arr, format='PNG')
-                    img_byte_arr.seek(0)
-                    
-                    # Extrair texto da imagem
-                    texto_pagina = extrair_texto_imagem(img_byte_arr.getvalue())
-                    
-                    # Se o Google Vision falhar, tente o fallback
-                    if texto_pagina.startswith("Erro"):
-                        st.warning(f"Google Vision falhou. Tentando OCR local... {texto_pagina}")
-                        texto_pagina = extrair_texto_imagem_fallback(img_byte_arr.getvalue())
-                    
-                    texto_completo += f"\n--- Página {i+1} ---\n" + texto_pagina
+                if resultado.stdout.strip():
+                    st.success(f"✅ pdftoppm encontrado em: {resultado.stdout.strip()}")
+
+                    # Verificar a versão
+                    resultado_versao = subprocess.run(
+                        ["pdftoppm", "-v"],
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        text=True
+                    )
+                    informacoes_versao = (
+                        resultado_versao.stderr.strip() 
+                        if resultado_versao.stderr.strip() 
+                        else resultado_versao.stdout.strip()
+                    )
+                    st.code(informacoes_versao)
+                else:
+                    st.error("❌ pdftoppm não encontrado no sistema")
+                    st.code(f"Erro: {resultado.stderr.strip()}")
+
+            except Exception as e:
+                st.error(f"❌ Erro ao verificar pdftoppm: {str(e)}")
+                st.exception(e)
+
+        # Verificar conexão com o Google Vision API
+        if st.button("Testar Conexão com Google Vision API"):
+            try:
+                from google.cloud import vision
                 
-                return texto_completo
+                # Inicializar cliente com as credenciais carregadas
+                client = vision.ImageAnnotatorClient(credentials=credentials)
                 
+                # Criar uma imagem simples para teste
+                from PIL import Image, ImageDraw
+                image = Image.new('RGB', (100, 30), color = (255, 255, 255))
+                d = ImageDraw.Draw(image)
+                d.text((10,10), "TEST", fill=(0,0,0))
+                
+                # Converter para bytes
+                img_byte_arr = io.BytesIO()
+                image.save(img_byte_arr, format='PNG')
+                img_byte_arr.seek(0)
+                
+                # Enviar para a API
+                vision_image = vision.Image(content=img_byte_arr.getvalue())
+                response = client.text_detection(image=vision_image)
+                
+                if response.error.message:
+                    st.error(f"❌ Erro na API: {response.error.message}")
+                else:
+                    st.success("✅ Conexão com Google Vision API estabelecida com sucesso!")
+                    texts = response.text_annotations
+                    if texts:
+                        st.write(f"Texto detectado na imagem de teste: '{texts[0].description}'")
+                    else:
+                        st.write("Nenhum texto detectado na imagem de teste.")
+                        
             except Exception as e:
-                st.error(f"Erro ao processar PDF: {str(e)}")
-                st.warning("Conversão de PDF pode requerer instalação local. Por favor, tente enviar imagens diretas.")
-                return f"Erro na conversão do PDF: {str(e)}"
-    except Exception as e:
-        st.error(f"Erro ao processar arquivo: {str(e)}")
-        return f"Erro no processamento do arquivo: {str(e)}"
-
-# Função para processar o texto extraído e identificar dados do contracheque
-def processar_texto_contracheque(texto):
-    """
-    Analisa o texto extraído do documento PDF para identificar informações do contracheque.
-    """
-    # Inicializa o dicionário para armazenar os valores encontrados
-    dados = {
-        "Nome": "",
-        "Matrícula": "",
-        "Cargo": "",
-        "Mês/Ano": "",
-        "Salário Base": "",
-        "Descontos": "",
-        "Valor Líquido": ""
-    }
-    
-    # Se não há texto para processar, retorna o DataFrame vazio
-    if not texto or texto.startswith("Erro"):
-        return pd.DataFrame([dados])
-    
-    # Divide o texto em linhas para processar
-    linhas = texto.split('\n')
-    
-    # Itera pelas linhas para encontrar os padrões esperados
-    for linha in linhas:
-        linha_lower = linha.lower()
-        
-        # Captura o Nome
-        if "nome:" in linha_lower:
-            dados["Nome"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
-        
-        # Captura a Matrícula
-        elif "matrícula" in linha_lower or "matricula" in linha_lower:
-            dados["Matrícula"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
-
-        # Captura o Cargo
-        elif "cargo:" in linha_lower:
-            dados["Cargo"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+                st.error(f"❌ Erro ao testar Google Vision API: {str(e)}")
+                st.exception(e)
+
+        # Estado do motor de OCR (disjuntor do Google Vision)
+        disjuntor_ocr = getattr(obter_motor_ocr(), "disjuntor", None)
+        if disjuntor_ocr is None:
+            st.write(f"🖥️ Motor de OCR: Tesseract local ({obter_motor_ocr().processos} processos)")
+        elif disjuntor_ocr.estado == DisjuntorCircuito.FECHADO:
+            st.write("🟢 Motor de OCR: Google Vision disponível")
+        else:
+            st.write(f"🟠 Motor de OCR: disjuntor {disjuntor_ocr.estado}, páginas enviadas ao Tesseract")
         
-        # Captura o Mês/Ano
-        elif "referência:" in linha_lower or "referencia:" in linha_lower or "mês/ano:" in linha_lower:
-            dados["Mês/Ano"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+        # Diagnóstico do banco de dados
+        if st.button("Verificar Banco de Dados"):
+            resultado = diagnosticar_banco_dados()
+            if resultado["status"] == "ok":
+                st.success("✅ Banco de dados funcionando corretamente")
+                st.write(f"Caminho: {resultado['caminho_bd']}")
+                st.write("Tabelas encontradas:")
+                for tabela in resultado["tabelas"]:
+                    st.write(f"- {tabela}: {resultado['contagens'][tabela]} registros")
+                anos_arquivados = [ano for ano, _ in particoes_periodo()]
+                if anos_arquivados:
+                    st.write(f"Anos arquivados em bancos separados: {', '.join(map(str, sorted(anos_arquivados)))}")
+                originais = estatisticas_armazenamento()
+                st.write(
+                    f"Arquivos originais armazenados: {originais['arquivos']} "
+                    f"({originais['bytes'] / (1024 * 1024):.1f} MB em {originais['diretorio']})"
+                )
+            else:
+                st.error(f"❌ Erro no banco de dados: {resultado['mensagem']}")
+
+        # Desempenho de inicialização e das reexecuções do script
+        st.write("⏱️ Desempenho:")
+        st.write(f"- Preparação do banco de dados (uma vez por processo): {tempo_preparacao_banco * 1000:.1f} ms")
+        carregados = [nome for nome in MODULOS_PESADOS if nome in sys.modules]
+        st.write(f"- Módulos pesados já carregados: {', '.join(carregados) if carregados else 'nenhum'}")
+        execucoes = st.session_state.get('tempos_execucao', [])
+        if execucoes:
+            st.write(
+                f"- Execuções nesta sessão: {len(execucoes)} (primeira: {execucoes[0]:.0f} ms, "
+                f"última: {execucoes[-1]:.0f} ms, mediana: {sorted(execucoes)[len(execucoes) // 2]:.0f} ms)"
+            )
         
-        # Captura o Salário Base
-        elif "salário base" in linha_lower or "salario base" in linha_lower:
-            try:
-                partes = linha.split()
-                for i, parte in enumerate(partes):
-                    if parte.lower() in ["base", "salário", "salario"] and i + 1 < len(partes):
-                        dados["Salário Base"] = partes[i + 1].replace("R$", "").strip()
-                if not dados["Salário Base"] and len(partes) > 0:  # Fallback para método antigo
-                    dados["Salário Base"] = partes[-1].replace("R$", "").strip()
-            except Exception:
-                dados["Salário Base"] = ""
+        # Telemetria por etapa (rasterização, codificação, OCR, reserva, interpretação, banco)
+        st.write("📊 Telemetria de desempenho (todas as sessões deste processo):")
+        if servidor_metricas is not None:
+            host_metricas, porta_metricas = servidor_metricas.server_address[:2]
+            st.write(f"- Endpoint para coleta: http://{host_metricas}:{porta_metricas}/metrics (JSON em /metrics.json)")
+        else:
+            st.write("- Endpoint para coleta desativado (METRICAS_PORTA=0 ou porta indisponível)")
+        dados_telemetria = telemetria.REGISTRO.instantaneo()
+        if dados_telemetria["histogramas"]:
+            import pandas as pd
+            
+            st.dataframe(pd.DataFrame([
+                {
+                    "métrica": h["nome"],
+                    "rótulos": ", ".join(f"{k}={v}" for k, v in h["rotulos"].items() if v),
+                    "contagem": h["contagem"],
+                    "média (ms)": round(h["soma"] / h["contagem"] * 1000, 1),
+                    "p50 (ms)": round(h["p50"] * 1000, 1),
+                    "p95 (ms)": round(h["p95"] * 1000, 1),
+                }
+                for h in dados_telemetria["histogramas"]
+            ]))
+            st.dataframe(pd.DataFrame([
+                {"métrica": c["nome"], "rótulos": ", ".join(f"{k}={v}" for k, v in c["rotulos"].items()), "valor": c["valor"]}
+                for c in dados_telemetria["contadores"]
+            ]))
+        else:
+            st.write("- Nenhum documento processado neste processo ainda.")
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "Baixar métricas (Prometheus)", telemetria.REGISTRO.formato_prometheus(),
+            file_name="metricas.txt", mime="text/plain"
+        )
+        col2.download_button(
+            "Baixar métricas (JSON)", telemetria.REGISTRO.formato_json(),
+            file_name="metricas.json", mime="application/json"
+        )
         
-        # Captura os Descontos
-        elif "total de descontos" in linha_lower or "descontos totais" in linha_lower or "total descontos" in linha_lower:
-            try:
-                partes = linha.split()
-                for i, parte in enumerate(partes):
-                    if parte.lower() == "descontos" and i + 1 < len(partes):
-                        dados["Descontos"] = partes[i + 1].replace("R$", "").strip()
-                if not dados["Descontos"] and len(partes) > 0:  # Fallback para método antigo
-                    dados["Descontos"] = partes[-1].replace("R$", "").strip()
-            except Exception:
-                dados["Descontos"] = ""
+        # Perfil da última execução perfilada nesta sessão
+        st.write("🔬 Perfilamento:")
+        ultimo_perfil = st.session_state.get('ultimo_perfil')
+        if ultimo_perfil is None:
+            st.write("- Ative o perfilamento na barra lateral (ou PERFILAMENTO=1) e interaja com o aplicativo.")
+        else:
+            import pandas as pd
+            
+            st.write(
+                f"- Última execução perfilada: {ultimo_perfil.duracao * 1000:.0f} ms, "
+                f"pico de memória rastreada {ultimo_perfil.pico_memoria / (1024 * 1024):.1f} MB"
+            )
+            if ultimo_perfil.erro:
+                st.write(f"- {ultimo_perfil.erro}")
+            if ultimo_perfil.funcoes:
+                st.write("Funções com mais tempo próprio:")
+                st.dataframe(pd.DataFrame(ultimo_perfil.funcoes))
+            if ultimo_perfil.alocacoes:
+                st.write("Linhas com mais memória alocada (todas as threads do processo):")
+                st.dataframe(pd.DataFrame(ultimo_perfil.alocacoes))
+            col1, col2 = st.columns(2)
+            col1.download_button(
+                "Baixar perfil (.prof)", ultimo_perfil.perfil,
+                file_name=f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof",
+                mime="application/octet-stream", disabled=not ultimo_perfil.perfil
+            )
+            col2.download_button(
+                "Baixar relatório (texto)", ultimo_perfil.relatorio_texto(),
+                file_name=f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt", mime="text/plain"
+            )
         
-        # Captura o Valor Líquido
-        elif "líquido a receber" in linha_lower or "liquido a receber" in linha_lower or "valor líquido" in linha_lower or "valor liquido" in linha_lower:
+        # Informações do sistema
+        st.write("🔍 Informações do Sistema:")
+        st.write(f"- Python: {sys.version}")
+        st.write(f"- Sistema Operacional: {os.name}")
+        st.write(f"- Path do Python: {sys.executable}")
+
+        # Teste de processamento PDF
+        if st.button("Testar processamento de PDF"):
             try:
-                partes = linha.split()
-                for i, parte in enumerate(partes):
-                    if parte.lower() in ["receber", "líquido", "liquido"] and i + 1 < len(partes):
-                        dados["Valor Líquido"] = partes[i + 1].replace("R$", "").strip()
-                if not dados["Valor Líquido"] and len(partes) > 0:  # Fallback para método antigo
-                    dados["Valor Líquido"] = partes[-1].replace("R$", "").strip()
-            except Exception:
-                dados["Valor Líquido"] = ""
-    
-    # Retorna os dados como DataFrame para exibição na interface
-    return pd.DataFrame([dados])
-
-# Função para salvar dados extraídos e texto bruto
-def salvar_dados_extraidos(df_dados, nome_arquivo, conteudo_bytes, texto_extraido):
-    """
-    Salva os dados estruturados e o texto bruto extraído no banco de dados.
-    
-    Args:
-        df_dados: DataFrame com os dados estruturados
-        nome_arquivo: Nome do arquivo processado
-        conteudo_bytes: Conteúdo binário do arquivo
-        texto_extraido: Texto extraído do arquivo
-        
-    Returns:
-        ID do registro inserido
-    """
-    # Calcular hash do arquivo para identificação única
-    hash_arquivo = calcular_hash_arquivo(conteudo_bytes)
-    
-    # Conectar ao banco de dados
-    conn = sqlite3.connect(st.session_state['db_path'])
-    cursor = conn.cursor()
-    
-    try:
-        # Primeiro, salvar o arquivo e texto extraído
-        try:
-            cursor.execute('''
-                INSERT INTO arquivos_processados 
-                (nome_arquivo, hash_arquivo, tipo_arquivo, texto_extraido)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                nome_arquivo,
-                hash_arquivo,
-                nome_arquivo.split('.')[-1] if '.' in nome_arquivo else 'unknown',
-                texto_extraido
-            ))
-            arquivo_id = cursor.lastrowid
-        except sqlite3.IntegrityError:
-            # Se o hash já existe, recuperar o ID existente
-            cursor.execute("SELECT id FROM arquivos_processados WHERE hash_arquivo = ?", (hash_arquivo,))
-            resultado = cursor.fetchone()
-            if resultado:
-                arquivo_id = resultado[0]
-                st.warning(f"Arquivo com hash {hash_arquivo} já existe no banco (ID: {arquivo_id}).")
-            else:
-                st.error("Erro ao verificar arquivo existente.")
-                conn.close()
-                return None
+                # Criar um PDF simples para teste
+                from reportlab.pdfgen import canvas
+                import io
+                from pdf2image import convert_from_bytes
+                
+                # Criar um PDF em memória
+                pdf_buffer = io.BytesIO()
+                c = canvas.Canvas(pdf_buffer)
+                c.drawString(100, 750, "Teste de PDF para Poppler")
+                c.save()
+                pdf_bytes = pdf_buffer.getvalue()
+                
+                # Tentar converter para imagem
+                st.write("Convertendo PDF para imagem...")
+                with tempfile.TemporaryDirectory() as path:
+                    images = convert_from_bytes(pdf_bytes, output_folder=path)
+                    st.write(f"✅ PDF convertido com sucesso! Gerou {len(images)} imagem(ns).")
+                    
+                    # Mostrar a primeira imagem
+                    if images:
+                        st.image(images[0], caption="Imagem extraída do PDF")
+                
+            except Exception as e:
+                st.error(f"❌ Erro ao processar PDF: {str(e)}")
+                st.exception(e)
+
+    # Opções adicionais (sidebar) - definidas antes do upload para valerem no processamento
+    st.sidebar.subheader("⚙️ Configurações")
+    st.sidebar.write("**Ajustes de OCR:**")
+    ocr_qualidade = st.sidebar.select_slider(
+        "Qualidade do OCR (DPI)",
+        options=[150, 200, 250, 300],
+        value=300
+    )
+    st.sidebar.write("Qualidade mais alta = melhor OCR, mas mais lento.")
+    st.sidebar.write(
+        "Motor de OCR: " + ("Tesseract local" if OCR_MODO == "local" else "Google Vision (Tesseract como reserva)")
+    )
+    ocr_adaptativo = st.sidebar.checkbox(
+        "DPI adaptativo", value=True,
+        help=f"Tenta primeiro {DPI_INICIAL_ADAPTATIVO} DPI e só usa a qualidade máxima "
+             "quando a confiança ou os campos encontrados ficam baixos."
+    )
+
+    # Interface principal para upload de arquivo
+    st.subheader("📤 Upload de Contracheque")
+    arquivo = st.file_uploader("Faça upload de uma imagem ou PDF do contracheque", 
+                               type=["jpg", "jpeg", "png", "pdf"])
+
+    # Processamento do arquivo quando enviado
+    if arquivo is not None:
+        # Feedback para o usuário
+        st.write(f"Arquivo carregado: **{arquivo.name}**")
         
-        # Em seguida, salvar os dados estruturados
-        # Converter valores para float
-        dados_dict = df_dados.iloc[0].to_dict()
+        # Leitura do conteúdo do arquivo
+        conteudo = arquivo.read()
         
-        salario_base = 0.0
-        descontos = 0.0
-        valor_liquido = 0.0
+        # Criar colunas para exibir resultados lado a lado
+        col1, col2 = st.columns(2)
         
-        try:
-            if dados_dict.get('Salário Base'):
-                valor_str = dados_dict.get('Salário Base').replace('.', '').replace(',', '.')
-                salario_base = float(valor_str) if valor_str else 0.0
-        except (ValueError, AttributeError):
-            pass
-            
-        try:
-            if dados_dict.get('Descontos'):
-                valor_str = dados_dict.get('Descontos').replace('.', '').replace(',', '.')
-                descontos = float(valor_str) if valor_str else 0.0
-        except (ValueError, AttributeError):
-            pass
+        # Processar conforme o tipo de arquivo
+        if arquivo.type == "application/pdf":
+            with col1:
+                st.subheader("Visualização do PDF")
+                st.warning("Processando PDF... Isso pode levar alguns instantes.")
+                
+                # Converter a primeira página do PDF para imagem para visualização
+                try:
+                    from pdf2image import convert_from_bytes
+                    
+                    with tempfile.TemporaryDirectory() as path:
+                        imagens = convert_from_bytes(conteudo, dpi=150, first_page=1, last_page=1, output_folder=path)
+                        if imagens:
+                            st.image(imagens[0], caption="Primeira página do PDF", width=400)
+                except Exception as e:
+                    st.error(f"Erro ao visualizar PDF: {e}")
+                    st.info("A visualização falhou, mas tentaremos extrair o texto mesmo assim.")
             
-        try:
-            if dados_dict.get('Valor Líquido'):
-                valor_str = dados_dict.get('Valor Líquido').replace('.', '').replace(',', '.')
-                valor_liquido = float(valor_str) if valor_str else 0.0
-        except (ValueError, AttributeError):
-            pass
-        # Inserir dados na tabela de contracheques
-        cursor.execute('''
-            INSERT INTO contracheques 
-            (nome, matricula, cargo, mes_referencia, salario_base, descontos, valor_liquido, 
-             arquivo_fonte, hash_arquivo)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            dados_dict.get('Nome', ''),
-            dados_dict.get('Matrícula', ''),
-            dados_dict.get('Cargo', ''),
-            dados_dict.get('Mês/Ano', ''),
-            salario_base,
-            descontos,
-            valor_liquido,
-            nome_arquivo,
-            hash_arquivo
-        ))
-        
-        # Commit e fechar conexão
-        conn.commit()
-        conn.close()
-        
-        return arquivo_id
+            with col2:
+                st.subheader("Texto Extraído")
+                chave_documento = f"{calcular_hash_arquivo(conteudo)}:{ocr_qualidade}:{ocr_adaptativo}"
+                documento = obter_documento_pdf(chave_documento)
+                
+                # Áreas preenchidas à medida que as páginas ficam prontas
+                controle = st.empty()
+                progresso = st.empty()
+                area_texto = st.empty()
+                area_metricas = st.empty()
+                st.subheader("Dados Estruturados")
+                area_dados = st.empty()
+                
+                # Processar página a página; um documento interrompido sem cancelamento recomeça
+                erro_pdf = None
+                if not documento['concluido'] and not documento['cancelado']:
+                    documento['paginas'] = {}
+                    campos_parciais = extrair_campos_contracheque("")
+                    controle.button("⏹️ Cancelar processamento", on_click=cancelar_processamento_pdf, args=(chave_documento,))
+                    progresso.progress(0.0, text="Renderizando a primeira página...")
+                    import pandas as pd
+                    
+                    try:
+                        with closing(processar_pdf_paginas(conteudo, ocr_qualidade, ocr_adaptativo)) as paginas_pdf:
+                            for resultado in paginas_pdf:
+                                documento['paginas'][resultado['pagina']] = resultado
+                                documento['total'] = resultado['total_paginas']
+                                if resultado['refinada']:
+                                    texto_progresso = f"Página {resultado['pagina']} refinada em {ocr_qualidade} DPI"
+                                else:
+                                    texto_progresso = f"Página {resultado['pagina']} de {documento['total']} reconhecida"
+                                progresso.progress(len(documento['paginas']) / documento['total'], text=texto_progresso)
+                                
+                                # Texto e campos parciais (só a página nova é interpretada; o texto final é interpretado ao concluir)
+                                texto_parcial = montar_texto_pdf(documento['paginas'][n] for n in sorted(documento['paginas']))
+                                area_texto.container(height=300).text(texto_parcial)
+                                campos_pagina = extrair_campos_contracheque(resultado['texto'])
+                                campos_parciais.update({campo: valor for campo, valor in campos_pagina.items() if valor})
+                                area_dados.dataframe(pd.DataFrame([campos_parciais]))
+                        documento['concluido'] = True
+                    except ErroDocumento as e:
+                        erro_pdf = e
+                        descartar_documento_pdf(chave_documento)
+                    controle.empty()
+                    progresso.empty()
+                
+                if erro_pdf is not None:
+                    st.error(f"Erro ao processar PDF: {str(erro_pdf)}")
+                    st.warning("Conversão de PDF pode requerer instalação local. Por favor, tente enviar imagens diretas.")
+                else:
+                    resultados_pdf = [documento['paginas'][n] for n in sorted(documento['paginas'])]
+                    texto_extraido = montar_texto_pdf(resultados_pdf)
+                    metricas_paginas = [resultado['metricas'] for resultado in resultados_pdf]
+                    
+                    if documento['cancelado']:
+                        controle.info(
+                            f"Processamento cancelado: {len(resultados_pdf)} de {documento['total'] or '?'} página(s) "
+                            "reconhecida(s). Os dados abaixo consideram apenas essas páginas."
+                        )
+                        st.button("🔄 Processar documento inteiro", on_click=descartar_documento_pdf, args=(chave_documento,))
+                    
+                    area_texto.text_area("Texto Bruto", texto_extraido, height=300)
+                    with area_metricas.container():
+                        exibir_erros_ocr(metricas_paginas)
+                        exibir_metricas_ocr(metricas_paginas)
+                    
+                    # Processar o texto e mostrar dados estruturados
+                    with st.spinner("Processando informações..."):
+                        df_dados = processar_texto_contracheque(texto_extraido, "pdf")
+                        area_dados.dataframe(df_dados)
+                    
+                    # Opção para salvar os dados
+                    if st.button("Salvar Dados Extraídos"):
+                        caminho_salvo = salvar_dados_extraidos(df_dados, arquivo.name, conteudo, texto_extraido)
+                        if caminho_salvo:
+                            st.success(f"Dados salvos com sucesso no banco de dados (ID: {caminho_salvo})")
         
-    except Exception as e:
-        # Em caso de erro, fazer rollback
-        conn.rollback()
-        conn.close()
-        st.error(f"Erro ao salvar dados no banco: {str(e)}")
-        return None
-
-# Título principal do aplicativo
-st.title("🔍 OCR para Contracheques com Google Vision")
-st.write("Este aplicativo extrai dados de contracheques usando reconhecimento óptico de caracteres (OCR).")
-
-# Seção de diagnóstico para verificar a instalação do Poppler e Google Vision API
-with st.expander("Diagnóstico de Sistema", expanded=False):
-    st.subheader("Verificação de Sistema")
-
-    # Verificação direta de comandos do Poppler
-    if st.button("Verificar Instalação do Poppler"):
-        try:
-            # Tentar executar o comando `pdftoppm`
-            resultado = subprocess.run(
-                ["which", "pdftoppm"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+        elif arquivo.type in ["image/png", "image/jpeg", "image/jpg"]:
+            with col1:
+                st.subheader("Imagem Carregada")
+                from PIL import Image
+                imagem = Image.open(io.BytesIO(conteudo))
+                st.image(imagem, width=400)
             
-            if resultado.stdout.strip():
-                st.success(f"✅ pdftoppm encontrado em: {resultado.stdout.strip()}")
-
-                # Verificar a versão
-                resultado_versao = subprocess.run(
-                    ["pdftoppm", "-v"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                informacoes_versao = (
-                    resultado_versao.stderr.strip() 
-                    if resultado_versao.stderr.strip() 
-                    else resultado_versao.stdout.strip()
-                )
-                st.code(informacoes_versao)
-            else:
-                st.error("❌ pdftoppm não encontrado no sistema")
-                st.code(f"Erro: {resultado.stderr.strip()}")
-
-        except Exception as e:
-            st.error(f"❌ Erro ao verificar pdftoppm: {str(e)}")
-            st.exception(e)
-
-    # Verificar conexão com o Google Vision API
-    if st.button("Testar Conexão com Google Vision API"):
-        try:
-            # Inicializar cliente com as credenciais carregadas
-            client = vision.ImageAnnotatorClient(credentials=credentials)
-            
-            # Criar uma imagem simples para teste
-            from PIL import Image, ImageDraw
-            image = Image.new('RGB', (100, 30), color = (255, 255, 255))
-            d = ImageDraw.Draw(image)
-            d.text((10,10), "TEST", fill=(0,0,0))
-            
-            # Converter para bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
-            
-            # Enviar para a API
-            vision_image = vision.Image(content=img_byte_arr.getvalue())
-            response = client.text_detection(image=vision_image)
-            
-            if response.error.message:
-                st.error(f"❌ Erro na API: {response.error.message}")
-            else:
-                st.success("✅ Conexão com Google Vision API estabelecida com sucesso!")
-                texts = response.text_annotations
-                if texts:
-                    st.write(f"Texto detectado na imagem de teste: '{texts[0].description}'")
-                else:
-                    st.write("Nenhum texto detectado na imagem de teste.")
+            with col2:
+                st.subheader("Texto Extraído")
+                with st.spinner("Extraindo texto da imagem..."):
+                    metricas_paginas = []
+                    try:
+                        texto_extraido = processar_imagem(conteudo, ocr_adaptativo, metricas_paginas)
+                    except ErroDocumento as e:
+                        st.error(str(e))
+                        texto_extraido = None
+                    if texto_extraido is not None:
+                        st.text_area("Texto Bruto", texto_extraido, height=300)
+                        exibir_erros_ocr(metricas_paginas)
+                        exibir_metricas_ocr(metricas_paginas)
+                
+                if texto_extraido is not None:
+                    # Processar o texto e mostrar dados estruturados
+                    st.subheader("Dados Estruturados")
+                    with st.spinner("Processando informações..."):
+                        df_dados = processar_texto_contracheque(texto_extraido, "imagem")
+                        st.dataframe(df_dados)
                     
-        except Exception as e:
-            st.error(f"❌ Erro ao testar Google Vision API: {str(e)}")
-            st.exception(e)
-
-    # Diagnóstico do banco de dados
-    if st.button("Verificar Banco de Dados"):
-        resultado = diagnosticar_banco_dados()
-        if resultado["status"] == "ok":
-            st.success("✅ Banco de dados funcionando corretamente")
-            st.write(f"Caminho: {resultado['caminho_bd']}")
-            st.write("Tabelas encontradas:")
-            for tabela in resultado["tabelas"]:
-                st.write(f"- {tabela}: {resultado['contagens'][tabela]} registros")
+                    # Opção para salvar os dados
+                    if st.button("Salvar Dados Extraídos"):
+                        caminho_salvo = salvar_dados_extraidos(df_dados, arquivo.name, conteudo, texto_extraido)
+                        if caminho_salvo:
+                            st.success(f"Dados salvos com sucesso no banco de dados (ID: {caminho_salvo})")
+        
         else:
-            st.error(f"❌ Erro no banco de dados: {resultado['mensagem']}")
+            st.error("Formato de arquivo não suportado. Por favor, envie uma imagem (PNG, JPG) ou PDF.")
 
-    # Informações do sistema
-    st.write("🔍 Informações do Sistema:")
-    st.write(f"- Python: {sys.version}")
-    st.write(f"- Sistema Operacional: {os.name}")
-    st.write(f"- Path do Python: {sys.executable}")
-
-    # Teste de processamento PDF
-    if st.button("Testar processamento de PDF"):
-        try:
-            # Criar um PDF simples para teste
-            from reportlab.pdfgen import canvas
-            import io
-            from pdf2image import convert_from_bytes
-            
-            # Criar um PDF em memória
-            pdf_buffer = io.BytesIO()
-            c = canvas.Canvas(pdf_buffer)
-            c.drawString(100, 750, "Teste de PDF para Poppler")
-            c.save()
-            pdf_bytes = pdf_buffer.getvalue()
-            
-            # Tentar converter para imagem
-            st.write("Convertendo PDF para imagem...")
-            with tempfile.TemporaryDirectory() as path:
-                images = convert_from_bytes(pdf_bytes, output_folder=path)
-                st.write(f"✅ PDF convertido com sucesso! Gerou {len(images)} imagem(ns).")
-                
-                # Mostrar a primeira imagem
-                if images:
-                    st.image(images[0], caption="Imagem extraída do PDF")
-            
-        except Exception as e:
-            st.error(f"❌ Erro ao processar PDF: {str(e)}")
-            st.exception(e)
-
-# Interface principal para upload de arquivo
-st.subheader("📤 Upload de Contracheque")
-arquivo = st.file_uploader("Faça upload de uma imagem ou PDF do contracheque", 
-                           type=["jpg", "jpeg", "png", "pdf"])
-
-# Processamento do arquivo quando enviado
-if arquivo is not None:
-    # Feedback para o usuário
-    st.write(f"Arquivo carregado: **{arquivo.name}**")
-    
-    # Leitura do conteúdo do arquivo
-    conteudo = arquivo.read()
-    
-    # Criar colunas para exibir resultados lado a lado
-    col1, col2 = st.columns(2)
-    
-    # Processar conforme o tipo de arquivo
-    if arquivo.type == "application/pdf":
-        with col1:
-            st.subheader("Visualização do PDF")
-            st.warning("Processando PDF... Isso pode levar alguns instantes.")
-            
-            # Converter a primeira página do PDF para imagem para visualização
-            try:
-                with tempfile.TemporaryDirectory() as path:
-                    imagens = convert_from_bytes(conteudo, dpi=150, first_page=1, last_page=1, output_folder=path)
-                    if imagens:
-                        st.image(imagens[0], caption="Primeira página do PDF", width=400)
-            except Exception as e:
-                st.error(f"Erro ao visualizar PDF: {e}")
-                st.info("A visualização falhou, mas tentaremos extrair o texto mesmo assim.")
+    # Interface de histórico e relatórios
+    with st.expander("📊 Histórico e Relatórios", expanded=False):
+        st.subheader("Contracheques Processados")
         
-        with col2:
-            st.subheader("Texto Extraído")
-            with st.spinner("Extraindo texto do PDF..."):
-                texto_extraido = processar_pdf(conteudo)
-                st.text_area("Texto Bruto", texto_extraido, height=300)
-            
-            # Processar o texto e mostrar dados estruturados
-            st.subheader("Dados Estruturados")
-            with st.spinner("Processando informações..."):
-                df_dados = processar_texto_contracheque(texto_extraido)
-                st.dataframe(df_dados)
-            
-            # Opção para salvar os dados
-            if st.button("Salvar Dados Extraídos"):
-                caminho_salvo = salvar_dados_extraidos(df_dados, arquivo.name, conteudo, texto_extraido)
-                if caminho_salvo:
-                    st.success(f"Dados salvos com sucesso no banco de dados (ID: {caminho_salvo})")
-    
-    elif arquivo.type in ["image/png", "image/jpeg", "image/jpg"]:
+        # Filtros para consulta - Usado formato de texto para MM/AAAA para facilitar
+        col1, col2 = st.columns(2)
         with col1:
-            st.subheader("Imagem Carregada")
-            imagem = Image.open(io.BytesIO(conteudo))
-            st.image(imagem, width=400)
+            mes_inicial = st.text_input("Data Inicial (MM/AAAA)", "01/2023")
+        with col2:
+            mes_final = st.text_input("Data Final (MM/AAAA)", "12/2023")
         
+        col1, col2 = st.columns(2)
+        with col1:
+            filtro_nome = st.text_input("Filtrar por Nome", "")
         with col2:
-            st.subheader("Texto Extraído")
-            with st.spinner("Extraindo texto da imagem..."):
-                texto_extraido = extrair_texto_imagem(conteudo)
+            filtro_matricula = st.text_input("Filtrar por Matrícula", "")
+        
+        # Botão para consultar
+        if st.button("Consultar Histórico"):
+            import pandas as pd
+            
+            try:
+                # Converter MM/AAAA para datas completas (primeiro dia do mês)
+                data_inicio = datetime.strptime(f"01/{mes_inicial}", "%d/%m/%Y").strftime("%Y-%m-%d")
+                # Último dia do mês para a data final (simplificação)
+                data_fim = datetime.strptime(f"28/{mes_final}", "%d/%m/%Y").strftime("%Y-%m-%d")
                 
-                # Se o Google Vision falhar, tente o fallback
-                if texto_extraido.startswith("Erro"):
-                    st.warning(f"Google Vision falhou. Tentando OCR local... {texto_extraido}")
-                    texto_extraido = extrair_texto_imagem_fallback(conteudo)
+                # Consultar banco de dados
+                df_historico = consultar_historico(
+                    data_inicio, 
+                    data_fim, 
+                    filtro_nome, 
+                    filtro_matricula
+                )
                 
-                st.text_area("Texto Bruto", texto_extraido, height=300)
-            
-                       # Processar o texto e mostrar dados estruturados
-            st.subheader("Dados Estruturados")
-            with st.spinner("Processando informações..."):
-                df_dados = processar_texto_contracheque(texto_extraido)
-                st.dataframe(df_dados)
-            
-            # Opção para salvar os dados
-            if st.button("Salvar Dados Extraídos"):
-                caminho_salvo = salvar_dados_extraidos(df_dados, arquivo.name, conteudo, texto_extraido)
-                if caminho_salvo:
-                    st.success(f"Dados salvos com sucesso no banco de dados (ID: {caminho_salvo})")
-    
-    else:
-        st.error("Formato de arquivo não suportado. Por favor, envie uma imagem (PNG, JPG) ou PDF.")
-
-# Interface de histórico e relatórios
-with st.expander("📊 Histórico e Relatórios", expanded=False):
-    st.subheader("Contracheques Processados")
-    
-    # Filtros para consulta - Usado formato de texto para MM/AAAA para facilitar
-    col1, col2 = st.columns(2)
-    with col1:
-        mes_inicial = st.text_input("Data Inicial (MM/AAAA)", "01/2023")
-    with col2:
-        mes_final = st.text_input("Data Final (MM/AAAA)", "12/2023")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        filtro_nome = st.text_input("Filtrar por Nome", "")
-    with col2:
-        filtro_matricula = st.text_input("Filtrar por Matrícula", "")
-    
-    # Botão para consultar
-    if st.button("Consultar Histórico"):
+                # Exibir resultados
+                if not df_historico.empty:
+                    st.write(f"Foram encontrados {len(df_historico)} registros.")
+                    
+                    # Formatação de valores monetários para exibição
+                    df_display = df_historico.copy()
+                    for col in ['salario_base', 'descontos', 'valor_liquido']:
+                        if col in df_display.columns:
+                            df_display[col] = df_display[col].apply(lambda x: f"R$ {x:.2f}".replace('.', ',') if pd.notnull(x) else "")
+                    
+                    # Formatar data de processamento para formato brasileiro
+                    if 'data_processamento' in df_display.columns:
+                        df_display['data_processamento'] = pd.to_datetime(df_display['data_processamento']).dt.strftime('%d/%m/%Y %H:%M')
+                    
+                    st.dataframe(df_display)
+                else:
+                    st.info("Nenhum registro encontrado com os filtros selecionados.")
+            except ValueError as e:
+                st.error(f"Formato de data inválido. Certifique-se de usar o formato MM/AAAA. Erro: {str(e)}")
+        
+        # Exportação com os mesmos filtros (o arquivo só é gerado ao clicar no download)
+        col1, col2 = st.columns(2)
+        with col1:
+            formato_exportacao = st.selectbox(
+                "Formato de exportação", list(FORMATOS_EXPORTACAO),
+                format_func=lambda formato: FORMATOS_EXPORTACAO[formato][0]
+            )
         try:
-            # Converter MM/AAAA para datas completas (primeiro dia do mês)
-            data_inicio = datetime.strptime(f"01/{mes_inicial}", "%d/%m/%Y").strftime("%Y-%m-%d")
-            # Último dia do mês para a data final (simplificação)
-            data_fim = datetime.strptime(f"28/{mes_final}", "%d/%m/%Y").strftime("%Y-%m-%d")
-            
-            # Consultar banco de dados
-            df_historico = consultar_historico(
-                data_inicio, 
-                data_fim, 
-                filtro_nome, 
-                filtro_matricula
+            periodo_exportacao = (
+                datetime.strptime(f"01/{mes_inicial}", "%d/%m/%Y").strftime("%Y-%m-%d"),
+                datetime.strptime(f"28/{mes_final}", "%d/%m/%Y").strftime("%Y-%m-%d"),
             )
+        except ValueError:
+            periodo_exportacao = None
+        
+        # Exportações grandes vão pela linha de comando (o download fica inteiro na memória do servidor)
+        total_exportacao = None
+        if periodo_exportacao is not None:
+            total_exportacao = obter_total_exportacao(
+                st.session_state['db_path'], *periodo_exportacao, filtro_nome, filtro_matricula, obter_versao_dados()
+            )
+        exportacao_grande = total_exportacao is not None and total_exportacao > LIMITE_LINHAS_EXPORTACAO_INTERFACE
+        with col2:
+            st.download_button(
+                label="Exportar Histórico",
+                data=lambda: gerar_exportacao_historico(
+                    formato_exportacao, *periodo_exportacao, filtro_nome, filtro_matricula
+                ),
+                file_name=f"contracheques_{datetime.now().strftime('%Y%m%d_%H%M%S')}{FORMATOS_EXPORTACAO[formato_exportacao][1]}",
+                mime=FORMATOS_EXPORTACAO[formato_exportacao][2],
+                disabled=periodo_exportacao is None or exportacao_grande,
+                help="Exporta todos os registros do período e dos filtros acima, lidos do banco em lotes."
+            )
+        if exportacao_grande:
+            comando = (
+                f"python manutencao.py exportar --formato {formato_exportacao} "
+                f"--saida contracheques{FORMATOS_EXPORTACAO[formato_exportacao][1]} "
+                f"--inicio {periodo_exportacao[0]} --fim {periodo_exportacao[1]}"
+            )
+            if filtro_nome:
+                comando += f' --nome "{filtro_nome}"'
+            if filtro_matricula:
+                comando += f' --matricula "{filtro_matricula}"'
+            st.info(
+                f"{total_exportacao} registros: acima do limite de {LIMITE_LINHAS_EXPORTACAO_INTERFACE} da interface. "
+                f"Use `{comando}` ou restrinja os filtros."
+            )
+
+    # Nova seção para consulta de texto bruto
+    with st.expander("📝 Consulta de Textos Brutos", expanded=False):
+        st.subheader("Consultar Textos Extraídos")
+        
+        # Filtros para consulta
+        col1, col2 = st.columns(2)
+        with col1:
+            texto_mes_inicial = st.text_input("Data Inicial (MM/AAAA)", "01/2023", key="texto_mes_inicial")
+        with col2:
+            texto_mes_final = st.text_input("Data Final (MM/AAAA)", "12/2023", key="texto_mes_final")
+        
+        nome_arquivo = st.text_input("Filtrar por Nome de Arquivo", "")
+        
+        # Botão para consultar
+        if st.button("Buscar Textos"):
+            import pandas as pd
             
-            # Exibir resultados
-            if not df_historico.empty:
-                st.write(f"Foram encontrados {len(df_historico)} registros.")
-                
-                # Formatação de valores monetários para exibição
-                df_display = df_historico.copy()
-                for col in ['salario_base', 'descontos', 'valor_liquido']:
-                    if col in df_display.columns:
-                        df_display[col] = df_display[col].apply(lambda x: f"R$ {x:.2f}".replace('.', ',') if pd.notnull(x) else "")
-                
-                # Formatar data de processamento para formato brasileiro
-                if 'data_processamento' in df_display.columns:
-                    df_display['data_processamento'] = pd.to_datetime(df_display['data_processamento']).dt.strftime('%d/%m/%Y %H:%M')
+            try:
+                # Converter MM/AAAA para datas completas
+                data_inicio = datetime.strptime(f"01/{texto_mes_inicial}", "%d/%m/%Y").strftime("%Y-%m-%d")
+                data_fim = datetime.strptime(f"28/{texto_mes_final}", "%d/%m/%Y").strftime("%Y-%m-%d")
                 
-                st.dataframe(df_display)
+                # Consultar banco de dados
+                df_textos = consultar_textos_brutos(
+                    data_inicio, 
+                    data_fim, 
+                    nome_arquivo
+                )
                 
-                # Opção para exportar para Excel
-                if st.button("Exportar para Excel"):
-                    # Criar um buffer na memória
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        df_historico.to_excel(writer, sheet_name='Contracheques', index=False)
-                        
-                        # Formatar colunas monetárias no Excel
-                        workbook = writer.book
-                        worksheet = writer.sheets['Contracheques']
-                        formato_moeda = workbook.add_format({'num_format': 'R$ #,##0.00'})
-                        
-                        # Aplicar formato monetário para colunas específicas
-                        for idx, col in enumerate(df_historico.columns):
-                            if col in ['salario_base', 'descontos', 'valor_liquido']:
-                                worksheet.set_column(idx, idx, 15, formato_moeda)
+                # Exibir resultados
+                if not df_textos.empty:
+                    st.write(f"Foram encontrados {len(df_textos)} textos extraídos.")
+                    
+                    # Mostrar lista de arquivos
+                    st.subheader("Arquivos Disponíveis")
+                    
+                    # Criar uma tabela simplificada para seleção
+                    df_simplificado = df_textos[['id', 'nome_arquivo', 'data_processamento']].copy()
+                    df_simplificado['data_processamento'] = pd.to_datetime(df_simplificado['data_processamento']).dt.strftime('%d/%m/%Y %H:%M')
+                    
+                    st.dataframe(df_simplificado)
                     
-                    # Download do arquivo
-                    buffer.seek(0)
-                    st.download_button(
-                        label="Download Excel",
-                        data=buffer,
-                        file_name=f"contracheques_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.ms-excel"
+                    # Seleção para visualizar texto específico
+                    texto_id = st.selectbox(
+                        "Selecione um arquivo para visualizar seu texto:", 
+                        df_textos['id'].tolist(),
+                        format_func=lambda x: f"ID {x}: {df_textos[df_textos['id'] == x]['nome_arquivo'].values[0]}"
                     )
-            else:
-                st.info("Nenhum registro encontrado com os filtros selecionados.")
-        except ValueError as e:
-            st.error(f"Formato de data inválido. Certifique-se de usar o formato MM/AAAA. Erro: {str(e)}")
+                    
+                    if texto_id:
+                        texto_selecionado = df_textos[df_textos['id'] == texto_id]['texto_extraido'].values[0]
+                        st.subheader(f"Texto do arquivo: {df_textos[df_textos['id'] == texto_id]['nome_arquivo'].values[0]}")
+                        st.text_area("Conteúdo Extraído", texto_selecionado, height=400)
+                        
+                        # Opção para processar o texto
+                        if st.button("Processar Texto Selecionado"):
+                            df_dados_processados = processar_texto_contracheque(texto_selecionado)
+                            st.subheader("Dados Estruturados do Texto")
+                            st.dataframe(df_dados_processados)
+                else:
+                    st.info("Nenhum texto encontrado com os filtros selecionados.")
+            except ValueError as e:
+                st.error(f"Formato de data inválido. Certifique-se de usar o formato MM/AAAA. Erro: {str(e)}")
 
-# Nova seção para consulta de texto bruto
-with st.expander("📝 Consulta de Textos Brutos", expanded=False):
-    st.subheader("Consultar Textos Extraídos")
-    
-    # Filtros para consulta
-    col1, col2 = st.columns(2)
-    with col1:
-        texto_mes_inicial = st.text_input("Data Inicial (MM/AAAA)", "01/2023", key="texto_mes_inicial")
-    with col2:
-        texto_mes_final = st.text_input("Data Final (MM/AAAA)", "12/2023", key="texto_mes_final")
-    
-    nome_arquivo = st.text_input("Filtrar por Nome de Arquivo", "")
-    
-    # Botão para consultar
-    if st.button("Buscar Textos"):
-        try:
-            # Converter MM/AAAA para datas completas
-            data_inicio = datetime.strptime(f"01/{texto_mes_inicial}", "%d/%m/%Y").strftime("%Y-%m-%d")
-            data_fim = datetime.strptime(f"28/{texto_mes_final}", "%d/%m/%Y").strftime("%Y-%m-%d")
-            
-            # Consultar banco de dados
-            df_textos = consultar_textos_brutos(
-                data_inicio, 
-                data_fim, 
-                nome_arquivo
-            )
-            
-            # Exibir resultados
-            if not df_textos.empty:
-                st.write(f"Foram encontrados {len(df_textos)} textos extraídos.")
-                
-                # Mostrar lista de arquivos
-                st.subheader("Arquivos Disponíveis")
-                
-                # Criar uma tabela simplificada para seleção
-                df_simplificado = df_textos[['id', 'nome_arquivo', 'data_processamento']].copy()
-                df_simplificado['data_processamento'] = pd.to_datetime(df_simplificado['data_processamento']).dt.strftime('%d/%m/%Y %H:%M')
-                
-                st.dataframe(df_simplificado)
-                
-                # Seleção para visualizar texto específico
-                texto_id = st.selectbox(
-                    "Selecione um arquivo para visualizar seu texto:", 
-                    df_textos['id'].tolist(),
-                    format_func=lambda x: f"ID {x}: {df_textos[df_textos['id'] == x]['nome_arquivo'].values[0]}"
+    # Seção de gráficos
+    with st.expander("📈 Análise Gráfica", expanded=False):
+        st.subheader("Gráficos e Visualizações")
+        
+        # Filtros para gráficos
+        filtro_matricula_grafico = st.text_input("Matrícula para Análise", "", key="matricula_grafico")
+        
+        if st.button("Gerar Gráficos"):
+            if filtro_matricula_grafico:
+                # Consultar os agregados da matrícula (com cache por versão dos dados)
+                df_grafico, grafico_png = obter_painel_matricula(
+                    st.session_state['db_path'], filtro_matricula_grafico, obter_versao_dados()
                 )
                 
-                if texto_id:
-                    texto_selecionado = df_textos[df_textos['id'] == texto_id]['texto_extraido'].values[0]
-                    st.subheader(f"Texto do arquivo: {df_textos[df_textos['id'] == texto_id]['nome_arquivo'].values[0]}")
-                    st.text_area("Conteúdo Extraído", texto_selecionado, height=400)
+                if not df_grafico.empty:
+                    st.write(f"Análise para matrícula: {filtro_matricula_grafico}")
                     
-                    # Opção para processar o texto
-                    if st.button("Processar Texto Selecionado"):
-                        df_dados_processados = processar_texto_contracheque(texto_selecionado)
-                        st.subheader("Dados Estruturados do Texto")
-                        st.dataframe(df_dados_processados)
+                    # Exibir gráfico mensal
+                    if grafico_png:
+                        st.image(grafico_png)
+                    else:
+                        st.warning("São necessários pelo menos 2 meses de referência para gerar gráficos comparativos.")
+                    
+                    # Tabela de dados utilizados
+                    st.subheader("Dados utilizados na análise")
+                    st.dataframe(formatar_agregados_exibicao(df_grafico))
+                else:
+                    st.warning(f"Nenhum registro encontrado para a matrícula {filtro_matricula_grafico}.")
             else:
-                st.info("Nenhum texto encontrado com os filtros selecionados.")
-        except ValueError as e:
-            st.error(f"Formato de data inválido. Certifique-se de usar o formato MM/AAAA. Erro: {str(e)}")
-
-# Seção de gráficos
-with st.expander("📈 Análise Gráfica", expanded=False):
-    st.subheader("Gráficos e Visualizações")
-    
-    # Filtros para gráficos
-    filtro_matricula_grafico = st.text_input("Matrícula para Análise", "", key="matricula_grafico")
-    
-    if st.button("Gerar Gráficos"):
-        if filtro_matricula_grafico:
-            # Consultar dados para a matrícula específica
-            conn = sqlite3.connect(st.session_state['db_path'])
-            df_grafico = pd.read_sql_query(
-                "SELECT * FROM contracheques WHERE matricula = ? ORDER BY data_processamento",
-                conn, 
-                params=[filtro_matricula_grafico]
-            )
-            conn.close()
-            
-            if not df_grafico.empty:
-                st.write(f"Análise para matrícula: {filtro_matricula_grafico}")
-                
-                # Gerar gráfico de valor líquido
-                gerar_grafico_valor_liquido(df_grafico)
-                
-                # Tabela de dados utilizados
-                st.subheader("Dados utilizados na análise")
-                # Formatação para exibição
-                df_display = df_grafico.copy()
-                for col in ['salario_base', 'descontos', 'valor_liquido']:
-                    if col in df_display.columns:
-                        df_display[col] = df_display[col].apply(lambda x: f"R$ {x:.2f}".replace('.', ',') if pd.notnull(x) else "")
+                st.warning("Por favor, informe uma matrícula para gerar os gráficos.")
+        
+        # Painel geral da organização
+        st.subheader("Painel da Organização")
+        col1, col2 = st.columns(2)
+        with col1:
+            painel_mes_inicial = st.text_input("Competência Inicial (MM/AAAA)", "", key="painel_mes_inicial")
+        with col2:
+            painel_mes_final = st.text_input("Competência Final (MM/AAAA)", "", key="painel_mes_final")
+        
+        if st.button("Gerar Painel da Organização"):
+            try:
+                # Converter MM/AAAA para AAAA-MM (vazio = sem filtro)
+                competencia_inicio = datetime.strptime(painel_mes_inicial, "%m/%Y").strftime("%Y-%m") if painel_mes_inicial else None
+                competencia_fim = datetime.strptime(painel_mes_final, "%m/%Y").strftime("%Y-%m") if painel_mes_final else None
                 
-                if 'data_processamento' in df_display.columns:
-                    df_display['data_processamento'] = pd.to_datetime(df_display['data_processamento']).dt.strftime('%d/%m/%Y')
+                df_painel, grafico_png = obter_painel_organizacao(
+                    st.session_state['db_path'], competencia_inicio, competencia_fim, obter_versao_dados()
+                )
                 
-                st.dataframe(df_display)
-            else:
-                st.warning(f"Nenhum registro encontrado para a matrícula {filtro_matricula_grafico}.")
-        else:
-            st.warning("Por favor, informe uma matrícula para gerar os gráficos.")
-
-# Informações adicionais e instruções
-with st.expander("ℹ️ Informações sobre o aplicativo"):
-    st.write("""
-    ## Como usar o aplicativo
-    1. Carregue um arquivo de contracheque (imagem ou PDF).
-    2. O aplicativo processará automaticamente o arquivo e extrairá o texto.
-    3. Os dados identificados serão exibidos na tabela "Dados Estruturados".
-    4. Você pode salvar os dados extraídos no banco de dados para uso futuro.
-    5. Use a seção "Histórico e Relatórios" para consultar dados anteriores.
-    6. Use a seção "Consulta de Textos Brutos" para acessar os textos extraídos originais.
-    7. Use a seção "Análise Gráfica" para visualizar tendências ao longo do tempo.
-    
-    ## Limitações
-    - A precisão do OCR pode variar dependendo da qualidade da imagem.
-    - Alguns documentos com layout complexo podem não ser processados corretamente.
-    - Recomenda-se verificar manualmente os dados extraídos para garantir a precisão.
-    
-    ## Privacidade
-    - Os dados são armazenados localmente no banco de dados SQLite.
-    - Nenhuma informação é enviada para servidores externos, exceto a imagem para o Google Vision API.
-    """)
-
-# Rodapé da aplicação
-st.markdown("---")
-st.markdown("**OCR de Contracheques** | Desenvolvido com Google Vision API e Streamlit")
-st.markdown("Versão 1.2 | © 2023 - Todos os direitos reservados")
-
-# Contador de processamentos (simples)
-if 'contador_processamentos' not in st.session_state:
-    st.session_state.contador_processamentos = 0
-
-# Incrementar contador quando um arquivo é processado com sucesso
-if arquivo is not None and 'df_dados' in locals():
-    st.session_state.contador_processamentos += 1
-
-# Exibir estatísticas de uso
-st.sidebar.subheader("📈 Estatísticas")
-st.sidebar.write(f"Documentos processados: {st.session_state.contador_processamentos}")
-st.sidebar.write(f"Sessão iniciada: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-
-# Opções adicionais (sidebar)
-st.sidebar.subheader("⚙️ Configurações")
-st.sidebar.write("**Ajustes de OCR:**")
-ocr_qualidade = st.sidebar.select_slider(
-    "Qualidade do OCR (DPI)",
-    options=[150, 200, 250, 300],
-    value=300
-)
-st.sidebar.write("Qualidade mais alta = melhor OCR, mas mais lento.")
-
-# Modo de segurança (evita processamento acidental de documentos sensíveis)
-modo_seguro = st.sidebar.checkbox("Modo de segurança", value=True, 
-                             help="Quando ativado, exige confirmação antes de processar documentos.")
-
-# Confirmação quando o modo de segurança está ativado
-if modo_seguro and arquivo is not None:
-    st.sidebar.success("🔒 Documento processado com modo de segurança ativado.")
-
-# Backup do banco de dados
-st.sidebar.subheader("🔄 Backup de Dados")
-if st.sidebar.button("Fazer Backup do Banco"):
-    try:
-        # Ler o arquivo do banco de dados
-        with open(st.session_state['db_path'], 'rb') as f:
-            dados_banco = f.read()
+                if not df_painel.empty:
+                    ultimo = df_painel.iloc[-1]
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Funcionários (último mês)", int(ultimo['funcionarios']))
+                    col2.metric("Folha Bruta (último mês)", f"R$ {ultimo['total_bruto']:.2f}".replace('.', ','))
+                    col3.metric("Folha Líquida (último mês)", f"R$ {ultimo['total_liquido']:.2f}".replace('.', ','))
+                    
+                    if grafico_png:
+                        st.image(grafico_png)
+                    
+                    st.dataframe(formatar_agregados_exibicao(df_painel))
+                else:
+                    st.info("Nenhum dado agregado encontrado para o período selecionado.")
+            except ValueError as e:
+                st.error(f"Formato de data inválido. Certifique-se de usar o formato MM/AAAA. Erro: {str(e)}")
+
+    # Informações adicionais e instruções
+    with st.expander("ℹ️ Informações sobre o aplicativo"):
+        st.write("""
+        ## Como usar o aplicativo
+        1. Carregue um arquivo de contracheque (imagem ou PDF).
+        2. O aplicativo processará automaticamente o arquivo e extrairá o texto.
+        3. Os dados identificados serão exibidos na tabela "Dados Estruturados".
+        4. Você pode salvar os dados extraídos no banco de dados para uso futuro.
+        5. Use a seção "Histórico e Relatórios" para consultar dados anteriores.
+        6. Use a seção "Consulta de Textos Brutos" para acessar os textos extraídos originais.
+        7. Use a seção "Análise Gráfica" para visualizar tendências ao longo do tempo.
         
-        # Criar nome do arquivo de backup com timestamp
-        nome_backup = f"backup_contracheques_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        ## Limitações
+        - A precisão do OCR pode variar dependendo da qualidade da imagem.
+        - Alguns documentos com layout complexo podem não ser processados corretamente.
+        - Recomenda-se verificar manualmente os dados extraídos para garantir a precisão.
         
-        # Oferecer para download
-        st.sidebar.download_button(
-            label="Download do Backup",
-            data=dados_banco,
-            file_name=nome_backup,
-            mime="application/octet-stream"
-        )
-        st.sidebar.success("✅ Backup pronto para download!")
-    except Exception as e:
-        st.sidebar.error(f"❌ Erro ao criar backup: {str(e)}")
+        ## Privacidade
+        - Os dados são armazenados localmente no banco de dados SQLite.
+        - Nenhuma informação é enviada para servidores externos, exceto a imagem para o Google Vision API.
+        - Com a variável de ambiente `OCR_MODO=local`, o OCR é feito apenas com Tesseract, sem nenhum envio externo.
+        """)
+
+    # Rodapé da aplicação
+    st.markdown("---")
+    st.markdown("**OCR de Contracheques** | Desenvolvido com Google Vision API e Streamlit")
+    st.markdown("Versão 1.2 | © 2023 - Todos os direitos reservados")
+
+    # Contador de processamentos (simples)
+    if 'contador_processamentos' not in st.session_state:
+        st.session_state.contador_processamentos = 0
+        st.session_state.documentos_contabilizados = set()
+
+    # Incrementar contador uma vez por documento (o script é reexecutado a cada interação)
+    if arquivo is not None and 'df_dados' in locals():
+        hash_documento = calcular_hash_arquivo(conteudo)
+        if hash_documento not in st.session_state.documentos_contabilizados:
+            st.session_state.documentos_contabilizados.add(hash_documento)
+            st.session_state.contador_processamentos += 1
+
+    # Exibir estatísticas de uso
+    st.sidebar.subheader("📈 Estatísticas")
+    st.sidebar.write(f"Documentos processados: {st.session_state.contador_processamentos}")
+    st.sidebar.write(f"Sessão iniciada: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+
+    # Modo de segurança (evita processamento acidental de documentos sensíveis)
+    modo_seguro = st.sidebar.checkbox("Modo de segurança", value=True, 
+                                 help="Quando ativado, exige confirmação antes de processar documentos.")
+
+    # Confirmação quando o modo de segurança está ativado
+    if modo_seguro and arquivo is not None:
+        st.sidebar.success("🔒 Documento processado com modo de segurança ativado.")
+
+    # Backup do banco de dados
+    st.sidebar.subheader("🔄 Backup de Dados")
+    if st.sidebar.button("Fazer Backup do Banco"):
+        try:
+            # Ler o arquivo do banco de dados
+            with open(st.session_state['db_path'], 'rb') as f:
+                dados_banco = f.read()
+            
+            # Criar nome do arquivo de backup com timestamp
+            nome_backup = f"backup_contracheques_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+            
+            # Oferecer para download
+            st.sidebar.download_button(
+                label="Download do Backup",
+                data=dados_banco,
+                file_name=nome_backup,
+                mime="application/octet-stream"
+            )
+            st.sidebar.success("✅ Backup pronto para download!")
+        except Exception as e:
+            st.sidebar.error(f"❌ Erro ao criar backup: {str(e)}")
+
+    # Administração: perfilamento das próximas execuções do script
+    st.sidebar.subheader("🛠️ Administração")
+    st.sidebar.checkbox(
+        "Perfilar execuções", key='perfilamento_admin', value=perfilamento.PERFILAMENTO_ATIVO,
+        disabled=perfilamento.PERFILAMENTO_ATIVO,
+        help="Mede cada execução com cProfile e tracemalloc; o resultado aparece no Diagnóstico de Sistema."
+    )
+
+    # Registrar a duração desta execução do script (exibida no diagnóstico)
+    st.session_state.setdefault('tempos_execucao', []).append((time.perf_counter() - inicio_execucao) * 1000)
+    st.session_state['tempos_execucao'] = st.session_state['tempos_execucao'][-50:]
+    
+    execucao_completa = True
+finally:
+    # Encerrar o perfilamento desta execução, também quando ela é interrompida
+    # (st.stop ou uma nova execução levantam StopException/RerunException)
+    if perfilador is not None:
+        resultado_perfil = perfilador.parar()
+        if execucao_completa:
+            st.session_state['ultimo_perfil'] = resultado_perfil
@@ -0,0 +1,208 @@
+"""
+Armazenamento endereçado por conteúdo dos arquivos originais enviados.
+
+Cada arquivo é gravado uma única vez, com o nome igual ao seu SHA-256
+(o mesmo hash_arquivo do banco), em subdiretórios pelos primeiros
+caracteres do hash: arquivos/ab/cd/abcd.... A gravação lê a origem em
+blocos, calculando o hash enquanto escreve um arquivo temporário no mesmo
+disco, que é renomeado ao final; se o hash já existir, o temporário é
+descartado.
+
+Os arquivos ficam em CONTRACHEQUES_ARQUIVOS (padrão: diretório "arquivos"
+ao lado do banco) e podem ser relidos do disco para um novo OCR, por
+caminho ou mapeados na memória (mmap), sem carregar uma cópia inteira.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Diretório do armazenamento (por padrão, ao lado do banco de dados)
+DIRETORIO_ARQUIVOS = Path(os.environ.get(
+    "CONTRACHEQUES_ARQUIVOS",
+    Path(os.environ.get("CONTRACHEQUES_DB", str(Path("./data") / "contracheques.db"))).parent / "arquivos"
+))
+
+# Tamanho dos blocos lidos da origem durante a gravação
+TAMANHO_BLOCO = 1024 * 1024
+
+# Arquivos sem referência no banco só são removidos depois deste tempo (em segundos),
+# para não apagar um arquivo gravado cuja transação ainda não terminou
+CARENCIA_ORFAOS = 24 * 3600
+
+# Diretório dos arquivos temporários em gravação (mesmo disco, para o rename ser atômico)
+_DIRETORIO_TEMPORARIO = "tmp"
+
+
+# Função para obter o caminho de um arquivo pelo hash
+def caminho_arquivo(hash_arquivo):
+    return DIRETORIO_ARQUIVOS / hash_arquivo[:2] / hash_arquivo[2:4] / hash_arquivo
+
+# Função para verificar se um arquivo está armazenado
+def arquivo_existe(hash_arquivo):
+    return caminho_arquivo(hash_arquivo).is_file()
+
+# Função para ler a origem em blocos (bytes, memoryview ou arquivo aberto)
+def _blocos(origem):
+    if isinstance(origem, (bytes, bytearray, memoryview)):
+        # Fatias de memoryview não copiam o conteúdo
+        visao = memoryview(origem)
+        for inicio in range(0, len(visao), TAMANHO_BLOCO):
+            yield visao[inicio:inicio + TAMANHO_BLOCO]
+        return
+
+    posicao = origem.tell() if origem.seekable() else None
+    if posicao is not None:
+        origem.seek(0)
+    try:
+        while True:
+            bloco = origem.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            yield bloco
+    finally:
+        if posicao is not None:
+            origem.seek(posicao)
+
+# Função para gravar um arquivo no armazenamento
+def guardar_arquivo(origem):
+    """
+    Grava o conteúdo no armazenamento, calculando o SHA-256 durante a escrita.
+
+    Args:
+        origem: Bytes do arquivo ou arquivo aberto em modo binário (ex.: o
+            UploadedFile do Streamlit; a posição de leitura é preservada)
+
+    Returns:
+        Tupla (hash SHA-256, caminho do arquivo armazenado, True se o
+        arquivo ainda não existia)
+    """
+    diretorio_temporario = DIRETORIO_ARQUIVOS / _DIRETORIO_TEMPORARIO
+    diretorio_temporario.mkdir(parents=True, exist_ok=True)
+
+    sha256 = hashlib.sha256()
+    descritor, caminho_temporario = tempfile.mkstemp(dir=diretorio_temporario)
+    try:
+        with os.fdopen(descritor, "wb") as temporario:
+            for bloco in _blocos(origem):
+                sha256.update(bloco)
+                temporario.write(bloco)
+            temporario.flush()
+            os.fsync(temporario.fileno())
+
+        hash_arquivo = sha256.hexdigest()
+        destino = caminho_arquivo(hash_arquivo)
+        if destino.is_file():
+            # Conteúdo já armazenado: renovar a data para a carência da coleta de órfãos
+            os.utime(destino)
+            return hash_arquivo, destino, False
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(caminho_temporario, 0o444)
+        os.replace(caminho_temporario, destino)
+        return hash_arquivo, destino, True
+    finally:
+        if os.path.exists(caminho_temporario):
+            os.unlink(caminho_temporario)
+
+# Função para abrir um arquivo armazenado para leitura
+def abrir_arquivo(hash_arquivo):
+    """
+    Abre o arquivo armazenado em modo binário.
+
+    Raises:
+        FileNotFoundError: Se o hash não estiver no armazenamento
+    """
+    return open(caminho_arquivo(hash_arquivo), "rb")
+
+# Função para mapear um arquivo armazenado na memória
+@contextmanager
+def mapear_arquivo(hash_arquivo):
+    """
+    Mapeia o arquivo armazenado na memória (somente leitura). O objeto mmap
+    pode ser fatiado como bytes ou lido como arquivo (ex.: Image.open),
+    sem copiar o conteúdo inteiro.
+    """
+    with abrir_arquivo(hash_arquivo) as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+
+# Função para listar os arquivos armazenados
+def listar_arquivos():
+    """
+    Percorre o armazenamento.
+
+    Returns:
+        Gerador de tuplas (hash, caminho)
+    """
+    if not DIRETORIO_ARQUIVOS.is_dir():
+        return
+    for caminho in DIRETORIO_ARQUIVOS.glob("??/??/*"):
+        if caminho.is_file() and caminho.name.startswith(caminho.parent.parent.name + caminho.parent.name):
+            yield caminho.name, caminho
+
+# Função para obter a quantidade e o tamanho total dos arquivos armazenados
+def estatisticas_armazenamento():
+    quantidade = 0
+    tamanho = 0
+    for _, caminho in listar_arquivos():
+        quantidade += 1
+        tamanho += caminho.stat().st_size
+    return {"diretorio": str(DIRETORIO_ARQUIVOS), "arquivos": quantidade, "bytes": tamanho}
+
+# Função para remover arquivos sem referência no banco
+def remover_arquivos_orfaos(referenciados, carencia=CARENCIA_ORFAOS, simular=False):
+    """
+    Remove os arquivos cujo hash não está em referenciados e que não foram
+    gravados (ou reenviados) nos últimos `carencia` segundos, além de
+    temporários abandonados por gravações interrompidas.
+
+    Args:
+        referenciados: Conjunto de hashes ainda usados pelo banco
+        carencia: Idade mínima, em segundos, de um arquivo órfão removido
+        simular: Se True, apenas informa o que seria removido
+
+    Returns:
+        Dicionário com a quantidade de arquivos removidos, os bytes
+        liberados, os órfãos ainda na carência e os temporários removidos
+    """
+    limite = time.time() - carencia
+    resultado = {"removidos": 0, "bytes_liberados": 0, "em_carencia": 0, "temporarios": 0}
+
+    for hash_arquivo, caminho in list(listar_arquivos()):
+        if hash_arquivo in referenciados:
+            continue
+        estado = caminho.stat()
+        if estado.st_mtime > limite:
+            resultado["em_carencia"] += 1
+            continue
+        if not simular:
+            caminho.unlink()
+            logger.info("Arquivo órfão removido: %s", hash_arquivo)
+        resultado["removidos"] += 1
+        resultado["bytes_liberados"] += estado.st_size
+
+    diretorio_temporario = DIRETORIO_ARQUIVOS / _DIRETORIO_TEMPORARIO
+    if diretorio_temporario.is_dir():
+        for caminho in diretorio_temporario.iterdir():
+            if caminho.stat().st_mtime <= limite:
+                if not simular:
+                    caminho.unlink()
+                resultado["temporarios"] += 1
+
+    # Remover subdiretórios que ficaram vazios
+    if not simular and DIRETORIO_ARQUIVOS.is_dir():
+        for diretorio in sorted(DIRETORIO_ARQUIVOS.glob("??/??"), reverse=True) + sorted(DIRETORIO_ARQUIVOS.glob("??")):
+            if diretorio.is_dir() and diretorio.name != _DIRETORIO_TEMPORARIO and not any(diretorio.iterdir()):
+                diretorio.rmdir()
+
+    return resultado
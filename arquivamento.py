@@ -0,0 +1,179 @@
+"""
+Arquivamento do histórico antigo em bancos frios, um arquivo SQLite por ano.
+
+Contracheques e textos brutos processados antes do horizonte configurado
+saem do banco principal (quente) e vão para anos/contracheques_AAAA.db.
+O banco quente fica pequeno (VACUUM, backup e consultas rápidas) e guarda
+em particoes_frias o intervalo de datas de cada ano arquivado, para que
+as consultas do histórico só anexem (ATTACH) os anos que o período pedir
+(ver banco_dados.conexoes_periodo). Os agregados mensais continuam no
+banco quente e cobrem todo o histórico.
+
+Anos arquivados não mudam mais depois de fechados; o backup copia cada
+um apenas quando ele mudou desde a última cópia no mesmo destino.
+"""
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from banco_dados import CAMINHO_BANCO, colunas_tabela, conectar, particoes_periodo
+
+# Diretório dos bancos frios (por padrão, ao lado do banco principal)
+DIRETORIO_ANOS = Path(os.environ.get("CONTRACHEQUES_ANOS", Path(CAMINHO_BANCO).parent / "anos"))
+
+# Registros processados há mais que este número de meses vão para os bancos frios
+HORIZONTE_MESES = int(os.environ.get("CONTRACHEQUES_HORIZONTE_MESES", "24"))
+
+# Tabelas particionadas por ano (as demais ficam apenas no banco quente)
+TABELAS_ARQUIVADAS = ("contracheques", "arquivos_processados")
+
+
+# Função para obter o caminho do banco frio de um ano
+def caminho_particao(ano):
+    return DIRETORIO_ANOS / f"contracheques_{ano}.db"
+
+# Função para calcular a data de corte do arquivamento (primeiro dia do mês)
+def data_corte(horizonte_meses, hoje=None):
+    hoje = hoje or datetime.now()
+    meses = hoje.year * 12 + hoje.month - 1 - horizonte_meses
+    return f"{meses // 12:04d}-{meses % 12 + 1:02d}-01"
+
+# Função para mover os registros antigos para os bancos frios
+def arquivar_registros(horizonte_meses=HORIZONTE_MESES, compactar=True):
+    """
+    Move os registros processados antes do horizonte para o banco frio do
+    ano correspondente. Cada ano é movido em uma única transação que cobre
+    os dois bancos (cópia, remoção do banco quente e metadados).
+
+    Args:
+        horizonte_meses: Meses mantidos no banco quente
+        compactar: Se True, executa VACUUM no banco quente ao final
+
+    Returns:
+        Dicionário {ano: {tabela: registros movidos}}
+    """
+    corte = data_corte(horizonte_meses)
+    conn = conectar()
+    anos = sorted({
+        int(ano) for (ano,) in conn.execute('''
+            SELECT strftime('%Y', data_processamento) FROM contracheques WHERE date(data_processamento) < ?
+            UNION
+            SELECT strftime('%Y', data_processamento) FROM arquivos_processados WHERE date(data_processamento) < ?
+        ''', (corte, corte))
+    })
+    if not anos:
+        conn.close()
+        return {}
+
+    # O esquema dos bancos frios é o mesmo das tabelas do banco quente
+    definicoes = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)", TABELAS_ARQUIVADAS
+    ))
+    DIRETORIO_ANOS.mkdir(parents=True, exist_ok=True)
+
+    resumo = {}
+    filtro = "date(data_processamento) < ? AND strftime('%Y', data_processamento) = ?"
+    for ano in anos:
+        caminho = caminho_particao(ano)
+        conn.execute("ATTACH DATABASE ? AS frio", (str(caminho),))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            params = (corte, str(ano))
+            colunas = {}
+            for tabela in TABELAS_ARQUIVADAS:
+                conn.execute(definicoes[tabela].replace(
+                    f"CREATE TABLE {tabela}", f"CREATE TABLE IF NOT EXISTS frio.{tabela}", 1
+                ))
+                
+                # Banco do ano criado antes de uma coluna nova: acrescentá-la (vazia) a ele
+                existentes = set(colunas_tabela(conn, tabela, "frio"))
+                for _, coluna, tipo, *_ in conn.execute(f"PRAGMA main.table_info({tabela})"):
+                    if coluna not in existentes:
+                        conn.execute(f'ALTER TABLE frio.{tabela} ADD COLUMN "{coluna}" {tipo}')
+                colunas[tabela] = ", ".join(f'"{coluna}"' for coluna in colunas_tabela(conn, tabela))
+
+            conn.execute(f'''
+                INSERT OR REPLACE INTO main.hashes_arquivados (hash_arquivo, ano, arquivo_id)
+                SELECT hash_arquivo, ?, id FROM main.arquivos_processados WHERE {filtro}
+            ''', (ano, *params))
+
+            movidos = {}
+            for tabela in TABELAS_ARQUIVADAS:
+                movidos[tabela] = conn.execute(
+                    f"INSERT INTO frio.{tabela} ({colunas[tabela]}) SELECT {colunas[tabela]} FROM main.{tabela} WHERE {filtro}",
+                    params
+                ).rowcount
+                conn.execute(f"DELETE FROM main.{tabela} WHERE {filtro}", params)
+
+            # Intervalo de datas do ano arquivado (usado para decidir quando anexá-lo)
+            data_inicio, data_fim = conn.execute('''
+                SELECT min(dia), max(dia) FROM (
+                    SELECT date(data_processamento) AS dia FROM frio.contracheques
+                    UNION ALL
+                    SELECT date(data_processamento) FROM frio.arquivos_processados
+                )
+            ''').fetchone()
+            contracheques = conn.execute("SELECT COUNT(*) FROM frio.contracheques").fetchone()[0]
+            arquivos = conn.execute("SELECT COUNT(*) FROM frio.arquivos_processados").fetchone()[0]
+            conn.execute('''
+                INSERT INTO main.particoes_frias (ano, caminho, data_inicio, data_fim, contracheques, arquivos)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ano) DO UPDATE SET
+                    caminho = excluded.caminho,
+                    data_inicio = excluded.data_inicio,
+                    data_fim = excluded.data_fim,
+                    contracheques = excluded.contracheques,
+                    arquivos = excluded.arquivos,
+                    atualizado_em = CURRENT_TIMESTAMP
+            ''', (ano, str(caminho.resolve()), data_inicio, data_fim, contracheques, arquivos))
+
+            conn.commit()
+            resumo[ano] = movidos
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE frio")
+
+    if compactar:
+        conn.execute("VACUUM")
+    conn.close()
+    return resumo
+
+# Função para copiar um banco SQLite de forma consistente (API de backup)
+def copiar_banco(origem, destino):
+    fonte = sqlite3.connect(str(origem))
+    alvo = sqlite3.connect(str(destino))
+    try:
+        fonte.backup(alvo)
+    finally:
+        alvo.close()
+        fonte.close()
+
+# Função para fazer o backup do banco quente e dos anos arquivados
+def fazer_backup(diretorio_destino):
+    """
+    Copia o banco quente (sempre, com data e hora no nome) e os bancos
+    frios que ainda não têm cópia atualizada no destino.
+
+    Returns:
+        Dicionário com o caminho da cópia do banco quente e os anos
+        copiados e já copiados anteriormente
+    """
+    destino = Path(diretorio_destino)
+    destino.mkdir(parents=True, exist_ok=True)
+
+    copia_atual = destino / f"contracheques_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+    copiar_banco(CAMINHO_BANCO, copia_atual)
+
+    resultado = {"banco_atual": str(copia_atual), "anos_copiados": [], "anos_ja_copiados": []}
+    for ano, caminho in particoes_periodo():
+        copia = destino / Path(caminho).name
+        if copia.exists() and copia.stat().st_mtime >= Path(caminho).stat().st_mtime:
+            resultado["anos_ja_copiados"].append(ano)
+            continue
+        copiar_banco(caminho, copia)
+        resultado["anos_copiados"].append(ano)
+
+    return resultado
@@ -0,0 +1,789 @@
+"""
+Banco de dados SQLite do aplicativo de contracheques: criação do esquema,
+agregados mensais, consultas e gravação dos dados extraídos.
+
+O caminho do banco vem da variável de ambiente CONTRACHEQUES_DB
+(padrão: ./data/contracheques.db).
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import streamlit as st
+
+import telemetria
+from armazenamento import CARENCIA_ORFAOS, guardar_arquivo, remover_arquivos_orfaos
+
+# Caminho do banco de dados
+CAMINHO_BANCO = os.environ.get("CONTRACHEQUES_DB", str(Path("./data") / "contracheques.db"))
+
+# Bancos anexados por conexão nas consultas aos anos arquivados (o SQLite permite 10)
+LIMITE_ANEXOS = 9
+
+# Função para abrir uma conexão com o banco
+def conectar():
+    """
+    Abre uma conexão com o banco de dados configurado em CAMINHO_BANCO.
+    """
+    return sqlite3.connect(CAMINHO_BANCO)
+
+# Função para inicializar o banco de dados
+def inicializar_banco_dados():
+    """
+    Cria o banco de dados SQLite e as tabelas necessárias, se não existirem.
+    """
+    # Garantir que o diretório de dados existe
+    db_path = Path(CAMINHO_BANCO)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    # Conectar ao banco de dados (cria se não existir)
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    
+    # Criar tabela de contracheques se não existir
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contracheques (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT,
+            matricula TEXT,
+            cargo TEXT,
+            mes_referencia TEXT,
+            salario_base REAL,
+            descontos REAL,
+            valor_liquido REAL,
+            data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            arquivo_fonte TEXT,
+            hash_arquivo TEXT,
+            validado BOOLEAN DEFAULT 0,
+            observacoes TEXT
+        )
+    ''')
+    
+    # Criar tabela para armazenar as imagens processadas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS arquivos_processados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_arquivo TEXT,
+            hash_arquivo TEXT UNIQUE,
+            data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            tipo_arquivo TEXT,
+            texto_extraido TEXT
+        )
+    ''')
+    
+    # Tabela de agregados mensais (mantida incrementalmente a cada inserção)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agregados_mensais (
+            matricula TEXT NOT NULL,
+            competencia TEXT NOT NULL,
+            quantidade INTEGER DEFAULT 0,
+            total_bruto REAL DEFAULT 0,
+            total_descontos REAL DEFAULT 0,
+            total_liquido REAL DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (matricula, competencia)
+        )
+    ''')
+    
+    # Agregados da organização inteira por competência (alimenta o painel geral)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agregados_mensais_org (
+            competencia TEXT PRIMARY KEY,
+            funcionarios INTEGER DEFAULT 0,
+            quantidade INTEGER DEFAULT 0,
+            total_bruto REAL DEFAULT 0,
+            total_descontos REAL DEFAULT 0,
+            total_liquido REAL DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Metadados simples (chave/valor), ex.: versão dos dados agregados
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadados (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+    ''')
+    
+    # Anos movidos para bancos frios (um arquivo por ano, ver arquivamento.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS particoes_frias (
+            ano INTEGER PRIMARY KEY,
+            caminho TEXT NOT NULL,
+            data_inicio TEXT,
+            data_fim TEXT,
+            contracheques INTEGER DEFAULT 0,
+            arquivos INTEGER DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Hashes dos arquivos arquivados (evita duplicatas e mantém os originais armazenados)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hashes_arquivados (
+            hash_arquivo TEXT PRIMARY KEY,
+            ano INTEGER NOT NULL,
+            arquivo_id INTEGER
+        )
+    ''')
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contracheques_matricula ON contracheques (matricula)")
+    
+    # Reconstruir os agregados para bancos criados antes da tabela existir
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM agregados_mensais)")
+    agregados_vazios = not cursor.fetchone()[0]
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM contracheques)")
+    possui_contracheques = cursor.fetchone()[0]
+    if agregados_vazios and possui_contracheques:
+        reconstruir_agregados_mensais(cursor)
+    
+    # Commit e fechar conexão
+    conn.commit()
+    conn.close()
+    
+    return str(db_path)
+
+# Preparação do banco uma única vez por processo (não a cada rerun)
+@st.cache_resource(show_spinner=False)
+def preparar_banco_dados():
+    """
+    Executa inicializar_banco_dados uma única vez por processo.
+    
+    Returns:
+        Tupla (caminho do banco, duração da preparação em segundos)
+    """
+    inicio = time.perf_counter()
+    db_path = inicializar_banco_dados()
+    return db_path, time.perf_counter() - inicio
+
+# Meses por extenso (e abreviados) usados nos contracheques
+MESES_PT = {
+    "janeiro": 1, "jan": 1,
+    "fevereiro": 2, "fev": 2,
+    "março": 3, "marco": 3, "mar": 3,
+    "abril": 4, "abr": 4,
+    "maio": 5, "mai": 5,
+    "junho": 6, "jun": 6,
+    "julho": 7, "jul": 7,
+    "agosto": 8, "ago": 8,
+    "setembro": 9, "set": 9,
+    "outubro": 10, "out": 10,
+    "novembro": 11, "nov": 11,
+    "dezembro": 12, "dez": 12,
+}
+
+# Função para normalizar o mês de referência do contracheque
+def normalizar_competencia(mes_referencia, data_processamento=None):
+    """
+    Converte o mês de referência extraído (ex.: "03/2023", "Março de 2023",
+    "2023-03") para o formato AAAA-MM.
+    
+    Se o texto não puder ser interpretado, usa o mês de data_processamento
+    (ou o mês atual, se ela também não estiver disponível).
+    """
+    texto = (mes_referencia or "").strip().lower()
+    
+    # MM/AAAA (também cobre DD/MM/AAAA)
+    encontrado = re.search(r'(\d{1,2})\s*[/\-.]\s*(\d{4})', texto)
+    if encontrado and 1 <= int(encontrado.group(1)) <= 12:
+        return f"{encontrado.group(2)}-{int(encontrado.group(1)):02d}"
+    
+    # AAAA-MM
+    encontrado = re.search(r'(\d{4})\s*[/\-.]\s*(\d{1,2})\b', texto)
+    if encontrado and 1 <= int(encontrado.group(2)) <= 12:
+        return f"{encontrado.group(1)}-{int(encontrado.group(2)):02d}"
+    
+    # Mês por extenso: "março de 2023", "mar/2023", "MARÇO 2023"
+    encontrado = re.search(r'([a-zç]+)\s*(?:de\s+|/|-)?\s*(\d{4})', texto)
+    if encontrado and encontrado.group(1) in MESES_PT:
+        return f"{encontrado.group(2)}-{MESES_PT[encontrado.group(1)]:02d}"
+    
+    # Fallback: mês da data de processamento
+    try:
+        data = datetime.fromisoformat(str(data_processamento)) if data_processamento else datetime.now()
+        return data.strftime("%Y-%m")
+    except (ValueError, TypeError):
+        return datetime.now().strftime("%Y-%m")
+
+# Função para atualizar os agregados mensais a partir de um contracheque
+def atualizar_agregados_mensais(cursor, matricula, competencia, salario_base, descontos, valor_liquido):
+    """
+    Soma um contracheque aos agregados da matrícula e da organização na
+    competência informada. Deve ser chamada dentro da mesma transação do
+    INSERT em contracheques.
+    """
+    # Bruto = líquido + descontos; sem esses valores, usa o salário base
+    valor_bruto = (valor_liquido or 0.0) + (descontos or 0.0)
+    if not valor_bruto:
+        valor_bruto = salario_base or 0.0
+    
+    cursor.execute(
+        "SELECT 1 FROM agregados_mensais WHERE matricula = ? AND competencia = ?",
+        (matricula, competencia)
+    )
+    novo_funcionario = cursor.fetchone() is None
+    
+    cursor.execute('''
+        INSERT INTO agregados_mensais
+        (matricula, competencia, quantidade, total_bruto, total_descontos, total_liquido)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT (matricula, competencia) DO UPDATE SET
+            quantidade = quantidade + 1,
+            total_bruto = total_bruto + excluded.total_bruto,
+            total_descontos = total_descontos + excluded.total_descontos,
+            total_liquido = total_liquido + excluded.total_liquido,
+            atualizado_em = CURRENT_TIMESTAMP
+    ''', (matricula, competencia, valor_bruto, descontos or 0.0, valor_liquido or 0.0))
+    
+    cursor.execute('''
+        INSERT INTO agregados_mensais_org
+        (competencia, funcionarios, quantidade, total_bruto, total_descontos, total_liquido)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT (competencia) DO UPDATE SET
+            funcionarios = funcionarios + excluded.funcionarios,
+            quantidade = quantidade + 1,
+            total_bruto = total_bruto + excluded.total_bruto,
+            total_descontos = total_descontos + excluded.total_descontos,
+            total_liquido = total_liquido + excluded.total_liquido,
+            atualizado_em = CURRENT_TIMESTAMP
+    ''', (competencia, 1 if novo_funcionario else 0, valor_bruto, descontos or 0.0, valor_liquido or 0.0))
+    
+    incrementar_versao_dados(cursor)
+
+# Função para reconstruir os agregados a partir da tabela de contracheques
+def reconstruir_agregados_mensais(cursor):
+    """
+    Recalcula do zero as tabelas de agregados. Usada na migração de bancos
+    antigos; no uso normal os agregados são mantidos por atualizar_agregados_mensais.
+    """
+    cursor.execute("DELETE FROM agregados_mensais")
+    cursor.execute("DELETE FROM agregados_mensais_org")
+    
+    registros = cursor.execute('''
+        SELECT matricula, mes_referencia, data_processamento, salario_base, descontos, valor_liquido
+        FROM contracheques
+    ''').fetchall()
+    
+    for matricula, mes_referencia, data_processamento, salario_base, descontos, valor_liquido in registros:
+        competencia = normalizar_competencia(mes_referencia, data_processamento)
+        atualizar_agregados_mensais(
+            cursor, matricula or "", competencia, salario_base, descontos, valor_liquido
+        )
+
+# Função para incrementar a versão dos dados agregados
+def incrementar_versao_dados(cursor):
+    """
+    Incrementa o contador usado como chave de cache dos gráficos e painéis.
+    """
+    cursor.execute('''
+        INSERT INTO metadados (chave, valor) VALUES ('versao_agregados', '1')
+        ON CONFLICT (chave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+    ''')
+
+# Função para obter a versão atual dos dados agregados
+def obter_versao_dados():
+    """
+    Retorna a versão atual dos agregados (0 se nada foi salvo ainda).
+    """
+    conn = conectar()
+    resultado = conn.execute(
+        "SELECT valor FROM metadados WHERE chave = 'versao_agregados'"
+    ).fetchone()
+    conn.close()
+    return int(resultado[0]) if resultado else 0
+
+# Função para calcular hash de arquivo
+def calcular_hash_arquivo(conteudo_bytes):
+    """
+    Calcula o hash SHA-256 do conteúdo do arquivo.
+    Útil para identificar arquivos duplicados.
+    """
+    return hashlib.sha256(conteudo_bytes).hexdigest()
+
+# Função para remover do armazenamento os arquivos sem registro no banco
+def coletar_arquivos_orfaos(carencia=CARENCIA_ORFAOS, simular=False):
+    """
+    Remove os arquivos originais cujo hash não aparece mais em
+    arquivos_processados, contracheques ou hashes_arquivados.
+    
+    Returns:
+        Resumo da coleta (ver remover_arquivos_orfaos)
+    """
+    conn = conectar()
+    referenciados = {
+        hash_arquivo for (hash_arquivo,) in conn.execute('''
+            SELECT hash_arquivo FROM arquivos_processados
+            UNION
+            SELECT hash_arquivo FROM contracheques
+            UNION
+            SELECT hash_arquivo FROM hashes_arquivados
+        ''')
+    }
+    conn.close()
+    return remover_arquivos_orfaos(referenciados, carencia, simular)
+
+# Função para diagnóstico do banco de dados
+def diagnosticar_banco_dados():
+    """
+    Verifica se o banco de dados está funcionando corretamente.
+    """
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+        
+        # Verificar tabelas
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        tabelas = cursor.fetchall()
+        tabelas = [tab[0] for tab in tabelas]
+        
+        # Verificar contagem de registros
+        contagens = {}
+        for tabela in tabelas:
+            cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+            contagens[tabela] = cursor.fetchone()[0]
+        
+        conn.close()
+        
+        return {
+            "status": "ok",
+            "caminho_bd": CAMINHO_BANCO,
+            "tabelas": tabelas,
+            "contagens": contagens
+        }
+    except Exception as e:
+        return {
+            "status": "erro",
+            "mensagem": str(e)
+        } 
+
+# Função para listar os anos arquivados com registros no período
+def particoes_periodo(data_inicio=None, data_fim=None):
+    """
+    Retorna os anos arquivados em bancos frios (ver arquivamento.py) cujo
+    intervalo de datas cruza o período, do mais recente para o mais antigo.
+    
+    Returns:
+        Lista de tuplas (ano, caminho do banco do ano)
+    """
+    conn = conectar()
+    particoes = conn.execute('''
+        SELECT ano, caminho FROM particoes_frias
+        WHERE (? IS NULL OR data_fim >= ?) AND (? IS NULL OR data_inicio <= ?)
+        ORDER BY ano DESC
+    ''', (data_inicio, data_inicio, data_fim, data_fim)).fetchall()
+    conn.close()
+    return particoes
+
+# Função para abrir as conexões que cobrem um período (banco atual + anos arquivados)
+def conexoes_periodo(data_inicio=None, data_fim=None):
+    """
+    Gera tuplas (conexão, esquemas) que, juntas, cobrem o período. Os anos
+    arquivados só são anexados (ATTACH) quando o período os inclui; como o
+    SQLite limita os bancos anexados por conexão, anos em excesso vão para
+    conexões seguintes. Os esquemas vêm do mais recente para o mais antigo.
+    """
+    particoes = particoes_periodo(data_inicio, data_fim)
+    grupos = [particoes[i:i + LIMITE_ANEXOS] for i in range(0, len(particoes), LIMITE_ANEXOS)] or [[]]
+    for indice, grupo in enumerate(grupos):
+        conn = conectar()
+        esquemas = ["main"] if indice == 0 else []
+        try:
+            for ano, caminho in grupo:
+                esquema = f"frio_{int(ano)}"
+                conn.execute(f"ATTACH DATABASE ? AS {esquema}", (caminho,))
+                esquemas.append(esquema)
+            yield conn, esquemas
+        finally:
+            conn.close()
+
+# Função para listar as colunas de uma tabela
+def colunas_tabela(conn, tabela, esquema="main"):
+    """
+    Retorna os nomes das colunas da tabela no esquema, na ordem da tabela.
+    """
+    return [linha[1] for linha in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+# Função para montar as colunas selecionadas de cada esquema em um UNION ALL
+def selecionar_colunas(conn, tabela, esquemas):
+    """
+    Monta, para cada esquema, a lista de colunas do SELECT na ordem das
+    colunas do banco atual. Os bancos dos anos arquivados têm o esquema da
+    época do arquivamento: colunas adicionadas depois vêm como NULL, e o
+    UNION ALL não depende da posição das colunas em cada banco.
+    
+    Returns:
+        Dicionário {esquema: lista de colunas para o SELECT}
+    """
+    colunas = colunas_tabela(conn, tabela)
+    selecoes = {}
+    for esquema in esquemas:
+        existentes = set(colunas_tabela(conn, tabela, esquema))
+        selecoes[esquema] = ", ".join(
+            f'"{coluna}"' if coluna in existentes else f'NULL AS "{coluna}"' for coluna in colunas
+        )
+    return selecoes
+
+# Função para montar a consulta SQL do histórico
+def montar_consulta_historico(data_inicio=None, data_fim=None, filtro_nome=None, filtro_matricula=None,
+                              esquemas=("main",), selecoes=None):
+    """
+    Monta a consulta do histórico com os filtros informados, unindo (UNION
+    ALL) a tabela de contracheques de cada esquema. Com mais de um esquema,
+    selecoes (ver selecionar_colunas) alinha as colunas pelo nome.
+    
+    Returns:
+        Tupla (consulta SQL, lista de parâmetros)
+    """
+    # Construir a consulta SQL com filtros dinâmicos
+    filtros = "WHERE 1=1"
+    params = []
+    
+    if data_inicio:
+        filtros += " AND date(data_processamento) >= ?"
+        params.append(data_inicio)
+    
+    if data_fim:
+        filtros += " AND date(data_processamento) <= ?"
+        params.append(data_fim)
+    
+    if filtro_nome:
+        filtros += " AND nome LIKE ?"
+        params.append(f"%{filtro_nome}%")
+    
+    if filtro_matricula:
+        filtros += " AND matricula LIKE ?"
+        params.append(f"%{filtro_matricula}%")
+    
+    selecoes = selecoes or {}
+    query = " UNION ALL ".join(
+        f"SELECT {selecoes.get(esquema, '*')} FROM {esquema}.contracheques {filtros}" for esquema in esquemas
+    )
+    
+    # Ordenar por data mais recente primeiro
+    query += " ORDER BY data_processamento DESC"
+    
+    return query, params * len(esquemas)
+
+# Função para consultar histórico
+def consultar_historico(data_inicio=None, data_fim=None, filtro_nome=None, filtro_matricula=None):
+    """
+    Consulta o histórico de contracheques processados com possibilidade de filtros.
+    Os anos arquivados entram na consulta apenas se o período os incluir.
+    
+    Args:
+        data_inicio: Data inicial (opcional)
+        data_fim: Data final (opcional)
+        filtro_nome: Filtro por nome (opcional)
+        filtro_matricula: Filtro por matrícula (opcional)
+        
+    Returns:
+        DataFrame com os resultados da consulta
+    """
+    import pandas as pd
+    
+    partes = []
+    for conn, esquemas in conexoes_periodo(data_inicio, data_fim):
+        query, params = montar_consulta_historico(
+            data_inicio, data_fim, filtro_nome, filtro_matricula, esquemas,
+            selecionar_colunas(conn, "contracheques", esquemas)
+        )
+        
+        # Executar a consulta
+        partes.append(pd.read_sql_query(query, conn, params=params))
+    
+    # As partes já vêm em ordem (as partições não se sobrepõem no tempo)
+    return partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+
+# Função para contar os registros do histórico
+def contar_historico(data_inicio=None, data_fim=None, filtro_nome=None, filtro_matricula=None):
+    """
+    Conta os registros que consultar_historico devolveria com os mesmos filtros.
+    """
+    total = 0
+    for conn, esquemas in conexoes_periodo(data_inicio, data_fim):
+        query, params = montar_consulta_historico(
+            data_inicio, data_fim, filtro_nome, filtro_matricula, esquemas,
+            selecionar_colunas(conn, "contracheques", esquemas)
+        )
+        total += conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+    return total
+
+# Função para percorrer o histórico em lotes
+def iterar_historico(data_inicio=None, data_fim=None, filtro_nome=None, filtro_matricula=None, tamanho_lote=5000):
+    """
+    Executa a consulta do histórico (com os anos arquivados do período) e
+    devolve as linhas em lotes lidos do cursor, sem carregar o resultado
+    inteiro na memória.
+    
+    Returns:
+        Tupla (nomes das colunas, gerador de listas de linhas)
+    """
+    conexoes = conexoes_periodo(data_inicio, data_fim)
+    
+    def executar(conn, esquemas):
+        query, params = montar_consulta_historico(
+            data_inicio, data_fim, filtro_nome, filtro_matricula, esquemas,
+            selecionar_colunas(conn, "contracheques", esquemas)
+        )
+        return conn.execute(query, params)
+    
+    cursor = executar(*next(conexoes))
+    colunas = [descricao[0] for descricao in cursor.description]
+    
+    def lotes():
+        atual = cursor
+        try:
+            while True:
+                linhas = atual.fetchmany(tamanho_lote)
+                if linhas:
+                    yield linhas
+                    continue
+                proxima = next(conexoes, None)
+                if proxima is None:
+                    break
+                atual = executar(*proxima)
+        finally:
+            conexoes.close()
+    
+    return colunas, lotes()
+
+# Função para consultar texto bruto
+def consultar_textos_brutos(data_inicio=None, data_fim=None, filtro_nome=None):
+    """
+    Consulta os textos brutos extraídos, com possibilidade de filtros.
+    Os anos arquivados entram na consulta apenas se o período os incluir.
+    """
+    import pandas as pd
+    
+    filtros = "WHERE 1=1"
+    params = []
+    
+    if data_inicio:
+        filtros += " AND date(data_processamento) >= ?"
+        params.append(data_inicio)
+    
+    if data_fim:
+        filtros += " AND date(data_processamento) <= ?"
+        params.append(data_fim)
+    
+    if filtro_nome:
+        filtros += " AND nome_arquivo LIKE ?"
+        params.append(f"%{filtro_nome}%")
+    
+    partes = []
+    for conn, esquemas in conexoes_periodo(data_inicio, data_fim):
+        selecoes = selecionar_colunas(conn, "arquivos_processados", esquemas)
+        query = " UNION ALL ".join(
+            f"SELECT {selecoes[esquema]} FROM {esquema}.arquivos_processados {filtros}" for esquema in esquemas
+        )
+        
+        # Ordenar por data mais recente primeiro
+        query += " ORDER BY data_processamento DESC"
+        
+        partes.append(pd.read_sql_query(query, conn, params=params * len(esquemas)))
+    
+    return partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+
+# Função para consultar os agregados mensais de uma matrícula
+def consultar_agregados_matricula(matricula):
+    """
+    Retorna os totais mensais (bruto, descontos e líquido) de uma matrícula,
+    ordenados pela competência (mês de referência do contracheque).
+    """
+    import pandas as pd
+    
+    conn = conectar()
+    df = pd.read_sql_query('''
+        SELECT competencia, quantidade, total_bruto, total_descontos, total_liquido
+        FROM agregados_mensais
+        WHERE matricula = ?
+        ORDER BY competencia
+    ''', conn, params=[matricula])
+    conn.close()
+    return df
+
+# Função para consultar os agregados mensais da organização
+def consultar_agregados_organizacao(competencia_inicio=None, competencia_fim=None):
+    """
+    Retorna os totais mensais da organização inteira, com filtros opcionais
+    de competência no formato AAAA-MM.
+    """
+    import pandas as pd
+    
+    conn = conectar()
+    
+    query = '''
+        SELECT competencia, funcionarios, quantidade, total_bruto, total_descontos, total_liquido
+        FROM agregados_mensais_org WHERE 1=1
+    '''
+    params = []
+    
+    if competencia_inicio:
+        query += " AND competencia >= ?"
+        params.append(competencia_inicio)
+    
+    if competencia_fim:
+        query += " AND competencia <= ?"
+        params.append(competencia_fim)
+    
+    query += " ORDER BY competencia"
+    
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+# Função para salvar dados extraídos e texto bruto
+def salvar_dados_extraidos(df_dados, nome_arquivo, conteudo_bytes, texto_extraido):
+    """
+    Salva os dados estruturados e o texto bruto extraído no banco de dados.
+    
+    Args:
+        df_dados: DataFrame com os dados estruturados
+        nome_arquivo: Nome do arquivo processado
+        conteudo_bytes: Conteúdo binário do arquivo (o original é guardado no armazenamento por conteúdo)
+        texto_extraido: Texto extraído do arquivo
+        
+    Returns:
+        ID do registro inserido (ou o do registro existente, quando o arquivo
+        já foi salvo; nesse caso nada é gravado de novo)
+    """
+    inicio = time.perf_counter()
+    
+    # Guardar o original no armazenamento por conteúdo (o hash é calculado durante a gravação)
+    try:
+        hash_arquivo, _, _ = guardar_arquivo(conteudo_bytes)
+    except OSError as e:
+        st.warning(f"Não foi possível guardar o arquivo original: {e}")
+        hash_arquivo = calcular_hash_arquivo(conteudo_bytes)
+    
+    # Conectar ao banco de dados
+    conn = conectar()
+    cursor = conn.cursor()
+    
+    try:
+        # Reservar a escrita no início da transação (a espera mede a disputa pelo banco)
+        inicio_lock = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        telemetria.observar(
+            "contracheques_espera_lock_segundos", time.perf_counter() - inicio_lock, recurso="sqlite"
+        )
+        
+        # Arquivo já movido para o banco frio de um ano anterior
+        cursor.execute("SELECT ano, arquivo_id FROM hashes_arquivados WHERE hash_arquivo = ?", (hash_arquivo,))
+        arquivado = cursor.fetchone()
+        
+        # Primeiro, salvar o arquivo e texto extraído
+        duplicado = bool(arquivado)
+        if arquivado:
+            arquivo_id = arquivado[1]
+            st.warning(f"Arquivo com hash {hash_arquivo} já existe no arquivo de {arquivado[0]} (ID: {arquivo_id}).")
+        else:
+            try:
+                cursor.execute('''
+                    INSERT INTO arquivos_processados 
+                    (nome_arquivo, hash_arquivo, tipo_arquivo, texto_extraido)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    nome_arquivo,
+                    hash_arquivo,
+                    nome_arquivo.split('.')[-1] if '.' in nome_arquivo else 'unknown',
+                    texto_extraido
+                ))
+                arquivo_id = cursor.lastrowid
+            except sqlite3.IntegrityError:
+                # Se o hash já existe, recuperar o ID existente
+                cursor.execute("SELECT id FROM arquivos_processados WHERE hash_arquivo = ?", (hash_arquivo,))
+                resultado = cursor.fetchone()
+                if resultado:
+                    arquivo_id = resultado[0]
+                    duplicado = True
+                    st.warning(f"Arquivo com hash {hash_arquivo} já existe no banco (ID: {arquivo_id}).")
+                else:
+                    st.error("Erro ao verificar arquivo existente.")
+                    conn.close()
+                    return None
+        
+        # Arquivo já salvo: o contracheque e os agregados mensais já o contam
+        if duplicado:
+            conn.rollback()
+            conn.close()
+            return arquivo_id
+        
+        # Em seguida, salvar os dados estruturados
+        # Converter valores para float
+        dados_dict = df_dados.iloc[0].to_dict()
+        
+        salario_base = 0.0
+        descontos = 0.0
+        valor_liquido = 0.0
+        
+        try:
+            if dados_dict.get('Salário Base'):
+                valor_str = dados_dict.get('Salário Base').replace('.', '').replace(',', '.')
+                salario_base = float(valor_str) if valor_str else 0.0
+        except (ValueError, AttributeError):
+            pass
+            
+        try:
+            if dados_dict.get('Descontos'):
+                valor_str = dados_dict.get('Descontos').replace('.', '').replace(',', '.')
+                descontos = float(valor_str) if valor_str else 0.0
+        except (ValueError, AttributeError):
+            pass
+            
+        try:
+            if dados_dict.get('Valor Líquido'):
+                valor_str = dados_dict.get('Valor Líquido').replace('.', '').replace(',', '.')
+                valor_liquido = float(valor_str) if valor_str else 0.0
+        except (ValueError, AttributeError):
+            pass
+        # Inserir dados na tabela de contracheques
+        cursor.execute('''
+            INSERT INTO contracheques 
+            (nome, matricula, cargo, mes_referencia, salario_base, descontos, valor_liquido, 
+             arquivo_fonte, hash_arquivo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            dados_dict.get('Nome', ''),
+            dados_dict.get('Matrícula', ''),
+            dados_dict.get('Cargo', ''),
+            dados_dict.get('Mês/Ano', ''),
+            salario_base,
+            descontos,
+            valor_liquido,
+            nome_arquivo,
+            hash_arquivo
+        ))
+        
+        # Atualizar os agregados mensais na mesma transação
+        atualizar_agregados_mensais(
+            cursor,
+            dados_dict.get('Matrícula', '') or '',
+            normalizar_competencia(dados_dict.get('Mês/Ano', '')),
+            salario_base,
+            descontos,
+            valor_liquido
+        )
+        
+        # Commit e fechar conexão
+        conn.commit()
+        conn.close()
+        
+        telemetria.observar(
+            "contracheques_etapa_duracao_segundos", time.perf_counter() - inicio,
+            etapa="gravacao_bd", tipo="pdf" if nome_arquivo.lower().endswith(".pdf") else "imagem", motor=""
+        )
+        
+        return arquivo_id
+        
+    except Exception as e:
+        # Em caso de erro, fazer rollback
+        conn.rollback()
+        conn.close()
+        st.error(f"Erro ao salvar dados no banco: {str(e)}")
+        return None
@@ -0,0 +1,263 @@
+"""
+Teste de carga do aplicativo com várias sessões simultâneas.
+
+Cada sessão simulada é um AppTest executando o script do aplicativo em
+sua própria thread, no mesmo processo (como as sessões de um servidor
+Streamlit). As sessões enviam contracheques sintéticos, salvam os dados
+e consultam o histórico ao mesmo tempo, com o servidor falso do Vision no
+lugar da API real.
+
+Para cada nível de concorrência o relatório mostra a latência (p50/p95)
+de cada ação, a vazão de documentos, a taxa de erros, os bloqueios do
+SQLite e a espera pelos recursos compartilhados (escrita no SQLite e
+limitador de taxa do Vision), medida pela telemetria do aplicativo.
+
+Uso:
+    python benchmarks/carga.py --niveis 1 2 4 8 --documentos 3 --saida carga.json
+    python benchmarks/carga.py --niveis 16 --latencia-ms 300 --taxa-erros 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+DIRETORIO = Path(__file__).resolve().parent
+RAIZ = DIRETORIO.parent
+SCRIPT_APP = RAIZ / "app_web_ocr_google_completo.py"
+
+ACOES = ["abrir", "upload", "salvar", "historico"]
+
+
+# Função para permitir várias execuções do AppTest ao mesmo tempo
+def preparar_app_test_concorrente():
+    """
+    O AppTest foi feito para uma execução por vez; três estados globais
+    precisam ser ajustados para várias sessões rodarem em paralelo:
+
+    - cada execução instala um Runtime simulado e o remove ao terminar,
+      derrubando as outras execuções em andamento: Runtime.instance()
+      passa a devolver o último Runtime simulado quando não houver um;
+    - a opção global.appTest é ligada com um patch temporário de
+      config.get_option, desfeito fora de ordem entre threads: a opção é
+      ligada de forma permanente;
+    - cada execução recompila o script, e no CPython 3.11 compilar em
+      várias threads ao mesmo tempo pode falhar ("AST constructor
+      recursion depth mismatch"): a compilação é serializada (um servidor
+      real compila uma vez e reaproveita o bytecode).
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import magic
+
+    if getattr(Runtime.instance, "_compartilhado", False):
+        return
+
+    instance_original = Runtime.instance.__func__
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" in ultimo:
+            return ultimo["runtime"]
+        return instance_original(cls)
+
+    instance._compartilhado = True
+    Runtime.instance = classmethod(instance)
+
+    config.set_option("global.appTest", True)
+
+    add_magic_original = magic.add_magic
+    lock_compilacao = threading.Lock()
+
+    def add_magic(*args, **kwargs):
+        with lock_compilacao:
+            return add_magic_original(*args, **kwargs)
+
+    magic.add_magic = add_magic
+
+# Função para calcular um percentil (interpolação linear)
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+# Função que executa uma sessão simulada
+def executar_sessao(identificador, documentos, tipo_arquivo, registros, timeout):
+    """
+    Abre o aplicativo e, para cada documento, envia, salva e consulta o
+    histórico. Cada ação registra (ação, duração, erro ou None).
+    """
+    from streamlit.testing.v1 import AppTest
+    from contracheques_sinteticos import gerar_imagem, gerar_pdf
+
+    def executar(acao, passo):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            passo()
+            if app.exception:
+                erro = app.exception[0].value
+            elif app.error:
+                erro = app.error[0].value
+        except Exception as e:
+            erro = f"{type(e).__name__}: {e}"
+        registros.append((acao, time.perf_counter() - inicio, erro))
+        return erro is None
+
+    app = AppTest.from_file(str(SCRIPT_APP), default_timeout=timeout)
+    if not executar("abrir", app.run):
+        return
+
+    mes_atual = datetime.now().strftime("%m/%Y")
+    for documento in range(documentos):
+        indice = identificador * 1000 + documento
+        if tipo_arquivo == "pdf":
+            arquivo = (f"carga_{indice}.pdf", gerar_pdf(1, indice), "application/pdf")
+        else:
+            arquivo = (f"carga_{indice}.png", gerar_imagem(0, indice), "image/png")
+
+        if not executar("upload", lambda: app.file_uploader[0].set_value(arquivo).run()):
+            continue
+
+        def salvar():
+            botoes = [b for b in app.button if b.label == "Salvar Dados Extraídos"]
+            botoes[0].click().run()
+            if not any("Dados salvos" in str(s.value) for s in app.success):
+                raise RuntimeError("dados não foram salvos")
+        executar("salvar", salvar)
+
+        def consultar_historico():
+            [t for t in app.text_input if t.label == "Data Inicial (MM/AAAA)"][0].set_value(mes_atual)
+            [t for t in app.text_input if t.label == "Data Final (MM/AAAA)"][0].set_value(mes_atual)
+            [b for b in app.button if b.label == "Consultar Histórico"][0].click().run()
+        executar("historico", consultar_historico)
+
+# Função que roda um nível de concorrência e resume os resultados
+def executar_nivel(sessoes, documentos, tipo_arquivo, timeout):
+    import telemetria
+
+    telemetria.REGISTRO.limpar()
+    registros = []
+    threads = [
+        threading.Thread(
+            target=executar_sessao,
+            args=(sessoes * 100 + i, documentos, tipo_arquivo, registros, timeout),
+            name=f"sessao-{i}",
+        )
+        for i in range(sessoes)
+    ]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    acoes = {}
+    for acao in ACOES:
+        duracoes = [d for a, d, _ in registros if a == acao]
+        erros = [e for a, _, e in registros if a == acao and e]
+        acoes[acao] = {
+            "execucoes": len(duracoes),
+            "erros": len(erros),
+            "p50_ms": round(percentil(duracoes, 0.5) * 1000, 1) if duracoes else None,
+            "p95_ms": round(percentil(duracoes, 0.95) * 1000, 1) if duracoes else None,
+        }
+
+    esperas = {}
+    for histograma in telemetria.REGISTRO.instantaneo()["histogramas"]:
+        if histograma["nome"] == "contracheques_espera_lock_segundos":
+            esperas[histograma["rotulos"]["recurso"]] = {
+                "aquisicoes": histograma["contagem"],
+                "espera_total_s": round(histograma["soma"], 3),
+                "p95_ms": round(histograma["p95"] * 1000, 2),
+            }
+
+    erros = [e for _, _, e in registros if e]
+    salvos = acoes["salvar"]["execucoes"] - acoes["salvar"]["erros"]
+    return {
+        "sessoes": sessoes,
+        "duracao_s": round(duracao, 2),
+        "documentos_por_segundo": round(salvos / duracao, 3) if duracao else None,
+        "taxa_erros": round(len(erros) / len(registros), 4) if registros else None,
+        "bloqueios_sqlite": sum("locked" in str(e) for e in erros),
+        "acoes": acoes,
+        "espera_recursos": esperas,
+        "exemplos_erros": sorted({str(e)[:200] for e in erros})[:5],
+    }
+
+def main():
+    sys.path[:0] = [str(RAIZ), str(DIRETORIO)]
+    from servidor_vision_falso import adicionar_argumentos, configuracao_argumentos, iniciar_servidor
+
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões simultâneas")
+    parser.add_argument("--niveis", type=int, nargs="+", default=[1, 2, 4, 8], help="Sessões simultâneas por rodada")
+    parser.add_argument("--documentos", type=int, default=3, help="Documentos enviados por sessão")
+    parser.add_argument("--tipo", choices=["imagem", "pdf"], default="imagem")
+    parser.add_argument("--modo-ocr", choices=["vision", "local"], default="vision")
+    adicionar_argumentos(parser, latencia_ms=150.0, variacao_ms=50.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Tempo máximo de cada execução do script")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    configuracao = configuracao_argumentos(args)
+    servidor, endpoint = iniciar_servidor(configuracao)
+
+    # Configuração lida pelos módulos do aplicativo na primeira importação
+    diretorio = tempfile.mkdtemp(prefix="carga_contracheques_")
+    os.environ.update(
+        CONTRACHEQUES_DB=str(Path(diretorio) / "contracheques.db"),
+        OCR_MODO=args.modo_ocr,
+        VISION_ENDPOINT=endpoint,
+        METRICAS_PORTA="0",
+    )
+    preparar_app_test_concorrente()
+
+    resultados = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "parametros": vars(args),
+        "niveis": [],
+    }
+    referencia = None
+    for sessoes in args.niveis:
+        nivel = executar_nivel(sessoes, args.documentos, args.tipo, args.timeout)
+        # Desaceleração em relação ao primeiro nível (mesma ação, p50)
+        if referencia is None:
+            referencia = nivel
+        nivel["desaceleracao_p50"] = {
+            acao: round(nivel["acoes"][acao]["p50_ms"] / referencia["acoes"][acao]["p50_ms"], 2)
+            for acao in ACOES
+            if nivel["acoes"][acao]["p50_ms"] and referencia["acoes"][acao]["p50_ms"]
+        }
+        resultados["niveis"].append(nivel)
+
+        print(
+            f"{sessoes:>3} sessões: {nivel['documentos_por_segundo']} doc/s, "
+            f"erros {nivel['taxa_erros']:.1%}, bloqueios SQLite {nivel['bloqueios_sqlite']}"
+        )
+        for acao in ACOES:
+            dados = nivel["acoes"][acao]
+            print(
+                f"      {acao:<10} p50 {dados['p50_ms']} ms  p95 {dados['p95_ms']} ms  "
+                f"erros {dados['erros']}/{dados['execucoes']}  x{nivel['desaceleracao_p50'].get(acao, '-')}"
+            )
+        for recurso, espera in nivel["espera_recursos"].items():
+            print(f"      espera {recurso:<15} total {espera['espera_total_s']} s  p95 {espera['p95_ms']} ms")
+
+    servidor.shutdown()
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
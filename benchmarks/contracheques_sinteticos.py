@@ -0,0 +1,94 @@
+"""
+Geração de contracheques sintéticos para os benchmarks.
+
+Os PDFs são gerados com reportlab (como no diagnóstico "Testar
+processamento de PDF") e as imagens com PIL, a partir do mesmo texto, que
+o servidor falso do Vision devolve como resultado do OCR. Tudo é
+determinístico a partir da semente.
+"""
+import io
+import random
+
+NOMES = ["Ana Souza", "Bruno Lima", "Carla Mendes", "Diego Rocha", "Elisa Castro", "Fábio Nunes"]
+CARGOS = ["Analista", "Técnico Administrativo", "Assistente", "Coordenador", "Auxiliar"]
+
+
+# Função para formatar valores no padrão brasileiro (1.234,56)
+def formatar_valor(valor):
+    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+# Função para montar as linhas de texto de um contracheque
+def linhas_contracheque(indice, semente=0):
+    """
+    Retorna as linhas de um contracheque sintético. O mesmo índice e a
+    mesma semente sempre geram o mesmo conteúdo.
+    """
+    aleatorio = random.Random(semente * 100003 + indice)
+    salario = round(aleatorio.uniform(1800, 12000), 2)
+    descontos = round(salario * aleatorio.uniform(0.08, 0.3), 2)
+    return [
+        "CONTRACHEQUE - DEMONSTRATIVO DE PAGAMENTO",
+        f"Nome: {aleatorio.choice(NOMES)}",
+        f"Matrícula: {10000 + indice % 500}",
+        f"Cargo: {aleatorio.choice(CARGOS)}",
+        f"Referência: {indice % 12 + 1:02d}/{2020 + indice // 12 % 5}",
+        f"Salário Base R$ {formatar_valor(salario)}",
+        f"Total de Descontos R$ {formatar_valor(descontos)}",
+        f"Líquido a Receber R$ {formatar_valor(salario - descontos)}",
+    ]
+
+# Função para montar o texto completo de um contracheque
+def texto_contracheque(indice, semente=0):
+    return "\n".join(linhas_contracheque(indice, semente))
+
+# Função para gerar um PDF com vários contracheques (um por página)
+def gerar_pdf(paginas, semente=0):
+    """
+    Gera um PDF com o número de páginas pedido, cada uma com um
+    contracheque diferente.
+
+    Returns:
+        Bytes do PDF
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    largura, altura = A4
+    for pagina in range(paginas):
+        y = altura - 80
+        for linha in linhas_contracheque(pagina, semente):
+            c.drawString(60, y, linha)
+            y -= 22
+        # Tabela de rubricas para dar à página uma densidade realista
+        for rubrica in range(12):
+            c.drawString(60, y - 30 - rubrica * 18, f"{100 + rubrica}  Rubrica {rubrica + 1:02d}")
+            c.drawRightString(largura - 60, y - 30 - rubrica * 18, formatar_valor(100 + rubrica * 37.5))
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+# Função para gerar a imagem (PNG ou JPEG) de um contracheque
+def gerar_imagem(indice=0, semente=0, formato="PNG", tamanho=(1240, 1754)):
+    """
+    Gera a "digitalização" de um contracheque (A4 a 150 DPI por padrão).
+
+    Returns:
+        Bytes da imagem no formato pedido
+    """
+    from PIL import Image, ImageDraw
+
+    imagem = Image.new("L", tamanho, 255)
+    desenho = ImageDraw.Draw(imagem)
+    y = 120
+    for linha in linhas_contracheque(indice, semente):
+        desenho.text((120, y), linha, fill=0)
+        y += 44
+    for rubrica in range(12):
+        desenho.text((120, y + 60 + rubrica * 36), f"{100 + rubrica}  Rubrica {rubrica + 1:02d}", fill=0)
+        desenho.text((tamanho[0] - 300, y + 60 + rubrica * 36), formatar_valor(100 + rubrica * 37.5), fill=0)
+
+    buffer = io.BytesIO()
+    imagem.save(buffer, format=formato)
+    return buffer.getvalue()
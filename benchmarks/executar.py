@@ -0,0 +1,312 @@
+"""
+Suíte de benchmarks do pipeline de contracheques.
+
+Mede páginas por segundo, latência p50/p95 e pico de memória (RSS) de
+processar_pdf, processar_imagem, processar_texto_contracheque,
+salvar_dados_extraidos e das consultas de histórico, usando contracheques
+sintéticos e o servidor falso do Vision (nenhuma chamada à API real).
+
+Cada caso roda em um processo próprio, com um banco SQLite temporário,
+para que o pico de RSS seja do caso e não da suíte inteira.
+
+Uso:
+    python benchmarks/executar.py --saida resultados.json
+    python benchmarks/executar.py --casos processar_pdf_5p --latencia-ms 200 --taxa-erros 0.1
+    python benchmarks/executar.py --casos processar_imagem --cenario baixa_confianca
+    python benchmarks/executar.py --saida atual.json --comparar resultados.json --tolerancia 0.15
+    python benchmarks/executar.py --casos processar_pdf_5p --perfil perfis/
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+DIRETORIO = Path(__file__).resolve().parent
+RAIZ = DIRETORIO.parent
+
+# Casos disponíveis (nas consultas, as unidades são as linhas retornadas)
+PAGINAS_PDF = (1, 5, 20)
+CASOS = (
+    [f"processar_pdf_{paginas}p" for paginas in PAGINAS_PDF]
+    + ["processar_imagem", "processar_texto_contracheque", "salvar_dados_extraidos",
+       "consultar_historico", "consultar_textos_brutos"]
+)
+
+# Registros gravados antes de medir as consultas
+REGISTROS_CONSULTA = 2000
+
+
+# Função para obter o pico de memória do processo em MB
+def pico_rss_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+# Função para calcular um percentil (interpolação linear)
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+# Função para popular o banco com contracheques sintéticos
+def popular_banco(quantidade, semente):
+    from banco_dados import salvar_dados_extraidos
+    from contracheques_sinteticos import texto_contracheque
+    from processamento import processar_texto_contracheque
+
+    for indice in range(quantidade):
+        texto = texto_contracheque(indice, semente)
+        df = processar_texto_contracheque(texto)
+        salvar_dados_extraidos(df, f"sintetico_{semente}_{indice}.pdf", f"{semente}:{indice}".encode(), texto)
+
+# Função que executa um caso e retorna as amostras (duração em s, páginas)
+def medir_caso(caso, repeticoes, semente):
+    from banco_dados import consultar_historico, consultar_textos_brutos, inicializar_banco_dados, salvar_dados_extraidos
+    from contracheques_sinteticos import gerar_imagem, gerar_pdf, texto_contracheque
+    from processamento import ErroDocumento, paginas_com_erro, processar_imagem, processar_pdf, processar_texto_contracheque
+
+    inicializar_banco_dados()
+    amostras = []
+    falhas = 0
+
+    def cronometrar(funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        return resultado, time.perf_counter() - inicio
+
+    # Documento com falha: erro na conversão ou alguma página sem OCR
+    def cronometrar_ocr(funcao, *args):
+        metricas = []
+        inicio = time.perf_counter()
+        try:
+            funcao(*args, metricas)
+        except ErroDocumento:
+            return True, time.perf_counter() - inicio
+        return bool(paginas_com_erro(metricas)), time.perf_counter() - inicio
+
+    if caso.startswith("processar_pdf_"):
+        paginas = int(caso[len("processar_pdf_"):-1])
+        # Um PDF diferente por repetição, para não medir o cache de páginas repetidas
+        documentos = [gerar_pdf(paginas, semente + i) for i in range(repeticoes)]
+        for pdf in documentos:
+            falhou, duracao = cronometrar_ocr(processar_pdf, pdf, 300, True)
+            falhas += falhou
+            amostras.append((duracao, paginas))
+
+    elif caso == "processar_imagem":
+        imagens = [gerar_imagem(i, semente) for i in range(repeticoes)]
+        for imagem in imagens:
+            falhou, duracao = cronometrar_ocr(processar_imagem, imagem, True)
+            falhas += falhou
+            amostras.append((duracao, 1))
+
+    elif caso == "processar_texto_contracheque":
+        textos = [texto_contracheque(i, semente) for i in range(repeticoes)]
+        processar_texto_contracheque(textos[0])  # importa o pandas fora da medição
+        for texto in textos:
+            df, duracao = cronometrar(processar_texto_contracheque, texto)
+            falhas += not df.iloc[0]["Valor Líquido"]
+            amostras.append((duracao, 1))
+
+    elif caso == "salvar_dados_extraidos":
+        textos = [texto_contracheque(i, semente) for i in range(repeticoes)]
+        dados = [processar_texto_contracheque(texto) for texto in textos]
+        for i, (texto, df) in enumerate(zip(textos, dados)):
+            identificador, duracao = cronometrar(
+                salvar_dados_extraidos, df, f"bench_{semente}_{i}.pdf", f"bench:{semente}:{i}".encode(), texto
+            )
+            falhas += identificador is None
+            amostras.append((duracao, 1))
+
+    elif caso in ("consultar_historico", "consultar_textos_brutos"):
+        popular_banco(REGISTROS_CONSULTA, semente)
+        consultar = consultar_historico if caso == "consultar_historico" else consultar_textos_brutos
+        # Período que cobre todos os registros, como a consulta padrão da interface
+        data_fim = datetime.now().strftime("%Y-%m-%d")
+        for _ in range(repeticoes):
+            df, duracao = cronometrar(consultar, "2000-01-01", data_fim)
+            amostras.append((duracao, len(df)))
+
+    else:
+        raise ValueError(f"Caso desconhecido: {caso}")
+
+    return amostras, falhas
+
+# Função para gravar o perfil de um caso (.prof para o pstats e relatório em texto)
+def gravar_perfil(resultado_perfil, diretorio, caso):
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    if resultado_perfil.perfil:
+        (diretorio / f"{caso}.prof").write_bytes(resultado_perfil.perfil)
+    relatorio = [resultado_perfil.relatorio_texto(), "Linhas com mais memória alocada:"]
+    relatorio += [f"  {a['local']:<40} {a['kb']:>10.1f} KB  {a['blocos']:>8} blocos" for a in resultado_perfil.alocacoes]
+    (diretorio / f"{caso}.txt").write_text("\n".join(relatorio) + "\n", encoding="utf-8")
+
+# Função que roda um caso no processo atual e imprime o resultado em JSON
+def executar_caso(caso, repeticoes, semente, diretorio_perfil=None):
+    if diretorio_perfil:
+        # O perfilamento deixa o caso mais lento: os tempos servem só para comparar funções
+        from perfilamento import Perfilador
+
+        with Perfilador(caso) as perfilador:
+            amostras, falhas = medir_caso(caso, repeticoes, semente)
+        gravar_perfil(perfilador.resultado, diretorio_perfil, caso)
+    else:
+        amostras, falhas = medir_caso(caso, repeticoes, semente)
+    duracoes = [duracao for duracao, _ in amostras]
+    paginas = sum(quantidade for _, quantidade in amostras)
+    total = sum(duracoes)
+    resultado = {
+        "caso": caso,
+        "repeticoes": len(amostras),
+        "falhas": int(falhas),
+        "unidades": paginas,
+        "duracao_total_s": round(total, 4),
+        "paginas_por_segundo": round(paginas / total, 2) if total else None,
+        "p50_ms": round(percentil(duracoes, 0.5) * 1000, 2),
+        "p95_ms": round(percentil(duracoes, 0.95) * 1000, 2),
+        "media_ms": round(statistics.mean(duracoes) * 1000, 2),
+        "pico_rss_mb": pico_rss_mb(),
+    }
+    print(json.dumps(resultado))
+
+# Função para comparar os resultados com uma execução anterior
+def comparar_resultados(atuais, anteriores, tolerancia):
+    """
+    Imprime a variação de p50, p95 e páginas/s em relação à execução
+    anterior e retorna a lista de casos que pioraram além da tolerância.
+    """
+    anteriores = {r["caso"]: r for r in anteriores["casos"]}
+    regressoes = []
+    print("\nComparação com a execução anterior:")
+    for atual in atuais["casos"]:
+        anterior = anteriores.get(atual["caso"])
+        if not anterior or "erro" in atual or "erro" in anterior:
+            continue
+        variacoes = {}
+        for chave in ("p50_ms", "p95_ms", "paginas_por_segundo"):
+            if atual.get(chave) and anterior.get(chave):
+                variacoes[chave] = atual[chave] / anterior[chave] - 1
+        piorou = (
+            variacoes.get("p50_ms", 0) > tolerancia
+            or variacoes.get("p95_ms", 0) > tolerancia
+            or variacoes.get("paginas_por_segundo", 0) < -tolerancia
+        )
+        if piorou:
+            regressoes.append(atual["caso"])
+        print(
+            f"  {atual['caso']:<30} "
+            + "  ".join(f"{chave} {variacao:+.1%}" for chave, variacao in variacoes.items())
+            + ("  <- REGRESSÃO" if piorou else "")
+        )
+    return regressoes
+
+def main():
+    sys.path.insert(0, str(DIRETORIO))
+    from servidor_vision_falso import adicionar_argumentos, configuracao_argumentos, iniciar_servidor
+
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de contracheques")
+    parser.add_argument("--casos", nargs="+", choices=CASOS, default=CASOS)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--modo-ocr", choices=["vision", "local"], default="vision",
+                        help="vision usa o servidor falso; local usa o Tesseract instalado")
+    adicionar_argumentos(parser)
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Piora relativa aceita na comparação")
+    parser.add_argument("--perfil", help="Diretório para gravar o perfil (cProfile e tracemalloc) de cada caso")
+    parser.add_argument("--caso-interno", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso_interno:
+        sys.path[:0] = [str(RAIZ), str(DIRETORIO)]
+        executar_caso(args.caso_interno, args.repeticoes, args.semente, args.perfil)
+        return
+
+    configuracao = configuracao_argumentos(args, args.semente)
+    servidor, endpoint = iniciar_servidor(configuracao)
+
+    resultados = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "parametros": {
+            "repeticoes": args.repeticoes,
+            "semente": args.semente,
+            "modo_ocr": args.modo_ocr,
+            "cenario": args.cenario,
+            "latencia_ms": configuracao.latencia_ms,
+            "variacao_ms": configuracao.variacao_ms,
+            "taxa_erros": configuracao.taxa_erros,
+            "taxa_erros_permanentes": configuracao.taxa_erros_permanentes,
+            "confianca": configuracao.confianca,
+            "confianca_baixa": configuracao.confianca_baixa,
+            "taxa_baixa_confianca": configuracao.taxa_baixa_confianca,
+        },
+        "casos": [],
+    }
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        for caso in args.casos:
+            ambiente = dict(
+                os.environ,
+                CONTRACHEQUES_DB=str(Path(diretorio) / f"{caso}.db"),
+                OCR_MODO=args.modo_ocr,
+                VISION_ENDPOINT=endpoint,
+                METRICAS_PORTA="0",
+            )
+            processo = subprocess.run(
+                [sys.executable, __file__, "--caso-interno", caso,
+                 "--repeticoes", str(args.repeticoes), "--semente", str(args.semente)]
+                + (["--perfil", str(Path(args.perfil).resolve())] if args.perfil else []),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=diretorio,
+                env=ambiente,
+            )
+            if processo.returncode != 0:
+                resultado = {"caso": caso, "erro": processo.stderr.strip().splitlines()[-1:]}
+            else:
+                resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+            resultados["casos"].append(resultado)
+
+            if "erro" in resultado:
+                print(f"{caso:<30} ERRO: {resultado['erro']}")
+            else:
+                print(
+                    f"{caso:<30} {resultado['paginas_por_segundo'] or 0:>9.2f} un/s  "
+                    f"p50 {resultado['p50_ms']:>9.2f} ms  p95 {resultado['p95_ms']:>9.2f} ms  "
+                    f"RSS {resultado['pico_rss_mb']:>7.1f} MB  falhas {resultado['falhas']}"
+                )
+
+    servidor.shutdown()
+    resultados["servidor_vision"] = {
+        "requisicoes": configuracao.requisicoes,
+        "erros": configuracao.erros,
+        "respostas_baixa_confianca": configuracao.respostas_baixa_confianca,
+    }
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.comparar:
+        anteriores = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        if comparar_resultados(resultados, anteriores, args.tolerancia):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Relatório de desempenho da inicialização do aplicativo.
+
+Mede, em processos Python novos, o tempo de importação dos módulos do
+aplicativo e de cada dependência pesada, e depois o tempo da primeira
+execução do script Streamlit e das reexecuções seguintes (via AppTest).
+
+Uso:
+    python benchmarks/inicializacao.py [--reexecucoes 10] [--json resultado.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+SCRIPT_APP = RAIZ / "app_web_ocr_google_completo.py"
+
+# Módulos medidos isoladamente, cada um em um processo novo
+MODULOS = [
+    "streamlit",
+    "banco_dados",
+    "processamento",
+    "pandas",
+    "matplotlib.pyplot",
+    "pdf2image",
+    "google.cloud.vision",
+]
+
+# Função para medir a importação de um módulo em um processo novo
+def medir_importacao(modulo):
+    """
+    Importa o módulo em um interpretador novo e retorna a duração em ms,
+    ou None se o módulo não estiver instalado.
+    """
+    codigo = (
+        "import sys, time; sys.path.insert(0, %r); inicio = time.perf_counter(); "
+        "import %s; print((time.perf_counter() - inicio) * 1000)" % (str(RAIZ), modulo)
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-c", codigo],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=RAIZ,
+    )
+    if resultado.returncode != 0:
+        return None
+    return float(resultado.stdout.strip().splitlines()[-1])
+
+# Função para medir a primeira execução e as reexecuções do script
+def medir_execucoes(reexecucoes):
+    """
+    Executa o script com AppTest e retorna (primeira execução em ms,
+    lista das reexecuções em ms, módulos pesados carregados ao final).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, str(RAIZ))
+    app = AppTest.from_file(str(SCRIPT_APP), default_timeout=120)
+
+    inicio = time.perf_counter()
+    app.run()
+    primeira = (time.perf_counter() - inicio) * 1000
+
+    tempos = []
+    for _ in range(reexecucoes):
+        inicio = time.perf_counter()
+        app.run()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    carregados = [m for m in ("pandas", "matplotlib", "pdf2image", "google.cloud.vision") if m in sys.modules]
+    return primeira, tempos, carregados
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de tempo de importação e de reexecução")
+    parser.add_argument("--reexecucoes", type=int, default=10, help="Número de reexecuções medidas")
+    parser.add_argument("--json", help="Arquivo onde gravar o resultado em JSON")
+    args = parser.parse_args()
+
+    importacoes = {modulo: medir_importacao(modulo) for modulo in MODULOS}
+    primeira, reexecucoes, carregados = medir_execucoes(args.reexecucoes)
+
+    resultado = {
+        "importacao_ms": importacoes,
+        "primeira_execucao_ms": round(primeira, 1),
+        "reexecucao_mediana_ms": round(statistics.median(reexecucoes), 1) if reexecucoes else None,
+        "reexecucao_maxima_ms": round(max(reexecucoes), 1) if reexecucoes else None,
+        "modulos_pesados_carregados": carregados,
+    }
+
+    print("Importação (processo novo):")
+    for modulo, duracao in importacoes.items():
+        print(f"  {modulo:<22} {'não instalado' if duracao is None else f'{duracao:8.1f} ms'}")
+    print(f"Primeira execução do script: {resultado['primeira_execucao_ms']} ms")
+    print(f"Reexecuções ({args.reexecucoes}): mediana {resultado['reexecucao_mediana_ms']} ms, "
+          f"máxima {resultado['reexecucao_maxima_ms']} ms")
+    print(f"Módulos pesados carregados sem uso: {', '.join(carregados) or 'nenhum'}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
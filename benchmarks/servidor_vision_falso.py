@@ -0,0 +1,226 @@
+"""
+Servidor local que imita o endpoint REST do Google Vision
+(POST /v1/images:annotate), com latência, confiança e taxas de erro
+configuráveis por cenário.
+
+A resposta de cada imagem é derivada do seu conteúdo (SHA-256): o hash
+escolhe o contracheque sintético devolvido e decide se a imagem tem
+baixa confiança (valores ilegíveis, o que aciona o escalonamento de DPI)
+ou erro permanente. Erros transitórios dependem do hash e da tentativa,
+de forma que uma nova tentativa da mesma imagem pode dar certo. Assim o
+resultado não depende da ordem nem da concorrência das requisições; só
+a latência é sorteada.
+
+Erros transitórios são respondidos com HTTP 503 ou 429 e erros
+permanentes com HTTP 400, como faz a API real.
+
+Uso isolado (o aplicativo aponta para ele com VISION_ENDPOINT):
+    python benchmarks/servidor_vision_falso.py --porta 8089 --latencia-ms 150 --cenario instavel
+    VISION_ENDPOINT=http://127.0.0.1:8089 streamlit run app_web_ocr_google_completo.py
+"""
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from contracheques_sinteticos import texto_contracheque
+
+
+# Cenários prontos; os parâmetros informados explicitamente têm precedência
+CENARIOS = {
+    "estavel": {},
+    "baixa_confianca": {"taxa_baixa_confianca": 0.3},
+    "instavel": {"taxa_erros": 0.1},
+    "degradado": {"taxa_erros": 0.1, "taxa_erros_permanentes": 0.02, "taxa_baixa_confianca": 0.3},
+}
+
+# Contracheques sintéticos distintos que o servidor pode devolver
+QUANTIDADE_FIXTURES = 1000
+
+
+class ConfiguracaoServidor:
+    """
+    Latência (média e variação, em ms), confiança das respostas e taxas de
+    erro do servidor falso.
+    """
+
+    def __init__(self, latencia_ms=100.0, variacao_ms=30.0, taxa_erros=0.0, taxa_erros_permanentes=0.0, semente=0,
+                 confianca=0.97, confianca_baixa=0.55, taxa_baixa_confianca=0.0):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_erros = taxa_erros
+        self.taxa_erros_permanentes = taxa_erros_permanentes
+        self.semente = semente
+        self.confianca = confianca
+        self.confianca_baixa = confianca_baixa
+        self.taxa_baixa_confianca = taxa_baixa_confianca
+        self.aleatorio = random.Random(semente)
+        self.lock = threading.Lock()
+        self.tentativas = collections.Counter()
+        self.requisicoes = 0
+        self.erros = 0
+        self.respostas_baixa_confianca = 0
+
+    def _fracao(self, resumo, rotulo, tentativa=0):
+        # Número em [0, 1) determinado pelo conteúdo da imagem, pela semente e pelo rótulo
+        valor = hashlib.sha256(resumo + f"{self.semente}:{rotulo}:{tentativa}".encode()).digest()
+        return int.from_bytes(valor[:8], "big") / 2 ** 64
+
+    def responder(self, conteudo):
+        """
+        Decide a resposta de uma imagem.
+
+        Returns:
+            Tupla (latência em segundos, código HTTP de erro ou None, texto, confiança)
+        """
+        resumo = hashlib.sha256(conteudo).digest()
+        with self.lock:
+            self.requisicoes += 1
+            tentativa = self.tentativas[resumo]
+            self.tentativas[resumo] += 1
+            latencia = max(0.0, self.aleatorio.gauss(self.latencia_ms, self.variacao_ms)) / 1000
+
+        erro = None
+        if self._fracao(resumo, "permanente") < self.taxa_erros_permanentes:
+            erro = 400
+        elif self._fracao(resumo, "transitorio", tentativa) < self.taxa_erros:
+            erro = 503 if self._fracao(resumo, "codigo", tentativa) < 0.5 else 429
+        if erro:
+            with self.lock:
+                self.erros += 1
+            return latencia, erro, None, None
+
+        texto = texto_contracheque(int.from_bytes(resumo[:8], "big") % QUANTIDADE_FIXTURES, self.semente)
+        if self._fracao(resumo, "confianca") < self.taxa_baixa_confianca:
+            with self.lock:
+                self.respostas_baixa_confianca += 1
+            # Imagem "ruim": os valores em reais não são reconhecidos
+            texto = "\n".join(linha for linha in texto.splitlines() if "R$" not in linha)
+            return latencia, None, texto, self.confianca_baixa
+        return latencia, None, texto, self.confianca
+
+
+# Função para montar a configuração de um cenário (parâmetros None ficam com o valor do cenário)
+def configuracao_cenario(cenario="estavel", **parametros):
+    valores = dict(CENARIOS[cenario])
+    valores.update({nome: valor for nome, valor in parametros.items() if valor is not None})
+    return ConfiguracaoServidor(**valores)
+
+
+# Função para registrar os parâmetros do servidor falso na linha de comando
+def adicionar_argumentos(parser, latencia_ms=100.0, variacao_ms=30.0):
+    parser.add_argument("--cenario", choices=list(CENARIOS), default="estavel",
+                        help="Cenário do servidor falso (confiança e taxas de erro)")
+    parser.add_argument("--latencia-ms", type=float, default=latencia_ms, help="Latência média do servidor falso")
+    parser.add_argument("--variacao-ms", type=float, default=variacao_ms, help="Desvio padrão da latência do servidor falso")
+    parser.add_argument("--taxa-erros", type=float, help="Fração de respostas 503/429 (padrão: a do cenário)")
+    parser.add_argument("--taxa-erros-permanentes", type=float, help="Fração de imagens com resposta 400")
+    parser.add_argument("--confianca", type=float, help="Confiança das respostas normais")
+    parser.add_argument("--confianca-baixa", type=float, help="Confiança das imagens com baixa confiança")
+    parser.add_argument("--taxa-baixa-confianca", type=float, help="Fração de imagens com baixa confiança")
+
+
+# Função para criar a configuração a partir dos argumentos de adicionar_argumentos
+def configuracao_argumentos(args, semente=0):
+    return configuracao_cenario(
+        args.cenario,
+        latencia_ms=args.latencia_ms,
+        variacao_ms=args.variacao_ms,
+        taxa_erros=args.taxa_erros,
+        taxa_erros_permanentes=args.taxa_erros_permanentes,
+        confianca=args.confianca,
+        confianca_baixa=args.confianca_baixa,
+        taxa_baixa_confianca=args.taxa_baixa_confianca,
+        semente=semente,
+    )
+
+
+def _resposta_erro(codigo):
+    situacoes = {400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}
+    return {"error": {"code": codigo, "message": "Erro simulado pelo servidor falso", "status": situacoes[codigo]}}
+
+
+def _resposta_texto(texto, confianca):
+    return {
+        "textAnnotations": [{"description": texto}],
+        "fullTextAnnotation": {"text": texto, "pages": [{"confidence": confianca}]},
+    }
+
+
+def criar_manipulador(configuracao):
+    class ManipuladorVision(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            tamanho = int(self.headers.get("Content-Length", 0))
+            corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+            if not self.path.startswith("/v1/images:annotate"):
+                self._responder(404, _resposta_erro(400))
+                return
+
+            respostas = []
+            for requisicao in corpo.get("requests", []):
+                conteudo = base64.b64decode(requisicao.get("image", {}).get("content", ""))
+                latencia, erro, texto, confianca = configuracao.responder(conteudo)
+                time.sleep(latencia)
+                if erro:
+                    self._responder(erro, _resposta_erro(erro))
+                    return
+                respostas.append(_resposta_texto(texto, confianca))
+            self._responder(200, {"responses": respostas})
+
+        def _responder(self, codigo, dados):
+            conteudo = json.dumps(dados).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(conteudo)))
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ManipuladorVision
+
+
+def iniciar_servidor(configuracao=None, host="127.0.0.1", porta=0):
+    """
+    Inicia o servidor falso em uma thread daemon.
+
+    Returns:
+        Tupla (servidor, endpoint no formato http://host:porta)
+    """
+    configuracao = configuracao or ConfiguracaoServidor()
+    servidor = ThreadingHTTPServer((host, porta), criar_manipulador(configuracao))
+    servidor.daemon_threads = True
+    servidor.configuracao = configuracao
+    threading.Thread(target=servidor.serve_forever, name="vision-falso", daemon=True).start()
+    host, porta = servidor.server_address[:2]
+    return servidor, f"http://{host}:{porta}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso do Google Vision (REST)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8089)
+    adicionar_argumentos(parser)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    configuracao = configuracao_argumentos(args, args.semente)
+    servidor, endpoint = iniciar_servidor(configuracao, args.host, args.porta)
+    print(f"Servidor falso do Vision em {endpoint} (Ctrl+C para encerrar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Exportação do histórico de contracheques em Excel, CSV compactado e Parquet.
+
+As linhas são lidas do cursor do SQLite em lotes e escritas direto no
+arquivo de destino, sem montar um DataFrame com o resultado inteiro:
+o Excel usa o modo constant_memory do xlsxwriter (cada linha vai para o
+disco assim que é escrita), o CSV é compactado com gzip enquanto é
+gerado e o Parquet é gravado em grupos de linhas, com as colunas de
+valores monetários como decimal (2 casas).
+
+A leitura em lotes e o arquivo temporário (em disco a partir de
+LIMITE_MEMORIA_EXPORTACAO) limitam a memória da geração. Na interface,
+porém, o st.download_button guarda o arquivo pronto inteiro na memória
+do servidor; por isso a interface só exporta até
+LIMITE_LINHAS_EXPORTACAO_INTERFACE registros, e exportações maiores
+devem ser feitas com `python manutencao.py exportar`, que grava direto
+no arquivo de destino.
+"""
+import csv
+import gzip
+import io
+import os
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import telemetria
+from banco_dados import iterar_historico
+
+# Formatos disponíveis: descrição, extensão do arquivo e tipo MIME
+FORMATOS_EXPORTACAO = {
+    "xlsx": ("Excel (.xlsx)", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv.gz": ("CSV compactado (.csv.gz)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet (.parquet)", ".parquet", "application/vnd.apache.parquet"),
+}
+
+# Colunas com valores em reais
+COLUNAS_MOEDA = ("salario_base", "descontos", "valor_liquido")
+
+# Linhas lidas do banco por lote
+TAMANHO_LOTE_EXPORTACAO = 5000
+
+# Tamanho a partir do qual o arquivo temporário da exportação vai para o disco
+LIMITE_MEMORIA_EXPORTACAO = 16 * 1024 * 1024
+
+# Registros exportáveis pela interface (o arquivo pronto fica na memória do servidor)
+LIMITE_LINHAS_EXPORTACAO_INTERFACE = int(os.environ.get("LIMITE_LINHAS_EXPORTACAO_INTERFACE", "100000"))
+
+# Limite de linhas de uma planilha do Excel (incluindo o cabeçalho)
+LINHAS_POR_PLANILHA = 1_048_576
+
+
+# Função para exportar em Excel (xlsxwriter em modo constant_memory)
+def exportar_excel(destino, colunas, lotes):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    formato_cabecalho = workbook.add_format({"bold": True})
+    formato_moeda = workbook.add_format({"num_format": "R$ #,##0.00"})
+    indices_moeda = {i for i, coluna in enumerate(colunas) if coluna in COLUNAS_MOEDA}
+
+    def nova_planilha(numero):
+        nome = "Contracheques" if numero == 1 else f"Contracheques ({numero})"
+        worksheet = workbook.add_worksheet(nome)
+        for idx in indices_moeda:
+            worksheet.set_column(idx, idx, 15, formato_moeda)
+        worksheet.write_row(0, 0, colunas, formato_cabecalho)
+        return worksheet
+
+    planilhas = 1
+    worksheet = nova_planilha(planilhas)
+    linha_atual = 1
+    total = 0
+    for lote in lotes:
+        for linha in lote:
+            # Resultados maiores que o limite do Excel continuam em uma nova planilha
+            if linha_atual == LINHAS_POR_PLANILHA:
+                planilhas += 1
+                worksheet = nova_planilha(planilhas)
+                linha_atual = 1
+            worksheet.write_row(linha_atual, 0, linha)
+            linha_atual += 1
+            total += 1
+
+    workbook.close()
+    return total
+
+# Função para exportar em CSV compactado com gzip
+def exportar_csv_gz(destino, colunas, lotes):
+    indices_moeda = {i for i, coluna in enumerate(colunas) if coluna in COLUNAS_MOEDA}
+    total = 0
+
+    # O GzipFile não fecha o destino; o TextIOWrapper fecha apenas o GzipFile
+    with io.TextIOWrapper(gzip.GzipFile(fileobj=destino, mode="wb"), encoding="utf-8", newline="") as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(colunas)
+        for lote in lotes:
+            if indices_moeda:
+                lote = [
+                    [f"{valor:.2f}" if i in indices_moeda and valor is not None else valor for i, valor in enumerate(linha)]
+                    for linha in lote
+                ]
+            escritor.writerows(lote)
+            total += len(lote)
+
+    return total
+
+# Função para montar o esquema Parquet das colunas exportadas
+def esquema_parquet(colunas):
+    import pyarrow as pa
+
+    tipos = {
+        "id": pa.int64(),
+        "data_processamento": pa.timestamp("s"),
+        "validado": pa.bool_(),
+    }
+    tipos.update({coluna: pa.decimal128(15, 2) for coluna in COLUNAS_MOEDA})
+    return pa.schema([(coluna, tipos.get(coluna, pa.string())) for coluna in colunas])
+
+# Função para converter um valor do SQLite para o tipo da coluna Parquet
+def converter_valor_parquet(coluna, valor):
+    if valor is None:
+        return None
+    if coluna in COLUNAS_MOEDA:
+        return Decimal(f"{valor:.2f}")
+    if coluna == "data_processamento":
+        return datetime.fromisoformat(str(valor))
+    if coluna == "validado":
+        return bool(valor)
+    if coluna == "id":
+        return int(valor)
+    return str(valor)
+
+# Função para exportar em Parquet (um grupo de linhas por lote)
+def exportar_parquet(destino, colunas, lotes):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow).") from e
+
+    esquema = esquema_parquet(colunas)
+    total = 0
+    with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+        for lote in lotes:
+            dados = {
+                coluna: [converter_valor_parquet(coluna, linha[i]) for linha in lote]
+                for i, coluna in enumerate(colunas)
+            }
+            escritor.write_table(pa.Table.from_pydict(dados, schema=esquema))
+            total += len(lote)
+
+    return total
+
+EXPORTADORES = {
+    "xlsx": exportar_excel,
+    "csv.gz": exportar_csv_gz,
+    "parquet": exportar_parquet,
+}
+
+# Função para exportar o histórico de contracheques
+def exportar_historico(destino, formato, data_inicio=None, data_fim=None, filtro_nome=None,
+                       filtro_matricula=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Exporta o histórico (com os mesmos filtros de consultar_historico) no
+    formato pedido, lendo o banco em lotes.
+
+    Args:
+        destino: Arquivo binário aberto para escrita (ou caminho)
+        formato: Uma das chaves de FORMATOS_EXPORTACAO
+
+    Returns:
+        Quantidade de registros exportados
+    """
+    if formato not in EXPORTADORES:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+    inicio = time.perf_counter()
+    colunas, lotes = iterar_historico(data_inicio, data_fim, filtro_nome, filtro_matricula, tamanho_lote)
+    try:
+        total = EXPORTADORES[formato](destino, colunas, lotes)
+    finally:
+        lotes.close()
+
+    telemetria.observar(
+        "contracheques_etapa_duracao_segundos", time.perf_counter() - inicio,
+        etapa="exportacao", tipo=formato, motor=""
+    )
+    return total
+
+# Função para gerar a exportação em um arquivo temporário
+def exportar_para_arquivo_temporario(formato, *args, **kwargs):
+    """
+    Gera a exportação em um SpooledTemporaryFile (em memória até
+    LIMITE_MEMORIA_EXPORTACAO, depois em disco), pronto para leitura.
+
+    Returns:
+        Arquivo temporário posicionado no início
+    """
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_EXPORTACAO, suffix=FORMATOS_EXPORTACAO[formato][1])
+    try:
+        exportar_historico(arquivo, formato, *args, **kwargs)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
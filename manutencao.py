@@ -0,0 +1,196 @@
+"""
+Tarefas de manutenção do banco de contracheques pela linha de comando.
+
+Uso:
+    python manutencao.py exportar --formato parquet --saida contracheques.parquet
+    python manutencao.py exportar --formato xlsx --saida 2023.xlsx --inicio 2023-01-01 --fim 2023-12-31
+    python manutencao.py coletar-orfaos --simular
+    python manutencao.py reprocessar --todos --atualizar
+    python manutencao.py arquivar --horizonte-meses 24
+    python manutencao.py backup --destino /mnt/backup/contracheques
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from armazenamento import CARENCIA_ORFAOS, abrir_arquivo, arquivo_existe, caminho_arquivo, mapear_arquivo
+from arquivamento import HORIZONTE_MESES, arquivar_registros, fazer_backup
+from banco_dados import coletar_arquivos_orfaos, conectar
+from exportacao import FORMATOS_EXPORTACAO, TAMANHO_LOTE_EXPORTACAO, exportar_historico
+
+
+# Subcomando: exportar o histórico (por padrão, o arquivo inteiro)
+def comando_exportar(args):
+    inicio = time.perf_counter()
+    with open(args.saida, "wb") as destino:
+        total = exportar_historico(
+            destino, args.formato, args.inicio, args.fim, args.nome, args.matricula, args.lote
+        )
+    print(f"{total} registros exportados para {args.saida} em {time.perf_counter() - inicio:.1f} s")
+
+# Subcomando: remover do armazenamento os originais sem registro no banco
+def comando_coletar_orfaos(args):
+    resultado = coletar_arquivos_orfaos(args.carencia_horas * 3600, args.simular)
+    acao = "seriam removidos" if args.simular else "removidos"
+    print(
+        f"{resultado['removidos']} arquivos órfãos {acao} ({resultado['bytes_liberados'] / (1024 * 1024):.1f} MB), "
+        f"{resultado['em_carencia']} ainda na carência, {resultado['temporarios']} temporários abandonados"
+    )
+
+# Subcomando: refazer o OCR dos originais guardados, lidos direto do disco
+def comando_reprocessar(args):
+    from processamento import ErroDocumento, paginas_com_erro, processar_imagem, processar_pdf
+
+    conn = conectar()
+    # Registros como (hash, nome, ano, id, caminho do banco); ano e caminho
+    # só existem para os arquivos movidos para o banco frio de um ano
+    arquivados = '''
+        SELECT h.hash_arquivo, '', h.ano, h.arquivo_id, p.caminho
+        FROM hashes_arquivados h JOIN particoes_frias p ON p.ano = h.ano
+    '''
+    if args.todos:
+        registros = conn.execute(f'''
+            SELECT hash_arquivo, nome_arquivo, NULL, id, NULL FROM arquivos_processados
+            UNION ALL {arquivados}
+        ''').fetchall()
+    else:
+        registros = [
+            conn.execute(
+                "SELECT hash_arquivo, nome_arquivo, NULL, id, NULL FROM arquivos_processados WHERE hash_arquivo = ?",
+                (hash_arquivo,)
+            ).fetchone()
+            or conn.execute(f"{arquivados} WHERE h.hash_arquivo = ?", (hash_arquivo,)).fetchone()
+            or (hash_arquivo, "", None, None, None)
+            for hash_arquivo in args.hashes
+        ]
+
+    # Conexões com os bancos frios dos anos atualizados
+    frios = {}
+    reprocessados = atualizados = ausentes = falhas = 0
+    for hash_arquivo, nome_arquivo, ano, arquivo_id, caminho in registros:
+        if ano is not None:
+            nome_arquivo = nome_arquivo or f"(arquivado em {ano})"
+        if not arquivo_existe(hash_arquivo):
+            # Enviado antes do armazenamento existir: precisa ser reenviado
+            ausentes += 1
+            print(f"{hash_arquivo[:12]}  {nome_arquivo}: original não armazenado")
+            continue
+
+        # O tipo vem do conteúdo (arquivos de anos arquivados não têm nome no banco atual)
+        with abrir_arquivo(hash_arquivo) as original:
+            pdf = original.read(5) == b"%PDF-"
+        metricas = []
+        try:
+            if pdf:
+                texto = processar_pdf(str(caminho_arquivo(hash_arquivo)), args.dpi, not args.sem_adaptativo, metricas)
+            else:
+                with mapear_arquivo(hash_arquivo) as mapa:
+                    texto = processar_imagem(mapa, not args.sem_adaptativo, metricas)
+        except ErroDocumento as e:
+            falhas += 1
+            print(f"{hash_arquivo[:12]}  {nome_arquivo}: {e}")
+            continue
+
+        # Página com erro de OCR: o texto está incompleto e não substitui o gravado
+        com_erro = paginas_com_erro(metricas)
+        if com_erro:
+            falhas += 1
+            print(f"{hash_arquivo[:12]}  {nome_arquivo}: erro no OCR das páginas {', '.join(map(str, com_erro))}")
+            continue
+
+        reprocessados += 1
+        if args.atualizar:
+            if ano is None:
+                destino = conn
+                cursor = destino.execute(
+                    "UPDATE arquivos_processados SET texto_extraido = ? WHERE hash_arquivo = ?", (texto, hash_arquivo)
+                )
+            elif not Path(caminho).exists():
+                falhas += 1
+                print(f"{hash_arquivo[:12]}  {nome_arquivo}: banco de {ano} não encontrado em {caminho}")
+                continue
+            else:
+                if ano not in frios:
+                    frios[ano] = sqlite3.connect(caminho)
+                destino = frios[ano]
+                cursor = destino.execute(
+                    "UPDATE arquivos_processados SET texto_extraido = ? WHERE id = ? AND hash_arquivo = ?",
+                    (texto, arquivo_id, hash_arquivo)
+                )
+            destino.commit()
+            if cursor.rowcount == 0:
+                print(f"{hash_arquivo[:12]}  {nome_arquivo}: {len(texto)} caracteres, sem registro no banco para atualizar")
+                continue
+            atualizados += 1
+        print(f"{hash_arquivo[:12]}  {nome_arquivo}: {len(texto)} caracteres")
+
+    for frio in frios.values():
+        frio.close()
+    conn.close()
+    resumo = f"{reprocessados} reprocessados"
+    if args.atualizar:
+        resumo += f" ({atualizados} atualizados no banco)"
+    print(f"{resumo}, {ausentes} sem original armazenado, {falhas} falhas")
+
+# Subcomando: mover os registros antigos para os bancos frios de cada ano
+def comando_arquivar(args):
+    resumo = arquivar_registros(args.horizonte_meses, not args.sem_compactar)
+    if not resumo:
+        print("Nenhum registro anterior ao horizonte.")
+    for ano, movidos in resumo.items():
+        print(f"{ano}: {movidos['contracheques']} contracheques e {movidos['arquivos_processados']} textos arquivados")
+
+# Subcomando: backup do banco atual e dos anos arquivados ainda não copiados
+def comando_backup(args):
+    resultado = fazer_backup(args.destino)
+    print(f"Banco atual copiado para {resultado['banco_atual']}")
+    print(f"Anos copiados: {', '.join(map(str, resultado['anos_copiados'])) or 'nenhum'}")
+    print(f"Anos sem alteração desde a última cópia: {', '.join(map(str, resultado['anos_ja_copiados'])) or 'nenhum'}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do banco de contracheques")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    exportar = subparsers.add_parser("exportar", help="Exporta o histórico de contracheques")
+    exportar.add_argument("--formato", choices=list(FORMATOS_EXPORTACAO), default="csv.gz")
+    exportar.add_argument("--saida", required=True, help="Arquivo de destino")
+    exportar.add_argument("--inicio", help="Data inicial de processamento (AAAA-MM-DD)")
+    exportar.add_argument("--fim", help="Data final de processamento (AAAA-MM-DD)")
+    exportar.add_argument("--nome", help="Filtro por nome")
+    exportar.add_argument("--matricula", help="Filtro por matrícula")
+    exportar.add_argument("--lote", type=int, default=TAMANHO_LOTE_EXPORTACAO, help="Linhas lidas do banco por vez")
+    exportar.set_defaults(funcao=comando_exportar)
+
+    coletar = subparsers.add_parser("coletar-orfaos", help="Remove originais armazenados sem registro no banco")
+    coletar.add_argument("--carencia-horas", type=float, default=CARENCIA_ORFAOS / 3600,
+                         help="Idade mínima dos arquivos removidos")
+    coletar.add_argument("--simular", action="store_true", help="Apenas informa o que seria removido")
+    coletar.set_defaults(funcao=comando_coletar_orfaos)
+
+    reprocessar = subparsers.add_parser("reprocessar", help="Refaz o OCR dos originais armazenados")
+    reprocessar.add_argument("hashes", nargs="*", help="Hashes SHA-256 dos arquivos")
+    reprocessar.add_argument("--todos", action="store_true", help="Reprocessa todos os arquivos do banco, inclusive os anos arquivados")
+    reprocessar.add_argument("--dpi", type=int, default=300, help="DPI máximo dos PDFs")
+    reprocessar.add_argument("--sem-adaptativo", action="store_true", help="Desativa a estratégia adaptativa")
+    reprocessar.add_argument("--atualizar", action="store_true", help="Grava o novo texto em arquivos_processados")
+    reprocessar.set_defaults(funcao=comando_reprocessar)
+
+    arquivar = subparsers.add_parser("arquivar", help="Move registros antigos para bancos por ano")
+    arquivar.add_argument("--horizonte-meses", type=int, default=HORIZONTE_MESES,
+                          help="Meses mantidos no banco principal")
+    arquivar.add_argument("--sem-compactar", action="store_true", help="Não executa VACUUM no banco principal")
+    arquivar.set_defaults(funcao=comando_arquivar)
+
+    backup = subparsers.add_parser("backup", help="Copia o banco principal e os anos arquivados alterados")
+    backup.add_argument("--destino", required=True, help="Diretório das cópias")
+    backup.set_defaults(funcao=comando_backup)
+
+    args = parser.parse_args(argv)
+    if args.comando == "reprocessar" and not (args.todos or args.hashes):
+        parser.error("informe os hashes ou --todos")
+    args.funcao(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
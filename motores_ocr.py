@@ -0,0 +1,563 @@
+"""
+Motores de OCR usados pelo aplicativo de contracheques.
+
+Define uma interface comum (MotorOCR), erros tipados, o motor do Google
+Vision, o motor local Tesseract (executado em um pool de processos) e um
+motor resiliente que combina novas tentativas com backoff exponencial,
+limitação de taxa (token bucket) e disjuntor (circuit breaker) com motor
+de reserva.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import telemetria
+
+logger = logging.getLogger(__name__)
+
+# Códigos gRPC que indicam falha temporária do serviço
+# (DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, ABORTED, INTERNAL, UNAVAILABLE)
+CODIGOS_TRANSITORIOS = {4, 8, 10, 13, 14}
+
+
+class ErroOCR(Exception):
+    """Erro base de todos os motores de OCR."""
+
+
+class ErroTransitorioOCR(ErroOCR):
+    """Falha temporária (cota, indisponibilidade, timeout); vale tentar de novo."""
+
+
+class ErroPermanenteOCR(ErroOCR):
+    """Falha que não se resolve com novas tentativas (credenciais, imagem inválida)."""
+
+
+class ErroServicoOCR(ErroPermanenteOCR):
+    """
+    O serviço recusa todas as requisições (credenciais inválidas ou
+    revogadas, cobrança desativada); abre o disjuntor imediatamente.
+    """
+
+
+class CircuitoAbertoOCR(ErroOCR):
+    """O disjuntor está aberto e não há motor de reserva configurado."""
+
+
+@dataclass
+class ResultadoOCR:
+    """
+    Texto reconhecido em uma imagem (latência em segundos, se medida pelo
+    motor; tentativas inclui as chamadas que falharam antes do resultado).
+    """
+    texto: str
+    confianca: float = None
+    motor: str = ""
+    latencia: float = None
+    tentativas: int = 1
+
+
+class MotorOCR:
+    """
+    Interface dos motores de OCR.
+
+    Implementações devem retornar um ResultadoOCR ou levantar ErroOCR
+    (ErroTransitorioOCR, ErroPermanenteOCR ou ErroServicoOCR). Motores com
+    aceita_imagem_decodificada = True também recebem imagens PIL, o que
+    evita codificar e decodificar a página novamente.
+    """
+    nome = "base"
+    aceita_imagem_decodificada = False
+
+    def reconhecer(self, conteudo_imagem):
+        raise NotImplementedError
+
+    def reconhecer_lote(self, conteudos):
+        """
+        Reconhece várias imagens, produzindo os resultados na ordem de
+        entrada. Erros são produzidos como instâncias de ErroOCR (em vez de
+        levantados) para que as demais páginas continuem.
+        """
+        for conteudo in conteudos:
+            inicio = time.perf_counter()
+            try:
+                resultado = self.reconhecer(conteudo)
+            except ErroOCR as e:
+                yield e
+                continue
+            if resultado.latencia is None:
+                resultado.latencia = time.perf_counter() - inicio
+            yield resultado
+
+
+class MotorGoogleVision(MotorOCR):
+    """
+    OCR pelo Google Vision API (text_detection). O cliente é criado uma
+    única vez e reaproveitado entre chamadas e threads.
+
+    Com endpoint (por exemplo "http://127.0.0.1:8089"), o cliente usa o
+    transporte REST nesse endereço; é assim que os benchmarks apontam para
+    um servidor local que imita o Vision.
+    """
+    nome = "Google Vision"
+
+    def __init__(self, credentials=None, timeout=30.0, endpoint=None):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.endpoint = endpoint
+        self._cliente = None
+        self._lock = threading.Lock()
+
+    def _obter_cliente(self):
+        with self._lock:
+            if self._cliente is None:
+                from google.cloud import vision
+                if self.endpoint:
+                    from google.auth.credentials import AnonymousCredentials
+                    self._cliente = vision.ImageAnnotatorClient(
+                        credentials=self.credentials or AnonymousCredentials(),
+                        transport="rest",
+                        client_options={"api_endpoint": self.endpoint},
+                    )
+                else:
+                    self._cliente = vision.ImageAnnotatorClient(credentials=self.credentials)
+            return self._cliente
+
+    def reconhecer(self, conteudo_imagem):
+        from google.api_core import exceptions as google_exceptions
+        from google.auth import exceptions as auth_exceptions
+        from google.cloud import vision
+
+        try:
+            resposta = self._obter_cliente().text_detection(
+                image=vision.Image(content=conteudo_imagem),
+                timeout=self.timeout
+            )
+        except (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.RetryError,
+        ) as e:
+            raise ErroTransitorioOCR(f"Google Vision indisponível: {e}") from e
+        except (
+            google_exceptions.Unauthenticated,
+            google_exceptions.Unauthorized,
+            google_exceptions.PermissionDenied,
+            google_exceptions.Forbidden,
+        ) as e:
+            raise ErroServicoOCR(f"Acesso ao Google Vision recusado: {e}") from e
+        except google_exceptions.GoogleAPICallError as e:
+            raise ErroPermanenteOCR(f"Erro na API Vision: {e}") from e
+        except auth_exceptions.TransportError as e:
+            # Falha de rede ao renovar o token (ex.: servidor de metadados fora do ar)
+            raise ErroTransitorioOCR(f"Falha de rede ao autenticar no Google Vision: {e}") from e
+        except auth_exceptions.GoogleAuthError as e:
+            raise ErroServicoOCR(f"Credenciais do Google Vision recusadas: {e}") from e
+        except Exception as e:
+            # Falhas de rede do transporte REST (requests) e demais erros sem tipo
+            raise ErroTransitorioOCR(f"Falha ao acessar o Google Vision: {type(e).__name__}: {e}") from e
+
+        # Erros reportados dentro da resposta
+        if resposta.error.message:
+            if resposta.error.code in CODIGOS_TRANSITORIOS:
+                raise ErroTransitorioOCR(f"Erro na API Vision: {resposta.error.message}")
+            raise ErroPermanenteOCR(f"Erro na API Vision: {resposta.error.message}")
+
+        textos = resposta.text_annotations
+        if not textos:
+            return ResultadoOCR("Nenhum texto detectado na imagem.", None, self.nome)
+        return ResultadoOCR(textos[0].description, calcular_confianca_resposta(resposta), self.nome)
+
+
+def calcular_confianca_resposta(resposta):
+    """
+    Retorna a confiança média das páginas (ou dos blocos, se as páginas não
+    trouxerem confiança) da resposta do Vision, ou None se não houver.
+    """
+    paginas = resposta.full_text_annotation.pages
+    confiancas = [pagina.confidence for pagina in paginas if pagina.confidence]
+    if not confiancas:
+        confiancas = [bloco.confidence for pagina in paginas for bloco in pagina.blocks if bloco.confidence]
+    return sum(confiancas) / len(confiancas) if confiancas else None
+
+
+# Estado de cada processo do pool do Tesseract (inicializado uma única vez)
+_api_tesseract = None
+_pytesseract = None
+_erro_inicializacao = None
+
+
+def _inicializar_trabalhador(idioma, psm):
+    """
+    Prepara o processo do pool: usa a API nativa do tesserocr, se instalada
+    (modelo carregado uma vez por processo), ou o pytesseract.
+    """
+    global _api_tesseract, _pytesseract, _erro_inicializacao
+
+    # Um núcleo por processo: o paralelismo vem do pool
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+    # Uma exceção no initializer quebraria o pool (BrokenProcessPool) a cada
+    # lote; o erro é guardado e devolvido como erro de cada página
+    try:
+        try:
+            import tesserocr
+            _api_tesseract = tesserocr.PyTessBaseAPI(lang=idioma, psm=psm)
+            _api_tesseract.SetVariable("preserve_interword_spaces", "1")
+        except ImportError:
+            import pytesseract
+            _pytesseract = pytesseract
+    except Exception as e:
+        _erro_inicializacao = f"{type(e).__name__}: {e}"
+
+
+def _aquecer_trabalhador():
+    """Tarefa vazia usada para iniciar os processos do pool antecipadamente."""
+    return os.getpid()
+
+
+def _reconhecer_no_trabalhador(imagem, idioma, psm, regioes):
+    """
+    Executa o OCR dentro de um processo do pool.
+
+    Args:
+        imagem: Imagem PIL já decodificada ou bytes codificados
+        idioma: Idioma do Tesseract
+        psm: Modo de segmentação de página do Tesseract
+        regioes: Lista opcional de regiões (x0, y0, x1, y1) em frações da
+            página; quando informada, só essas regiões são reconhecidas
+
+    Returns:
+        Tupla (texto, confiança entre 0 e 1 ou None, duração em segundos)
+
+    Raises:
+        RuntimeError: Com a mensagem do erro original. Algumas exceções (ex.:
+            TesseractNotFoundError do pytesseract) não podem ser recriadas no
+            processo principal, e o executor as trocaria por BrokenProcessPool
+    """
+    try:
+        return _executar_ocr(imagem, idioma, psm, regioes)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _executar_ocr(imagem, idioma, psm, regioes):
+    from PIL import Image
+
+    if _erro_inicializacao:
+        raise RuntimeError(_erro_inicializacao)
+
+    inicio = time.perf_counter()
+    if isinstance(imagem, (bytes, bytearray)):
+        imagem = Image.open(io.BytesIO(imagem))
+        imagem.load()
+
+    if regioes:
+        largura, altura = imagem.size
+        recortes = [
+            imagem.crop((int(x0 * largura), int(y0 * altura), int(x1 * largura), int(y1 * altura)))
+            for x0, y0, x1, y1 in regioes
+        ]
+    else:
+        recortes = [imagem]
+
+    textos = []
+    confiancas = []
+    for recorte in recortes:
+        if _api_tesseract is not None:
+            _api_tesseract.SetImage(recorte)
+            textos.append(_api_tesseract.GetUTF8Text())
+            confiancas.append(_api_tesseract.MeanTextConf() / 100)
+        else:
+            textos.append(_pytesseract.image_to_string(
+                recorte, lang=idioma, config=f"--psm {psm} -c preserve_interword_spaces=1"
+            ))
+
+    confianca = sum(confiancas) / len(confiancas) if confiancas else None
+    return "\n".join(textos), confianca, time.perf_counter() - inicio
+
+
+class MotorTesseract(MotorOCR):
+    """
+    OCR local com Tesseract executado em um pool de processos (um por
+    núcleo, por padrão). Os processos são iniciados uma única vez, já com o
+    Tesseract carregado, e recebem as páginas já decodificadas.
+
+    Requer o executável tesseract com o idioma 'por' e o pytesseract (ou o
+    tesserocr, que evita iniciar um processo tesseract por página).
+    """
+    nome = "Tesseract"
+    aceita_imagem_decodificada = True
+
+    # PSM 6: bloco uniforme de texto; mantém as linhas das tabelas do contracheque
+    PSM_PADRAO = 6
+
+    def __init__(self, idioma="por", processos=None, psm=PSM_PADRAO, regioes=None):
+        self.idioma = idioma
+        self.processos = processos or os.cpu_count() or 1
+        self.psm = psm
+        self.regioes = regioes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: o servidor do Streamlit é multithread, fork não é seguro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_trabalhador,
+                    initargs=(self.idioma, self.psm),
+                )
+                # Aquecer todos os processos antes da primeira página
+                for _ in range(self.processos):
+                    self._executor.submit(_aquecer_trabalhador)
+            return self._executor
+
+    def _descartar_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _enviar(self, conteudo_imagem):
+        try:
+            return self._obter_executor().submit(
+                _reconhecer_no_trabalhador, conteudo_imagem, self.idioma, self.psm, self.regioes
+            )
+        except BrokenProcessPool as e:
+            self._descartar_executor()
+            raise ErroTransitorioOCR(f"Pool do OCR local reiniciado: {e}") from e
+
+    def _coletar(self, futuro):
+        try:
+            texto, confianca, duracao = futuro.result()
+        except BrokenProcessPool as e:
+            self._descartar_executor()
+            raise ErroTransitorioOCR(f"Pool do OCR local reiniciado: {e}") from e
+        except Exception as e:
+            raise ErroPermanenteOCR(f"Erro no OCR local: {e}") from e
+        return ResultadoOCR(texto, confianca, self.nome, duracao)
+
+    def reconhecer(self, conteudo_imagem):
+        return self._coletar(self._enviar(conteudo_imagem))
+
+    def reconhecer_lote(self, conteudos):
+        # Envia todas as páginas de uma vez e coleta na ordem original
+        futuros = []
+        for conteudo in conteudos:
+            try:
+                futuros.append(self._enviar(conteudo))
+            except ErroOCR as e:
+                futuros.append(e)
+        for futuro in futuros:
+            if isinstance(futuro, ErroOCR):
+                yield futuro
+                continue
+            try:
+                yield self._coletar(futuro)
+            except ErroOCR as e:
+                yield e
+
+
+class LimitadorTaxa:
+    """
+    Token bucket: permite rajadas de até `capacidade` requisições e, em
+    média, `taxa_por_segundo` requisições por segundo. Seguro entre threads.
+    """
+
+    def __init__(self, taxa_por_segundo, capacidade=None):
+        self.taxa_por_segundo = taxa_por_segundo
+        self.capacidade = capacidade or max(1.0, taxa_por_segundo)
+        self._fichas = self.capacidade
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até haver uma ficha disponível e a consome."""
+        inicio = time.perf_counter()
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(
+                    self.capacidade,
+                    self._fichas + (agora - self._ultima_reposicao) * self.taxa_por_segundo
+                )
+                self._ultima_reposicao = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    break
+                espera = (1 - self._fichas) / self.taxa_por_segundo
+            time.sleep(espera)
+        telemetria.observar(
+            "contracheques_espera_lock_segundos", time.perf_counter() - inicio, recurso="limitador_taxa"
+        )
+
+
+class DisjuntorCircuito:
+    """
+    Circuit breaker: após `limiar_falhas` falhas consecutivas o circuito abre
+    e as chamadas são recusadas por `tempo_recuperacao` segundos. Depois disso
+    uma única chamada de teste é liberada (meio-aberto); se ela der certo o
+    circuito fecha, senão abre novamente.
+    """
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    MEIO_ABERTO = "meio-aberto"
+
+    def __init__(self, limiar_falhas=3, tempo_recuperacao=30.0):
+        self.limiar_falhas = limiar_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self._estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado
+
+    def permitir(self):
+        """Retorna True se a chamada ao motor principal pode ser feita."""
+        with self._lock:
+            if self._estado == self.FECHADO:
+                return True
+            if self._estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_recuperacao:
+                # Libera uma única chamada de teste
+                self._estado = self.MEIO_ABERTO
+                return True
+            return False
+
+    def recusando(self):
+        """
+        Retorna True se as chamadas seriam recusadas agora, sem alterar o
+        estado (não consome a chamada de teste do estado meio-aberto).
+        """
+        with self._lock:
+            if self._estado == self.ABERTO:
+                return time.monotonic() - self._aberto_em < self.tempo_recuperacao
+            return self._estado == self.MEIO_ABERTO
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._estado = self.FECHADO
+            self._falhas = 0
+
+    def abrir(self):
+        """Abre o circuito imediatamente (o serviço recusa todas as chamadas)."""
+        with self._lock:
+            if self._estado != self.ABERTO:
+                logger.warning("Disjuntor de OCR aberto: serviço recusou o acesso")
+            self._estado = self.ABERTO
+            self._aberto_em = time.monotonic()
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._estado == self.MEIO_ABERTO or self._falhas >= self.limiar_falhas:
+                if self._estado != self.ABERTO:
+                    logger.warning("Disjuntor de OCR aberto após %d falha(s)", self._falhas)
+                self._estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+
+
+class MotorResiliente(MotorOCR):
+    """
+    Envolve um motor principal com limitação de taxa, novas tentativas com
+    backoff exponencial e jitter, e disjuntor. Enquanto o disjuntor estiver
+    aberto, ou quando as tentativas se esgotam, usa o motor de reserva.
+    """
+
+    def __init__(self, principal, reserva=None, limitador=None, disjuntor=None,
+                 tentativas=3, espera_base=0.5, espera_maxima=8.0):
+        self.principal = principal
+        self.reserva = reserva
+        self.limitador = limitador
+        self.disjuntor = disjuntor
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.nome = principal.nome
+
+    def _espera(self, tentativa):
+        # Backoff exponencial com "full jitter"
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+
+    def reconhecer(self, conteudo_imagem):
+        if self.disjuntor is not None and not self.disjuntor.permitir():
+            return self._reconhecer_reserva(
+                conteudo_imagem, CircuitoAbertoOCR(f"{self.principal.nome} indisponível (disjuntor aberto)")
+            )
+
+        ultimo_erro = None
+        chamadas = 0
+        for tentativa in range(self.tentativas):
+            if self.limitador is not None:
+                self.limitador.adquirir()
+            chamadas += 1
+            try:
+                resultado = self.principal.reconhecer(conteudo_imagem)
+            except ErroTransitorioOCR as e:
+                ultimo_erro = e
+                logger.info("%s falhou (tentativa %d/%d): %s", self.principal.nome, tentativa + 1, self.tentativas, e)
+                if self.disjuntor is not None:
+                    self.disjuntor.registrar_falha()
+                    if not self.disjuntor.permitir():
+                        break
+                if tentativa + 1 < self.tentativas:
+                    time.sleep(self._espera(tentativa))
+                continue
+            except ErroServicoOCR as e:
+                # Credenciais ou cobrança: as próximas chamadas também seriam recusadas
+                ultimo_erro = e
+                if self.disjuntor is not None:
+                    self.disjuntor.abrir()
+                break
+            except ErroPermanenteOCR as e:
+                # O serviço respondeu; o problema é desta requisição
+                ultimo_erro = e
+                if self.disjuntor is not None:
+                    self.disjuntor.registrar_sucesso()
+                break
+            except Exception as e:
+                # Erro sem tipo do motor: conta como falha (o disjuntor não fica meio-aberto)
+                ultimo_erro = ErroTransitorioOCR(f"{self.principal.nome} falhou: {type(e).__name__}: {e}")
+                ultimo_erro.__cause__ = e
+                logger.warning("%s falhou com erro inesperado: %r", self.principal.nome, e)
+                if self.disjuntor is not None:
+                    self.disjuntor.registrar_falha()
+                break
+
+            if self.disjuntor is not None:
+                self.disjuntor.registrar_sucesso()
+            resultado.tentativas = chamadas
+            return resultado
+
+        return self._reconhecer_reserva(conteudo_imagem, ultimo_erro, chamadas)
+
+    def _reconhecer_reserva(self, conteudo_imagem, erro, tentativas_principal=0):
+        if self.reserva is None:
+            raise erro
+        logger.info("Usando %s: %s", self.reserva.nome, erro)
+        resultado = self.reserva.reconhecer(conteudo_imagem)
+        resultado.tentativas += tentativas_principal
+        return resultado
+
+    def reconhecer_lote(self, conteudos):
+        # Com o disjuntor aberto, o lote inteiro vai para a reserva (em paralelo, se ela suportar)
+        if self.reserva is not None and self.disjuntor is not None and self.disjuntor.recusando():
+            logger.info("Disjuntor aberto: lote enviado ao %s", self.reserva.nome)
+            yield from self.reserva.reconhecer_lote(conteudos)
+            return
+        yield from super().reconhecer_lote(conteudos)
@@ -0,0 +1,195 @@
+"""
+Perfilamento opcional de execuções do script e de tarefas em lote.
+
+Um Perfilador envolve um trecho de código com cProfile (tempo por
+função) e tracemalloc (memória alocada por linha). O resultado traz o
+perfil no formato do pstats (abre com `python -m pstats` ou snakeviz) e
+as tabelas das funções e linhas mais custosas.
+
+Ativado pela variável de ambiente PERFILAMENTO=1 ou pela chave de
+administração na barra lateral; desativado, não há custo além de um
+teste de condição.
+
+Só um perfilamento com cProfile roda por vez no processo: um Perfilador
+iniciado enquanto outro está ativo mede apenas a duração e a memória.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Perfilamento ligado para todas as sessões e tarefas em lote
+PERFILAMENTO_ATIVO = os.environ.get("PERFILAMENTO", "").strip().lower() in ("1", "true", "sim")
+# Quantidade de funções e linhas nas tabelas do resultado
+PERFILAMENTO_TOP = int(os.environ.get("PERFILAMENTO_TOP", "25"))
+# Quadros de pilha guardados por alocação no tracemalloc
+QUADROS_TRACEMALLOC = 1
+
+# Um cProfile ativo por vez no processo (no Python 3.12+ ele usa sys.monitoring,
+# que é global ao processo, e um segundo Profile().enable() falha)
+_lock_perfil = threading.Lock()
+
+# O tracemalloc é global ao processo: só é parado quando o último perfilador termina
+_lock_tracemalloc = threading.Lock()
+_usuarios_tracemalloc = 0
+
+
+@dataclass
+class ResultadoPerfil:
+    """Resultado de um perfilamento (durações em segundos, memória em bytes)."""
+    descricao: str
+    duracao: float
+    perfil: bytes
+    funcoes: list = field(default_factory=list)
+    alocacoes: list = field(default_factory=list)
+    pico_memoria: int = 0
+    erro: str = None
+
+    def relatorio_texto(self, ordenacao="cumulative"):
+        """Relatório do pstats (como em `python -m cProfile -s cumulative`)."""
+        if not self.perfil:
+            return self.erro or ""
+        saida = io.StringIO()
+        estatisticas = pstats.Stats(_StatsCarregadas(self.perfil), stream=saida)
+        estatisticas.sort_stats(ordenacao).print_stats(PERFILAMENTO_TOP)
+        return saida.getvalue()
+
+
+class _StatsCarregadas:
+    # pstats.Stats aceita qualquer objeto com create_stats() e .stats
+    def __init__(self, perfil):
+        self.stats = marshal.loads(perfil)
+
+    def create_stats(self):
+        pass
+
+
+def _iniciar_tracemalloc():
+    global _usuarios_tracemalloc
+    with _lock_tracemalloc:
+        if _usuarios_tracemalloc == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(QUADROS_TRACEMALLOC)
+        else:
+            tracemalloc.reset_peak()
+        _usuarios_tracemalloc += 1
+
+
+def _parar_tracemalloc():
+    global _usuarios_tracemalloc
+    with _lock_tracemalloc:
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        pico = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        _usuarios_tracemalloc = max(0, _usuarios_tracemalloc - 1)
+        if _usuarios_tracemalloc == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    return snapshot, pico
+
+
+class Perfilador:
+    """
+    Perfila o código executado entre iniciar() e parar(). Também pode ser
+    usado como gerenciador de contexto; o resultado fica em .resultado.
+
+    Até o Python 3.11 o cProfile acompanha só a thread que o ligou; a partir
+    do 3.12 ele usa sys.monitoring e registra as chamadas de todas as
+    threads do processo (no Streamlit, também as de outras sessões). Por
+    isso só um Perfilador usa o cProfile por vez; os demais registram o
+    motivo em .resultado.erro. parar() deve ser chamado sempre (por exemplo
+    em um finally), inclusive quando a execução é interrompida.
+    """
+
+    def __init__(self, descricao="", top=PERFILAMENTO_TOP, memoria=True):
+        self.descricao = descricao
+        self.top = top
+        self.memoria = memoria
+        self.resultado = None
+        self._perfil = None
+        self._inicio = None
+        self._erro = None
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._perfil = None
+        if not _lock_perfil.acquire(blocking=False):
+            self._erro = "cProfile ignorado: outro perfilamento está em andamento no processo"
+            logger.info(self._erro)
+        else:
+            self._perfil = cProfile.Profile()
+            try:
+                self._perfil.enable()
+            except ValueError as e:
+                # Outro profiler fora deste módulo está ativo
+                self._perfil = None
+                self._erro = f"cProfile indisponível: {e}"
+                logger.info(self._erro)
+                _lock_perfil.release()
+        if self.memoria:
+            _iniciar_tracemalloc()
+        return self
+
+    def parar(self):
+        if self.resultado is not None:
+            return self.resultado
+        duracao = time.perf_counter() - self._inicio
+        if self._perfil is not None:
+            try:
+                self._perfil.disable()
+            finally:
+                _lock_perfil.release()
+
+        snapshot, pico = _parar_tracemalloc() if self.memoria else (None, 0)
+
+        funcoes = []
+        perfil = b""
+        if self._perfil is not None:
+            estatisticas = pstats.Stats(self._perfil)
+            perfil = marshal.dumps(estatisticas.stats)
+            linhas = sorted(estatisticas.stats.items(), key=lambda item: item[1][2], reverse=True)
+            for (arquivo, linha, nome), (_, chamadas, tempo_proprio, tempo_acumulado, _) in linhas[:self.top]:
+                funcoes.append({
+                    "funcao": nome,
+                    "local": f"{os.path.basename(arquivo)}:{linha}" if linha else arquivo,
+                    "chamadas": chamadas,
+                    "tempo_proprio_ms": round(tempo_proprio * 1000, 2),
+                    "tempo_acumulado_ms": round(tempo_acumulado * 1000, 2),
+                })
+
+        alocacoes = []
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for estatistica in snapshot.statistics("lineno")[:self.top]:
+                quadro = estatistica.traceback[0]
+                alocacoes.append({
+                    "local": f"{os.path.basename(quadro.filename)}:{quadro.lineno}",
+                    "kb": round(estatistica.size / 1024, 1),
+                    "blocos": estatistica.count,
+                })
+
+        self.resultado = ResultadoPerfil(
+            descricao=self.descricao,
+            duracao=duracao,
+            perfil=perfil,
+            funcoes=funcoes,
+            alocacoes=alocacoes,
+            pico_memoria=pico,
+            erro=self._erro,
+        )
+        return self.resultado
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+        return False
@@ -0,0 +1,962 @@
+"""
+Pipeline de OCR dos contracheques: credenciais e motor de OCR (criados uma
+vez por processo), pré-processamento das imagens, detecção de páginas em
+branco e duplicadas, processamento de PDFs e imagens e interpretação do
+texto extraído.
+
+Módulos pesados (pandas, pdf2image, Google Cloud) são importados apenas
+quando a primeira função que precisa deles é chamada.
+"""
+import collections
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import tempfile
+
+import streamlit as st
+from PIL import Image, ImageChops, ImageOps
+
+import telemetria
+from motores_ocr import (
+    DisjuntorCircuito,
+    ErroOCR,
+    LimitadorTaxa,
+    MotorGoogleVision,
+    MotorResiliente,
+    MotorTesseract,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ErroDocumento(ErroOCR):
+    """O arquivo não pôde ser convertido em imagens (PDF inválido, Poppler ausente, imagem corrompida)."""
+
+
+# Configuração dos motores de OCR
+# OCR_MODO: "vision" (Google Vision, com Tesseract como reserva) ou "local" (só Tesseract)
+OCR_MODO = os.environ.get("OCR_MODO", "vision").strip().lower()
+VISION_REQUISICOES_POR_MINUTO = int(os.environ.get("VISION_REQUISICOES_POR_MINUTO", "1800"))
+# Endereço alternativo do Vision (transporte REST), usado com o servidor falso dos benchmarks
+VISION_ENDPOINT = os.environ.get("VISION_ENDPOINT", "").strip() or None
+OCR_TENTATIVAS = int(os.environ.get("OCR_TENTATIVAS", "3"))
+# Processos do Tesseract local (0 = um por núcleo) e modo de segmentação de página
+OCR_PROCESSOS_LOCAIS = int(os.environ.get("OCR_PROCESSOS_LOCAIS", "0"))
+TESSERACT_PSM = int(os.environ.get("TESSERACT_PSM", str(MotorTesseract.PSM_PADRAO)))
+THREADS_RENDERIZACAO = os.cpu_count() or 1
+# Páginas renderizadas e reconhecidas por vez nos PDFs (depois da primeira, que vai sozinha)
+PAGINAS_POR_LOTE = int(os.environ.get("PAGINAS_POR_LOTE", str(max(4, THREADS_RENDERIZACAO))))
+
+
+# Credenciais do Google Cloud, carregadas uma única vez por processo
+@st.cache_resource(show_spinner=False)
+def carregar_credenciais():
+    """
+    Carrega as credenciais do Google Cloud a partir dos secrets do Streamlit.
+    
+    Returns:
+        Tupla (credentials ou None, situação, mensagem de erro ou None), com
+        situação "ok", "ausente", "erro" ou "local" (modo local não usa a nuvem)
+    """
+    if OCR_MODO == "local":
+        return None, "local", None
+    
+    try:
+        possui_secrets = "gcp_service_account" in st.secrets
+    except Exception:
+        possui_secrets = False
+    if not possui_secrets:
+        return None, "ausente", None
+    
+    try:
+        from google.oauth2 import service_account
+        credentials = service_account.Credentials.from_service_account_info(
+            st.secrets["gcp_service_account"]
+        )
+        return credentials, "ok", None
+    except Exception as e:
+        return None, "erro", str(e)
+
+# Função para ler as regiões dos rótulos configuradas
+def carregar_regioes_rotulos():
+    """
+    Lê OCR_REGIOES_ROTULOS (JSON com uma lista de [x0, y0, x1, y1] em
+    frações da página). Vazio ou inválido = página inteira; um valor
+    inválido é registrado no log em vez de impedir o aplicativo de subir.
+    """
+    valor = os.environ.get("OCR_REGIOES_ROTULOS", "").strip()
+    if not valor:
+        return None
+    try:
+        regioes = json.loads(valor)
+        if not isinstance(regioes, list) or not regioes:
+            raise ValueError("esperada uma lista não vazia de regiões")
+        for regiao in regioes:
+            if (not isinstance(regiao, list) or len(regiao) != 4
+                    or not all(isinstance(c, (int, float)) and 0 <= c <= 1 for c in regiao)):
+                raise ValueError(f"região inválida: {regiao!r}")
+            x0, y0, x1, y1 = regiao
+            if x0 >= x1 or y0 >= y1:
+                raise ValueError(f"região vazia: {regiao!r}")
+    except ValueError as e:
+        logger.warning("OCR_REGIOES_ROTULOS ignorado (usando a página inteira): %s", e)
+        return None
+    return [tuple(regiao) for regiao in regioes]
+
+# Motor de OCR compartilhado entre as sessões (um pool, limitador e disjuntor por processo)
+@st.cache_resource(show_spinner=False)
+def obter_motor_ocr(modo=OCR_MODO):
+    """
+    Cria o motor de OCR. No modo "vision": Google Vision com limitação de
+    taxa, novas tentativas com backoff e disjuntor, e Tesseract como reserva.
+    No modo "local": apenas o Tesseract, em um pool de processos.
+    """
+    motor_local = MotorTesseract(
+        processos=OCR_PROCESSOS_LOCAIS or None,
+        psm=TESSERACT_PSM,
+        regioes=carregar_regioes_rotulos(),
+    )
+    if modo == "local":
+        return motor_local
+    return MotorResiliente(
+        principal=MotorGoogleVision(carregar_credenciais()[0], endpoint=VISION_ENDPOINT),
+        reserva=motor_local,
+        limitador=LimitadorTaxa(VISION_REQUISICOES_POR_MINUTO / 60),
+        disjuntor=DisjuntorCircuito(),
+        tentativas=OCR_TENTATIVAS,
+    )
+
+# Parâmetros do pré-processamento e da estratégia adaptativa de OCR
+ALTURA_TEXTO_ALVO = 32            # altura de linha de texto (px) após a redução
+DPI_INICIAL_ADAPTATIVO = 150      # primeira tentativa, mais barata
+LIMIAR_CONFIANCA_OCR = 0.80       # abaixo disso, tenta novamente com mais resolução
+MINIMO_CAMPOS_ENCONTRADOS = 2     # campos do contracheque esperados no documento
+QUALIDADE_JPEG = 85
+
+# Função para calcular o limiar de binarização (método de Otsu)
+def calcular_limiar_otsu(imagem_cinza):
+    """
+    Calcula o limiar que melhor separa tinta e papel a partir do histograma
+    de uma imagem em tons de cinza.
+    """
+    histograma = imagem_cinza.histogram()[:256]
+    total = sum(histograma)
+    soma_total = sum(i * h for i, h in enumerate(histograma))
+    
+    soma_fundo = 0
+    peso_fundo = 0
+    melhor_variancia = 0
+    limiar = 127
+    for i, quantidade in enumerate(histograma):
+        peso_fundo += quantidade
+        if peso_fundo == 0:
+            continue
+        peso_frente = total - peso_fundo
+        if peso_frente == 0:
+            break
+        soma_fundo += i * quantidade
+        media_fundo = soma_fundo / peso_fundo
+        media_frente = (soma_total - soma_fundo) / peso_frente
+        variancia = peso_fundo * peso_frente * (media_fundo - media_frente) ** 2
+        if variancia > melhor_variancia:
+            melhor_variancia = variancia
+            limiar = i
+    return limiar
+
+# Função para estimar a altura das linhas de texto
+def estimar_altura_texto(imagem_binaria):
+    """
+    Estima a altura mediana (em px) das linhas de texto usando o perfil
+    horizontal de tinta. Retorna None se não encontrar linhas.
+    """
+    altura = imagem_binaria.size[1]
+    
+    # Reduzir a largura para 1 px dá a média de cada linha da imagem
+    perfil = imagem_binaria.convert("L").resize((1, altura), Image.BOX).getdata()
+    
+    alturas = []
+    atual = 0
+    for valor in perfil:
+        if valor < 250:
+            atual += 1
+        elif atual:
+            alturas.append(atual)
+            atual = 0
+    if atual:
+        alturas.append(atual)
+    
+    # Ignorar linhas de tabela e ruído
+    alturas = sorted(a for a in alturas if a >= 4)
+    return alturas[len(alturas) // 2] if alturas else None
+
+# Função para codificar a imagem no formato mais compacto
+def codificar_imagem(imagem):
+    """
+    Codifica a imagem em PNG e, se não for binária, também em JPEG,
+    retornando (formato, bytes) da opção menor.
+    """
+    candidatos = []
+    
+    buffer = io.BytesIO()
+    imagem.save(buffer, format="PNG")
+    candidatos.append(("PNG", buffer.getvalue()))
+    
+    if imagem.mode != "1":
+        buffer = io.BytesIO()
+        imagem.save(buffer, format="JPEG", quality=QUALIDADE_JPEG)
+        candidatos.append(("JPEG", buffer.getvalue()))
+    
+    return min(candidatos, key=lambda candidato: len(candidato[1]))
+
+# Função de pré-processamento das imagens antes do OCR
+def preprocessar_imagem(imagem, binarizar=True, altura_texto_alvo=ALTURA_TEXTO_ALVO, codificar=True):
+    """
+    Prepara uma imagem para o OCR: aplica a orientação EXIF, converte para
+    tons de cinza, reduz até a altura de texto alvo, binariza e escolhe a
+    codificação mais compacta.
+    
+    Args:
+        imagem: Imagem PIL (página renderizada ou foto)
+        binarizar: Se True, converte para preto e branco (1 bit)
+        altura_texto_alvo: Altura de linha de texto desejada em px (None = não reduzir)
+        codificar: Se False, devolve a imagem PIL já processada (motores locais)
+        
+    Returns:
+        Tupla (bytes codificados ou imagem PIL, formato, (largura, altura))
+    """
+    imagem = ImageOps.exif_transpose(imagem).convert("L")
+    limiar = calcular_limiar_otsu(imagem)
+    
+    # Reduzir só quando o texto está bem maior que o necessário
+    if altura_texto_alvo:
+        altura_texto = estimar_altura_texto(imagem.point(lambda p: 255 if p > limiar else 0))
+        if altura_texto:
+            fator = altura_texto_alvo / altura_texto
+            if fator < 0.9:
+                novo_tamanho = (max(1, round(imagem.width * fator)), max(1, round(imagem.height * fator)))
+                imagem = imagem.resize(novo_tamanho, Image.LANCZOS)
+    
+    if binarizar:
+        imagem = imagem.point(lambda p: 255 if p > limiar else 0).convert("1", dither=Image.NONE)
+    
+    if not codificar:
+        return imagem, "PIL", imagem.size
+    
+    formato, conteudo = codificar_imagem(imagem)
+    return conteudo, formato, imagem.size
+
+# Função para extrair o texto de várias páginas já renderizadas
+def extrair_textos_paginas(paginas, binarizar=True, altura_texto_alvo=ALTURA_TEXTO_ALVO, tipo_arquivo="imagem"):
+    """
+    Pré-processa as páginas e extrai seus textos com o motor de OCR (Google
+    Vision com fallback local, ou Tesseract no modo local). As páginas são
+    enviadas em lote, o que permite ao motor local reconhecê-las em paralelo.
+    
+    Args:
+        paginas: Lista de tuplas (imagem PIL, número da página, DPI ou None)
+        binarizar: Repassado a preprocessar_imagem
+        altura_texto_alvo: Repassado a preprocessar_imagem
+        tipo_arquivo: Rótulo das métricas de desempenho ("pdf" ou "imagem")
+        
+    Returns:
+        Lista de tuplas (texto, dicionário com métricas da página), na mesma ordem.
+        Se o OCR de uma página falhar, o texto é vazio e metricas["erro"]
+        traz a mensagem do erro.
+    """
+    motor = obter_motor_ocr()
+    
+    preparadas = []
+    for imagem, numero_pagina, dpi in paginas:
+        inicio = time.perf_counter()
+        conteudo, formato, (largura, altura) = preprocessar_imagem(
+            imagem, binarizar, altura_texto_alvo, codificar=not motor.aceita_imagem_decodificada
+        )
+        telemetria.observar(
+            "contracheques_etapa_duracao_segundos", time.perf_counter() - inicio,
+            etapa="codificacao", tipo=tipo_arquivo, motor=motor.nome
+        )
+        metricas = {
+            "pagina": numero_pagina,
+            "dpi": dpi,
+            "tentativas": 1,
+            "formato": formato,
+            "dimensoes": f"{largura}x{altura}",
+            "bytes_enviados": len(conteudo) if isinstance(conteudo, bytes) else 0,
+            "preprocessamento_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "latencia_ocr_ms": 0.0,
+            "confianca": None,
+            "motor": None,
+            "situacao": "OCR",
+            "erro": None,
+        }
+        preparadas.append((conteudo, metricas))
+    
+    # O motor resiliente já cuida de novas tentativas e do fallback local
+    resultados = []
+    inicio = time.perf_counter()
+    lote = motor.reconhecer_lote([conteudo for conteudo, _ in preparadas])
+    for (_, metricas), resultado in zip(preparadas, lote):
+        agora = time.perf_counter()
+        if isinstance(resultado, ErroOCR):
+            texto = ""
+            metricas["erro"] = str(resultado)
+            latencia = agora - inicio
+            telemetria.incrementar("contracheques_erros_ocr_total", tipo=tipo_arquivo, motor=motor.nome)
+        else:
+            texto = resultado.texto
+            metricas["motor"] = resultado.motor
+            if resultado.confianca is not None:
+                metricas["confianca"] = round(resultado.confianca, 3)
+            latencia = resultado.latencia if resultado.latencia is not None else agora - inicio
+            registrar_telemetria_ocr(resultado, metricas["bytes_enviados"], latencia, motor.nome, tipo_arquivo)
+        metricas["latencia_ocr_ms"] = round(latencia * 1000, 1)
+        inicio = agora
+        resultados.append((texto, metricas))
+    
+    return resultados
+
+# Função para registrar a telemetria de uma página reconhecida
+def registrar_telemetria_ocr(resultado, bytes_enviados, latencia, motor_principal, tipo_arquivo):
+    """
+    Registra a duração da chamada de OCR (etapa "ocr" no motor principal ou
+    "reserva" quando o fallback respondeu), os bytes enviados e as novas
+    tentativas.
+    """
+    reserva = resultado.motor != motor_principal
+    telemetria.observar(
+        "contracheques_etapa_duracao_segundos", latencia,
+        etapa="reserva" if reserva else "ocr", tipo=tipo_arquivo, motor=resultado.motor
+    )
+    telemetria.incrementar("contracheques_bytes_enviados_total", bytes_enviados, tipo=tipo_arquivo, motor=resultado.motor)
+    telemetria.incrementar("contracheques_novas_tentativas_total", resultado.tentativas - 1, tipo=tipo_arquivo, motor=motor_principal)
+    if reserva:
+        telemetria.incrementar("contracheques_reserva_total", tipo=tipo_arquivo, motor=resultado.motor)
+
+# Função para verificar se o texto já tem campos suficientes do contracheque
+def cobertura_suficiente(texto):
+    """
+    Retorna True se o texto tem pelo menos MINIMO_CAMPOS_ENCONTRADOS campos
+    reconhecidos por processar_texto_contracheque.
+    """
+    campos = processar_texto_contracheque(texto).iloc[0]
+    return sum(1 for valor in campos if valor) >= MINIMO_CAMPOS_ENCONTRADOS
+
+# Função para decidir se vale tentar novamente com mais resolução
+def precisa_escalonar(metricas, cobertura_documento_suficiente):
+    """
+    Retorna True quando o OCR da página falhou, a confiança ficou baixa ou
+    o documento ainda não tem campos suficientes do contracheque.
+    """
+    if metricas["erro"]:
+        return True
+    confianca = metricas["confianca"]
+    if confianca is not None and confianca < LIMIAR_CONFIANCA_OCR:
+        return True
+    return not cobertura_documento_suficiente
+
+# Função para combinar as métricas de duas tentativas na mesma página
+def combinar_metricas_tentativas(anterior, nova):
+    """
+    Mantém as métricas da última tentativa bem-sucedida, somando bytes,
+    tempos e tentativas.
+    """
+    combinadas = dict(anterior if nova["erro"] and not anterior["erro"] else nova)
+    combinadas["tentativas"] = anterior["tentativas"] + nova["tentativas"]
+    for chave in ("bytes_enviados", "preprocessamento_ms", "latencia_ocr_ms", "renderizacao_ms"):
+        if chave in anterior and chave in nova:
+            combinadas[chave] = round(anterior[chave] + nova[chave], 1)
+    return combinadas
+
+# Parâmetros da detecção de páginas em branco e duplicadas
+TAMANHO_MINIATURA = (256, 352)           # miniatura usada nas estatísticas da página
+LIMIAR_TINTA_PAGINA_BRANCA = 0.005       # fração mínima da miniatura com tinta
+MINIMO_LINHAS_TINTA = 2                  # linhas da miniatura com tinta que fazem uma linha de texto
+FRACAO_TINTA_LINHA = 0.02                # fração mínima de uma linha da miniatura com tinta
+DISTANCIA_MAXIMA_HASH = 10               # bits diferentes (de 256) para suspeitar de duplicata
+LIMIAR_DIFERENCA_TOM = 12                # diferença máxima de tom por pixel na confirmação
+MAX_PAGINAS_RECENTES = 128               # páginas de documentos recentes mantidas em memória
+
+# Cache de páginas já reconhecidas, compartilhado entre as sessões do processo
+@st.cache_resource
+def obter_paginas_recentes():
+    """
+    Retorna o cache (com lock) das últimas páginas processadas, usado para
+    reaproveitar o OCR de páginas repetidas entre documentos. Como o cache
+    é compartilhado entre usuários, o texto só é reaproveitado para a mesma
+    imagem, byte a byte (ver verificar_pagina_ignorada).
+    """
+    return {
+        "lock": threading.Lock(),
+        "paginas": collections.deque(maxlen=MAX_PAGINAS_RECENTES),
+    }
+
+# Função para calcular o hash perceptual de uma miniatura
+def calcular_hash_perceptual(miniatura):
+    """
+    Calcula um dHash de 256 bits: compara cada pixel com o vizinho da direita
+    em uma versão 17x16 da miniatura.
+    """
+    pixels = list(miniatura.resize((17, 16), Image.BOX).getdata())
+    valor = 0
+    for linha in range(16):
+        for coluna in range(16):
+            esquerda = pixels[linha * 17 + coluna]
+            direita = pixels[linha * 17 + coluna + 1]
+            valor = (valor << 1) | (esquerda > direita)
+    return valor
+
+# Função para extrair as estatísticas baratas de uma página
+def analisar_pagina(imagem):
+    """
+    Gera a miniatura da página e calcula a cobertura de tinta e o hash
+    perceptual, sem nenhuma chamada de OCR.
+    
+    Returns:
+        Dicionário com tinta (fração), linhas_tinta, hash (int), miniatura
+        (imagem PIL) e hash_conteudo (SHA-256 dos pixels da página)
+    """
+    miniatura = ImageOps.exif_transpose(imagem).convert("L").resize(TAMANHO_MINIATURA, Image.BOX)
+    
+    # Ignorar as margens (sombras da borda do scanner)
+    largura, altura = miniatura.size
+    miolo = miniatura.crop((largura // 20, altura // 20, largura - largura // 20, altura - altura // 20))
+    
+    # Tinta = pixels bem mais escuros que o tom predominante (o papel)
+    histograma = miolo.histogram()
+    fundo = max(range(256), key=lambda tom: histograma[tom])
+    limiar_tinta = max(fundo - 40, 0)
+    escuros = sum(histograma[:limiar_tinta])
+    
+    # Linhas da miniatura com tinta (uma linha de texto curta ocupa 3 ou 4 delas,
+    # mesmo quando a tinta total da página é mínima)
+    perfil = miolo.point(lambda tom: 255 if tom < limiar_tinta else 0).resize((1, miolo.height), Image.BOX).getdata()
+    linhas_tinta = sum(1 for valor in perfil if valor >= 255 * FRACAO_TINTA_LINHA)
+    
+    return {
+        "tinta": escuros / (miolo.width * miolo.height),
+        "linhas_tinta": linhas_tinta,
+        "hash": calcular_hash_perceptual(miniatura),
+        "miniatura": miniatura,
+        "hash_conteudo": hashlib.sha256(
+            f"{imagem.mode}{imagem.size}".encode() + imagem.tobytes()
+        ).hexdigest(),
+    }
+
+# Função para decidir se a página está em branco
+def pagina_em_branco(analise):
+    """
+    Uma página só é considerada em branco quando, além de ter pouca tinta,
+    não tem nenhuma linha de texto: uma página com apenas uma linha de
+    totais precisa ir para o OCR.
+    """
+    return analise["tinta"] < LIMIAR_TINTA_PAGINA_BRANCA and analise["linhas_tinta"] < MINIMO_LINHAS_TINTA
+
+# Função para procurar uma página equivalente entre as já processadas
+def buscar_pagina_duplicada(analise, candidatas):
+    """
+    Retorna a primeira página candidata com hash próximo e miniatura
+    praticamente idêntica, ou None.
+    
+    A confirmação exige que nenhum pixel da miniatura difira mais que
+    LIMIAR_DIFERENCA_TOM: contracheques com o mesmo layout que diferem em
+    um único dígito não podem reaproveitar o texto um do outro.
+    """
+    for candidata in candidatas:
+        if (analise["hash"] ^ candidata["hash"]).bit_count() > DISTANCIA_MAXIMA_HASH:
+            continue
+        diferenca = ImageChops.difference(analise["miniatura"], candidata["miniatura"])
+        if not any(diferenca.histogram()[LIMIAR_DIFERENCA_TOM + 1:]):
+            return candidata
+    return None
+
+# Função para decidir se a página pode ser ignorada antes do OCR
+def verificar_pagina_ignorada(imagem, paginas_documento):
+    """
+    Verifica se a página está em branco, repete uma página do mesmo
+    documento (miniatura praticamente idêntica) ou é idêntica, pixel a
+    pixel, a uma página de um documento recente.
+    
+    Returns:
+        Tupla (página de origem ou None, situação ou None, análise da página).
+        A página de origem é a entrada (ver criar_entrada_pagina) cujo texto
+        deve ser reaproveitado; no mesmo documento, o texto só fica
+        disponível depois do OCR do lote.
+    """
+    analise = analisar_pagina(imagem)
+    
+    if pagina_em_branco(analise):
+        return None, "em branco", analise
+    
+    duplicada = buscar_pagina_duplicada(analise, paginas_documento)
+    if duplicada:
+        return duplicada, f"duplicada (página {duplicada['pagina']})", analise
+    
+    # Entre documentos (e usuários), só a mesma página renderizada: na miniatura,
+    # contracheques de funcionários diferentes podem diferir abaixo da tolerância
+    cache = obter_paginas_recentes()
+    with cache["lock"]:
+        duplicada = next(
+            (pagina for pagina in cache["paginas"] if pagina["hash_conteudo"] == analise["hash_conteudo"]), None
+        )
+    if duplicada:
+        return duplicada, "duplicada (documento recente)", analise
+    
+    return None, None, analise
+
+# Função para criar a entrada de uma página que será reconhecida
+def criar_entrada_pagina(analise, numero_pagina, texto=None):
+    """
+    Cria a entrada usada na busca de duplicatas (o texto é preenchido após o OCR).
+    """
+    return {
+        "hash": analise["hash"],
+        "miniatura": analise["miniatura"],
+        "hash_conteudo": analise["hash_conteudo"],
+        "texto": texto,
+        "pagina": numero_pagina,
+        "erro": None,
+    }
+
+# Função para registrar uma página reconhecida para reaproveitamento
+def registrar_pagina_recente(entrada):
+    """
+    Guarda a página (já com texto) no cache de páginas recentes.
+    """
+    cache = obter_paginas_recentes()
+    with cache["lock"]:
+        cache["paginas"].append(entrada)
+
+# Função para montar as métricas de uma página ignorada
+def metricas_pagina_ignorada(numero_pagina, dpi, situacao):
+    """
+    Métricas no mesmo formato de extrair_textos_paginas, sem bytes enviados.
+    """
+    return {
+        "pagina": numero_pagina,
+        "dpi": dpi,
+        "tentativas": 0,
+        "formato": None,
+        "dimensoes": None,
+        "bytes_enviados": 0,
+        "preprocessamento_ms": 0.0,
+        "latencia_ocr_ms": 0.0,
+        "confianca": None,
+        "motor": None,
+        "situacao": situacao,
+        "erro": None,
+    }
+
+# Função para registrar no log e na telemetria as páginas ignoradas
+def registrar_paginas_ignoradas(metricas_paginas, descricao, tipo_arquivo):
+    """
+    Registra no log quantas páginas foram ignoradas e por quê, e conta as
+    páginas e os reaproveitamentos de texto na telemetria.
+    """
+    telemetria.incrementar("contracheques_documentos_total", tipo=tipo_arquivo)
+    for m in metricas_paginas:
+        telemetria.incrementar("contracheques_paginas_total", tipo=tipo_arquivo, situacao=m["situacao"].split(" (")[0])
+        if m["situacao"].startswith("duplicada"):
+            origem = "documento recente" if "documento recente" in m["situacao"] else "mesmo documento"
+            telemetria.incrementar("contracheques_cache_acertos_total", tipo=tipo_arquivo, origem=origem)
+    
+    ignoradas = collections.Counter(
+        m["situacao"].split(" (")[0] for m in metricas_paginas if m["situacao"] != "OCR"
+    )
+    if ignoradas:
+        # Páginas descartadas como em branco não têm texto nenhum: ficam visíveis no log
+        em_branco = [str(m["pagina"]) for m in metricas_paginas if m["situacao"] == "em branco"]
+        logger.log(
+            logging.WARNING if em_branco else logging.INFO,
+            "%s: %d de %d página(s) sem chamada de OCR (%s)%s",
+            descricao,
+            sum(ignoradas.values()),
+            len(metricas_paginas),
+            ", ".join(f"{quantidade} {motivo}" for motivo, quantidade in ignoradas.items()),
+            f"; em branco: página(s) {', '.join(em_branco)}" if em_branco else "",
+        )
+
+# Função para processar um PDF página a página
+def processar_pdf_paginas(pdf_bytes, dpi_maximo=300, adaptativo=True):
+    """
+    Converte o PDF em imagens e extrai o texto, entregando o resultado de
+    cada página assim que ele fica pronto (a interface mostra o progresso e
+    o texto parcial, e pode interromper o documento no meio).
+    
+    A primeira página é renderizada sozinha, para chegar logo ao primeiro
+    resultado; as seguintes são renderizadas em lotes de PAGINAS_POR_LOTE,
+    o próximo lote enquanto o OCR do atual está em andamento. Páginas em
+    branco ou repetidas não vão para o OCR. Com adaptativo=True, as páginas
+    são renderizadas primeiro em DPI_INICIAL_ADAPTATIVO; ao final, as que
+    precisarem são renderizadas de novo em dpi_maximo e entregues outra vez,
+    com refinada=True.
+    
+    Args:
+        pdf_bytes: Conteúdo do PDF ou caminho do arquivo (ex.: um original do armazenamento)
+        dpi_maximo: DPI máximo (configurado na barra lateral)
+        adaptativo: Se True, usa a estratégia adaptativa de DPI
+        
+    Returns:
+        Gerador de dicionários com pagina, total_paginas, texto, metricas
+        e refinada. Uma página refinada substitui o resultado anterior; uma
+        página cujo OCR falhou tem texto vazio e metricas["erro"] preenchido.
+        
+    Raises:
+        ErroDocumento: Se o PDF não puder ser lido ou renderizado
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    try:
+        from pdf2image import convert_from_path, pdfinfo_from_path
+    except ImportError as e:
+        raise ErroDocumento(f"Conversão de PDF indisponível: {e}") from e
+    
+    dpi_inicial = min(DPI_INICIAL_ADAPTATIVO, dpi_maximo) if adaptativo else dpi_maximo
+    metricas_documento = {}
+    
+    with tempfile.TemporaryDirectory() as path:
+        # O PDF vai para o disco uma única vez; todas as renderizações leem o mesmo arquivo
+        if isinstance(pdf_bytes, (str, os.PathLike)):
+            caminho_pdf = str(pdf_bytes)
+        else:
+            caminho_pdf = os.path.join(path, "documento.pdf")
+            with open(caminho_pdf, "wb") as arquivo_pdf:
+                arquivo_pdf.write(pdf_bytes)
+        
+        try:
+            total_paginas = pdfinfo_from_path(caminho_pdf)["Pages"]
+        except Exception as e:
+            raise ErroDocumento(f"Erro na conversão do PDF: {e}") from e
+        
+        def renderizar(primeira, ultima, dpi):
+            inicio = time.perf_counter()
+            try:
+                imagens = convert_from_path(
+                    caminho_pdf, dpi=dpi, first_page=primeira, last_page=ultima, output_folder=path,
+                    grayscale=True, thread_count=min(THREADS_RENDERIZACAO, ultima - primeira + 1)
+                )
+            except Exception as e:
+                raise ErroDocumento(f"Erro na conversão do PDF: {e}") from e
+            duracao = time.perf_counter() - inicio
+            telemetria.observar(
+                "contracheques_etapa_duracao_segundos", duracao,
+                etapa="rasterizacao", tipo="pdf", motor=""
+            )
+            return imagens, round(duracao / max(len(imagens), 1) * 1000, 1)
+        
+        # Primeira página sozinha; as demais em lotes
+        lotes = [(1, min(1, total_paginas))] if total_paginas else []
+        for primeira in range(2, total_paginas + 1, PAGINAS_POR_LOTE):
+            lotes.append((primeira, min(primeira + PAGINAS_POR_LOTE - 1, total_paginas)))
+        
+        textos = {}
+        origens = {}
+        paginas_documento = []
+        pendentes = []
+        
+        try:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="renderizacao") as executor:
+                proximo = executor.submit(renderizar, *lotes[0], dpi_inicial) if lotes else None
+                for indice, (primeira, ultima) in enumerate(lotes):
+                    images, tempo_renderizacao = proximo.result()
+                    if indice + 1 < len(lotes):
+                        proximo = executor.submit(renderizar, *lotes[indice + 1], dpi_inicial)
+                    
+                    # Separar as páginas em branco ou repetidas, que não vão para o OCR
+                    pendentes_lote = []
+                    for numero, imagem in enumerate(images, start=primeira):
+                        origem, situacao, analise = verificar_pagina_ignorada(imagem, paginas_documento)
+                        if situacao:
+                            metricas_documento[numero] = metricas_pagina_ignorada(numero, dpi_inicial, situacao)
+                            origens[numero] = origem
+                        else:
+                            entrada = criar_entrada_pagina(analise, numero)
+                            paginas_documento.append(entrada)
+                            pendentes_lote.append((numero, entrada, imagem))
+                    
+                    # Extrair texto das demais páginas do lote
+                    resultados = extrair_textos_paginas(
+                        [(imagem, numero, dpi_inicial) for numero, _, imagem in pendentes_lote], tipo_arquivo="pdf"
+                    )
+                    for (numero, entrada, _), (texto_pagina, metricas) in zip(pendentes_lote, resultados):
+                        textos[numero] = entrada["texto"] = texto_pagina
+                        entrada["erro"] = metricas["erro"]
+                        metricas_documento[numero] = metricas
+                        pendentes.append((numero, entrada))
+                    
+                    for numero in range(primeira, primeira + len(images)):
+                        metricas_documento[numero]["renderizacao_ms"] = tempo_renderizacao
+                        if origens.get(numero) is not None:
+                            # A duplicata de uma página cujo OCR falhou também fica sem texto
+                            metricas_documento[numero]["erro"] = origens[numero]["erro"]
+                        yield {
+                            "pagina": numero,
+                            "total_paginas": total_paginas,
+                            "texto": _texto_pagina_pdf(numero, textos, origens),
+                            "metricas": metricas_documento[numero],
+                            "refinada": False,
+                        }
+            
+            # Escalonar para o DPI máximo apenas as páginas que precisarem
+            if dpi_inicial < dpi_maximo and pendentes:
+                suficiente = cobertura_suficiente("\n".join(textos[numero] for numero, _ in pendentes))
+                escalonar = [
+                    (numero, entrada) for numero, entrada in pendentes
+                    if precisa_escalonar(metricas_documento[numero], suficiente)
+                ]
+                # Em lotes, para o OCR seguir em paralelo e os resultados chegarem aos poucos
+                for inicio_lote in range(0, len(escalonar), PAGINAS_POR_LOTE):
+                    lote = escalonar[inicio_lote:inicio_lote + PAGINAS_POR_LOTE]
+                    imagens_hd = [renderizar(numero, numero, dpi_maximo) for numero, _ in lote]
+                    resultados_hd = extrair_textos_paginas(
+                        [(imagem_hd, numero, dpi_maximo) for (numero, _), ([imagem_hd], _) in zip(lote, imagens_hd)],
+                        tipo_arquivo="pdf"
+                    )
+                    for (numero, entrada), (_, renderizacao_hd), (texto_hd, metricas_hd) in zip(lote, imagens_hd, resultados_hd):
+                        metricas_hd["renderizacao_ms"] = renderizacao_hd
+                        metricas_documento[numero] = combinar_metricas_tentativas(metricas_documento[numero], metricas_hd)
+                        if not metricas_hd["erro"]:
+                            textos[numero] = entrada["texto"] = texto_hd
+                        entrada["erro"] = metricas_documento[numero]["erro"]
+                        
+                        # A página e as suas duplicatas no documento recebem o novo texto
+                        for pagina in [numero] + [n for n, origem in origens.items() if origem is entrada]:
+                            if pagina != numero:
+                                metricas_documento[pagina]["erro"] = entrada["erro"]
+                            yield {
+                                "pagina": pagina,
+                                "total_paginas": total_paginas,
+                                "texto": _texto_pagina_pdf(pagina, textos, origens),
+                                "metricas": metricas_documento[pagina],
+                                "refinada": True,
+                            }
+            
+            # Disponibilizar os textos para documentos futuros
+            for numero, entrada in pendentes:
+                if not metricas_documento[numero]["erro"]:
+                    registrar_pagina_recente(entrada)
+        finally:
+            # Também conta as páginas de um documento interrompido
+            if metricas_documento:
+                registrar_paginas_ignoradas(
+                    [metricas_documento[n] for n in sorted(metricas_documento)], "PDF", "pdf"
+                )
+
+# Função para obter o texto de uma página do PDF (reconhecida ou ignorada)
+def _texto_pagina_pdf(numero, textos, origens):
+    if numero in origens:
+        return (origens[numero]["texto"] or "") if origens[numero] else ""
+    return textos[numero]
+
+# Função para montar o texto completo do PDF a partir dos resultados das páginas
+def montar_texto_pdf(resultados):
+    """
+    Junta os textos das páginas (resultados de processar_pdf_paginas, em
+    ordem), com um cabeçalho por página que indica as páginas ignoradas e
+    as que falharam no OCR.
+    """
+    texto_completo = ""
+    for resultado in resultados:
+        situacao = resultado["metricas"]["situacao"]
+        if resultado["metricas"]["erro"]:
+            texto_completo += f"\n--- Página {resultado['pagina']} [erro no OCR] ---\n" + resultado["texto"]
+        elif situacao != "OCR":
+            texto_completo += f"\n--- Página {resultado['pagina']} [{situacao}] ---\n" + resultado["texto"]
+        else:
+            texto_completo += f"\n--- Página {resultado['pagina']} ---\n" + resultado["texto"]
+    return texto_completo
+
+# Função para processar arquivos PDF
+def processar_pdf(pdf_bytes, dpi_maximo=300, adaptativo=True, estatisticas=None):
+    """
+    Converte PDF para imagens e então extrai texto (todas as páginas de uma
+    vez; ver processar_pdf_paginas para o processamento página a página).
+    
+    Args:
+        pdf_bytes: Conteúdo do PDF ou caminho do arquivo (ex.: um original do armazenamento)
+        dpi_maximo: DPI máximo (configurado na barra lateral)
+        adaptativo: Se True, usa a estratégia adaptativa de DPI
+        estatisticas: Lista opcional que recebe as métricas de cada página
+            (páginas que falharam no OCR têm "erro" preenchido)
+        
+    Raises:
+        ErroDocumento: Se o PDF não puder ser lido ou renderizado
+    """
+    resultados = {}
+    for resultado in processar_pdf_paginas(pdf_bytes, dpi_maximo, adaptativo):
+        resultados[resultado["pagina"]] = resultado
+    resultados = [resultados[numero] for numero in sorted(resultados)]
+    
+    if estatisticas is not None:
+        estatisticas.extend(resultado["metricas"] for resultado in resultados)
+    
+    return montar_texto_pdf(resultados)
+
+# Função para processar imagens enviadas (fotos e digitalizações)
+def processar_imagem(conteudo_imagem, adaptativo=True, estatisticas=None):
+    """
+    Pré-processa e extrai o texto de uma imagem. Com adaptativo=True, a
+    primeira tentativa usa a imagem reduzida e binarizada; se a confiança ou
+    a cobertura de campos ficar baixa, tenta novamente em tons de cinza com
+    o dobro da resolução de texto.
+    
+    Args:
+        conteudo_imagem: Bytes da imagem enviada, caminho ou arquivo aberto
+            (ex.: mmap de um original do armazenamento)
+        adaptativo: Se True, usa a estratégia adaptativa
+        estatisticas: Lista opcional que recebe as métricas da imagem
+            ("erro" preenchido se o OCR falhar; o texto fica vazio)
+        
+    Raises:
+        ErroDocumento: Se a imagem não puder ser aberta
+    """
+    try:
+        if isinstance(conteudo_imagem, (bytes, bytearray)):
+            conteudo_imagem = io.BytesIO(conteudo_imagem)
+        imagem = Image.open(conteudo_imagem)
+        imagem.load()
+    except Exception as e:
+        raise ErroDocumento(f"Erro ao abrir imagem: {e}") from e
+    
+    # Imagens em branco ou repetidas de documentos recentes não vão para o OCR
+    origem, situacao, analise = verificar_pagina_ignorada(imagem, [])
+    if situacao:
+        metricas = metricas_pagina_ignorada(1, None, situacao)
+        if estatisticas is not None:
+            estatisticas.append(metricas)
+        registrar_paginas_ignoradas([metricas], "Imagem", "imagem")
+        return (origem["texto"] if origem else "") or "Nenhum texto detectado na imagem."
+    
+    [(texto, metricas)] = extrair_textos_paginas([(imagem, 1, None)])
+    
+    if adaptativo and precisa_escalonar(metricas, cobertura_suficiente(texto)):
+        [(texto_hd, metricas_hd)] = extrair_textos_paginas(
+            [(imagem, 1, None)], binarizar=False, altura_texto_alvo=ALTURA_TEXTO_ALVO * 2
+        )
+        metricas = combinar_metricas_tentativas(metricas, metricas_hd)
+        if not metricas_hd["erro"]:
+            texto = texto_hd
+    
+    if not metricas["erro"]:
+        registrar_pagina_recente(criar_entrada_pagina(analise, 1, texto))
+    registrar_paginas_ignoradas([metricas], "Imagem", "imagem")
+    if estatisticas is not None:
+        estatisticas.append(metricas)
+    
+    return texto
+
+# Função para listar as páginas cujo OCR falhou
+def paginas_com_erro(metricas_paginas):
+    """
+    Retorna os números das páginas com erro de OCR (métricas de
+    processar_pdf, processar_imagem ou processar_pdf_paginas).
+    """
+    return [m["pagina"] for m in metricas_paginas if m["erro"]]
+
+# Função para processar o texto extraído e identificar dados do contracheque
+def processar_texto_contracheque(texto, tipo_arquivo="texto"):
+    """
+    Analisa o texto extraído do documento PDF para identificar informações do contracheque.
+    tipo_arquivo ("pdf", "imagem" ou "texto") rotula a duração na telemetria.
+    """
+    import pandas as pd
+    
+    # Se não há texto para processar, retorna o DataFrame vazio
+    if not texto:
+        return pd.DataFrame([extrair_campos_contracheque(texto)])
+    
+    inicio = time.perf_counter()
+    dados = extrair_campos_contracheque(texto)
+    telemetria.observar(
+        "contracheques_etapa_duracao_segundos", time.perf_counter() - inicio,
+        etapa="interpretacao", tipo=tipo_arquivo, motor=""
+    )
+    
+    # Retorna os dados como DataFrame para exibição na interface
+    return pd.DataFrame([dados])
+
+# Função para extrair os campos do contracheque das linhas de um texto
+def extrair_campos_contracheque(texto):
+    """
+    Procura os campos do contracheque no texto, sem registrar telemetria
+    (usado também na prévia de cada página de um PDF em processamento).
+    
+    Returns:
+        Dicionário com os campos (vazios quando não encontrados)
+    """
+    # Inicializa o dicionário para armazenar os valores encontrados
+    dados = {
+        "Nome": "",
+        "Matrícula": "",
+        "Cargo": "",
+        "Mês/Ano": "",
+        "Salário Base": "",
+        "Descontos": "",
+        "Valor Líquido": ""
+    }
+    
+    if not texto:
+        return dados
+    
+    # Divide o texto em linhas para processar
+    linhas = texto.split('\n')
+    
+    # Itera pelas linhas para encontrar os padrões esperados
+    for linha in linhas:
+        linha_lower = linha.lower()
+        
+        # Captura o Nome
+        if "nome:" in linha_lower:
+            dados["Nome"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+        
+        # Captura a Matrícula
+        elif "matrícula" in linha_lower or "matricula" in linha_lower:
+            dados["Matrícula"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+
+        # Captura o Cargo
+        elif "cargo:" in linha_lower:
+            dados["Cargo"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+        
+        # Captura o Mês/Ano
+        elif "referência:" in linha_lower or "referencia:" in linha_lower or "mês/ano:" in linha_lower:
+            dados["Mês/Ano"] = linha.split(":", 1)[1].strip() if ":" in linha else ""
+        
+        # Captura o Salário Base
+        elif "salário base" in linha_lower or "salario base" in linha_lower:
+            try:
+                partes = linha.split()
+                for i, parte in enumerate(partes):
+                    if parte.lower() in ["base", "salário", "salario"] and i + 1 < len(partes):
+                        dados["Salário Base"] = partes[i + 1].replace("R$", "").strip()
+                if not dados["Salário Base"] and len(partes) > 0:  # Fallback para método antigo
+                    dados["Salário Base"] = partes[-1].replace("R$", "").strip()
+            except Exception:
+                dados["Salário Base"] = ""
+        
+        # Captura os Descontos
+        elif "total de descontos" in linha_lower or "descontos totais" in linha_lower or "total descontos" in linha_lower:
+            try:
+                partes = linha.split()
+                for i, parte in enumerate(partes):
+                    if parte.lower() == "descontos" and i + 1 < len(partes):
+                        dados["Descontos"] = partes[i + 1].replace("R$", "").strip()
+                if not dados["Descontos"] and len(partes) > 0:  # Fallback para método antigo
+                    dados["Descontos"] = partes[-1].replace("R$", "").strip()
+            except Exception:
+                dados["Descontos"] = ""
+        
+        # Captura o Valor Líquido
+        elif "líquido a receber" in linha_lower or "liquido a receber" in linha_lower or "valor líquido" in linha_lower or "valor liquido" in linha_lower:
+            try:
+                partes = linha.split()
+                for i, parte in enumerate(partes):
+                    if parte.lower() in ["receber", "líquido", "liquido"] and i + 1 < len(partes):
+                        dados["Valor Líquido"] = partes[i + 1].replace("R$", "").strip()
+                if not dados["Valor Líquido"] and len(partes) > 0:  # Fallback para método antigo
+                    dados["Valor Líquido"] = partes[-1].replace("R$", "").strip()
+            except Exception:
+                dados["Valor Líquido"] = ""
+    
+    return dados
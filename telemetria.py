@@ -0,0 +1,242 @@
+"""
+Telemetria de desempenho do aplicativo de contracheques.
+
+Mantém, por processo, contadores e histogramas de duração rotulados (por
+exemplo, por etapa, tipo de arquivo e motor de OCR), e os exporta no
+formato texto do Prometheus ou em JSON. Um servidor HTTP mínimo, em uma
+thread própria, expõe as métricas para coleta em /metrics e /metrics.json.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Endereço do endpoint de métricas (METRICAS_PORTA=0 desativa o servidor)
+METRICAS_HOST = os.environ.get("METRICAS_HOST", "127.0.0.1")
+METRICAS_PORTA = int(os.environ.get("METRICAS_PORTA", "9464"))
+
+# Limites superiores (em segundos) dos buckets dos histogramas de duração
+BUCKETS_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Descrição de cada métrica (linha HELP do Prometheus)
+DESCRICOES = {
+    "contracheques_etapa_duracao_segundos": "Duração de cada etapa do processamento (rasterização, codificação, OCR, reserva, interpretação, gravação no banco, exportação)",
+    "contracheques_documentos_total": "Documentos processados",
+    "contracheques_paginas_total": "Páginas processadas, por situação (OCR, em branco, duplicada)",
+    "contracheques_bytes_enviados_total": "Bytes de imagem enviados aos motores de OCR",
+    "contracheques_cache_acertos_total": "Páginas com texto reaproveitado de uma página equivalente já reconhecida",
+    "contracheques_novas_tentativas_total": "Chamadas aos motores de OCR além da primeira (novas tentativas e reserva)",
+    "contracheques_reserva_total": "Páginas reconhecidas pelo motor de reserva",
+    "contracheques_erros_ocr_total": "Páginas cujo OCR falhou em todos os motores",
+    "contracheques_espera_lock_segundos": "Espera por recursos compartilhados (limitador de taxa do Vision, escrita no SQLite)",
+}
+
+
+class Histograma:
+    """Histograma cumulativo no estilo Prometheus (buckets, soma e contagem)."""
+
+    def __init__(self, buckets=BUCKETS_PADRAO):
+        self.buckets = tuple(buckets)
+        self.contagens = [0] * (len(self.buckets) + 1)
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        else:
+            self.contagens[-1] += 1
+        self.soma += valor
+        self.contagem += 1
+
+    def acumulados(self):
+        # Contagens cumulativas por limite, terminando em +Inf
+        total = 0
+        resultado = []
+        for limite, quantidade in zip(self.buckets + (math.inf,), self.contagens):
+            total += quantidade
+            resultado.append((limite, total))
+        return resultado
+
+    def quantil(self, q):
+        """Estimativa do quantil q (0 a 1) por interpolação linear dentro do bucket."""
+        if not self.contagem:
+            return None
+        alvo = q * self.contagem
+        inferior = 0.0
+        anterior = 0
+        for limite, acumulado in self.acumulados():
+            if acumulado >= alvo:
+                if math.isinf(limite):
+                    return inferior
+                fracao = (alvo - anterior) / max(acumulado - anterior, 1)
+                return inferior + (limite - inferior) * fracao
+            inferior, anterior = limite, acumulado
+        return inferior
+
+
+class RegistroMetricas:
+    """Contadores e histogramas rotulados, seguros para várias threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return nome, tuple(sorted((chave, str(valor)) for chave, valor in rotulos.items()))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not valor:
+            return
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma()
+            histograma.observar(valor)
+
+    @contextmanager
+    def medir(self, nome, **rotulos):
+        """Observa no histograma a duração do bloco, em segundos."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def limpar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def instantaneo(self):
+        """
+        Retorna as métricas atuais como listas de dicionários:
+        {"contadores": [...], "histogramas": [...]}.
+        """
+        with self._lock:
+            contadores = [
+                {"nome": nome, "rotulos": dict(rotulos), "valor": valor}
+                for (nome, rotulos), valor in sorted(self._contadores.items())
+            ]
+            histogramas = []
+            for (nome, rotulos), histograma in sorted(self._histogramas.items()):
+                histogramas.append({
+                    "nome": nome,
+                    "rotulos": dict(rotulos),
+                    "contagem": histograma.contagem,
+                    "soma": histograma.soma,
+                    "p50": histograma.quantil(0.5),
+                    "p95": histograma.quantil(0.95),
+                    "buckets": [
+                        ["+Inf" if math.isinf(limite) else limite, acumulado]
+                        for limite, acumulado in histograma.acumulados()
+                    ],
+                })
+        return {"contadores": contadores, "histogramas": histogramas}
+
+    def formato_json(self):
+        return json.dumps(self.instantaneo(), ensure_ascii=False, indent=2)
+
+    def formato_prometheus(self):
+        """Exporta as métricas no formato texto do Prometheus (versão 0.0.4)."""
+        dados = self.instantaneo()
+        linhas = []
+        cabecalhos = set()
+
+        def cabecalho(nome, tipo):
+            if nome not in cabecalhos:
+                cabecalhos.add(nome)
+                linhas.append(f"# HELP {nome} {DESCRICOES.get(nome, nome)}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+
+        for contador in dados["contadores"]:
+            cabecalho(contador["nome"], "counter")
+            linhas.append(f"{contador['nome']}{_formatar_rotulos(contador['rotulos'])} {contador['valor']}")
+
+        for histograma in dados["histogramas"]:
+            nome = histograma["nome"]
+            cabecalho(nome, "histogram")
+            for limite, acumulado in histograma["buckets"]:
+                rotulos = dict(histograma["rotulos"], le=limite if limite == "+Inf" else repr(float(limite)))
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos)} {acumulado}")
+            linhas.append(f"{nome}_sum{_formatar_rotulos(histograma['rotulos'])} {histograma['soma']}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(histograma['rotulos'])} {histograma['contagem']}")
+
+        return "\n".join(linhas) + "\n"
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = []
+    for chave, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{chave}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+# Registro único do processo, compartilhado entre as sessões
+REGISTRO = RegistroMetricas()
+
+incrementar = REGISTRO.incrementar
+observar = REGISTRO.observar
+medir = REGISTRO.medir
+
+
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        caminho = self.path.split("?", 1)[0]
+        if caminho == "/metrics":
+            corpo = REGISTRO.formato_prometheus().encode("utf-8")
+            tipo = "text/plain; version=0.0.4; charset=utf-8"
+        elif caminho == "/metrics.json":
+            corpo = REGISTRO.formato_json().encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("Endpoint de métricas: " + formato, *args)
+
+
+def iniciar_servidor_metricas(host=METRICAS_HOST, porta=METRICAS_PORTA):
+    """
+    Inicia o endpoint HTTP de métricas em uma thread daemon.
+
+    Returns:
+        O servidor (com .server_address), ou None se estiver desativado
+        (porta 0) ou se a porta não puder ser aberta
+    """
+    if not porta:
+        return None
+    try:
+        servidor = ThreadingHTTPServer((host, porta), _ManipuladorMetricas)
+    except OSError as e:
+        logger.warning("Endpoint de métricas não iniciado em %s:%s: %s", host, porta, e)
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="servidor-metricas", daemon=True).start()
+    logger.info("Endpoint de métricas em http://%s:%s/metrics", host, porta)
+    return servidor